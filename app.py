@@ -1,6 +1,24 @@
-from fastapi import FastAPI, HTTPException
-from routes.node_routes import node_router
+import math
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from routes.node_routes import node_router, GOSSIP_ROUTES
+from routes.admin_routes import admin_router
+
+from classes.node_runtime import runtime
 
 app = FastAPI()
 
+@app.middleware("http")
+async def peer_admission(request: Request, call_next):
+    if request.url.path in GOSSIP_ROUTES:
+        peer_id = request.headers.get('X-Node-Id')
+        if peer_id and not runtime.admit(peer_id):
+            return JSONResponse(status_code=403, content={'detail': f'Peer {peer_id} penalizado.'})
+        # X-Node-Id is self-asserted, buckets are keyed by the address of the sender
+        retry_after = runtime.rate_limit(request.client.host if request.client else 'unknown', request.url.path)
+        if retry_after > 0:
+            return JSONResponse(status_code=429, content={'detail': 'Demasiados mensajes.'}, headers={'Retry-After': str(math.ceil(retry_after))})
+    return await call_next(request)
+
 app.include_router(node_router)
+app.include_router(admin_router)
\ No newline at end of file
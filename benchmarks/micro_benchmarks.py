@@ -0,0 +1,247 @@
+"""
+Microbenchmarks for the hashing, serialization and validation primitives
+
+Usage:
+    python -m benchmarks.micro_benchmarks
+    python -m benchmarks.micro_benchmarks --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.micro_benchmarks --compare bench.json --max-regression 0.15
+
+Every benchmark is timed over several rounds and reported with min/median/mean
+seconds per call. Results are written as JSON so runs can be compared over time;
+with --compare the process exits with status 1 when any median regressed more
+than --max-regression against the baseline file, which lets it gate
+performance-sensitive changes.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from classes.block import Block
+from classes.blockchain import Blockchain
+from classes.chain_audit import ChainAudit
+from classes.coherence_block import CoherenceBlock
+from classes.consensus import EntanglementConsensus
+from classes.transaction import Transaction
+from classes.wallet import Wallet
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_ROUNDS = 5
+
+
+def timed(fn: Callable, rounds: int, calls: int = 1) -> Dict[str, float]:
+    """
+    Times a callable
+
+    Args:
+        fn (Callable): The callable to time
+        rounds (int): Number of measured rounds
+        calls (int): Number of calls per round
+
+    Returns:
+        dict: min, median and mean seconds per call plus the rounds used
+    """
+    fn()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        samples.append((time.perf_counter() - start) / calls)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'rounds': rounds,
+        'calls': calls
+    }
+
+
+def synthetic_transactions(count: int, seed: int = 0) -> List[Transaction]:
+    rng = random.Random(seed)
+    return [
+        Transaction(
+            sender=f'Φx{rng.getrandbits(160):040x}',
+            receiver=f'Φx{rng.getrandbits(160):040x}',
+            amount=round(rng.random() * 100, 4),
+            nonce=i,
+            timestamp=1_700_000_000.0 + i
+        )
+        for i in range(count)
+    ]
+
+
+def synthetic_blockchain(size: int, transactions_per_block: int = 4, seed: int = 0) -> Blockchain:
+    """
+    Builds a valid entangled blockchain of the given size without running consensus
+
+    Args:
+        size (int): Number of blocks, genesis included
+        transactions_per_block (int): Transactions stored in every block
+        seed (int): Seed for the synthetic data
+
+    Returns:
+        Blockchain: The synthetic blockchain
+    """
+    consensus = EntanglementConsensus()
+    blockchain = Blockchain(chain=[], coherence_chain=[], consensus=consensus)
+    blockchain.chain, blockchain.coherence_chain = [], []
+    blockchain.current_chain_index = blockchain.current_coherence_chain_index = 0
+    blockchain.rebuild_indexes()
+    transactions = synthetic_transactions(transactions_per_block, seed)
+    previous_hash, previous_coherence_hash = '0', '0'
+    for index in range(size):
+        block = Block(index=index, previous_hash=previous_hash, transactions=transactions, timestamp=1_700_000_000.0 + index)
+        coherence_block = CoherenceBlock(
+            index=index,
+            previous_hash=previous_coherence_hash,
+            node_id='0',
+            entangled_node_id='1',
+            node_key=index % 100000,
+            entangled_node_key=(index * 7) % 100000,
+            block_hash=block.hash,
+            coherence_key=(index * 13) % 100000,
+            timestamp=1_700_000_000.0 + index
+        )
+        block.coherence_block_hash = coherence_block.hash
+        entangled_hash = consensus.entangle_blocks(block, coherence_block)
+        coherence_block.entangled_hash = entangled_hash
+        blockchain.commit_blocks(block, coherence_block, entangled_hash)
+        previous_hash, previous_coherence_hash = block.hash, coherence_block.hash
+    return blockchain
+
+
+def primitive_benchmarks(rounds: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    blockchain = synthetic_blockchain(2)
+    block, coherence_block = blockchain.chain[-1], blockchain.coherence_chain[-1]
+    transaction = block.transactions[0]
+    entangled_hash = coherence_block.entangled_hash
+    consensus = blockchain.consensus
+
+    results['block.calculate_hash'] = timed(block.calculate_hash, rounds, 1000)
+    results['coherence_block.calculate_hash'] = timed(coherence_block.calculate_hash, rounds, 1000)
+    results['transaction.calculate_hash'] = timed(transaction.calculate_hash, rounds, 1000)
+    results['consensus.is_valid_block'] = timed(lambda: consensus.is_valid_block(block, coherence_block, entangled_hash), rounds, 1000)
+
+    participants = 500
+    rng = random.Random(0)
+    round_args = (
+        [str(i) for i in range(participants)],
+        [rng.randint(0, 99999) for _ in range(participants)],
+        [rng.randint(0, 99999) for _ in range(participants)],
+        [rng.randint(0, 99999) for _ in range(participants)],
+        [rng.randint(0, 99999) for _ in range(participants)]
+    )
+    results[f'consensus.score_round[{participants}]'] = timed(lambda: consensus.score_round(*round_args), rounds, 10)
+
+    results['wallet.create'] = timed(Wallet, rounds, 5)
+    wallet = Wallet()
+    signature = wallet.sign_transaction(transaction.hash)
+    results['wallet.sign_transaction'] = timed(lambda: wallet.sign_transaction(transaction.hash), rounds, 200)
+    results['wallet.verify_signature'] = timed(lambda: wallet.verify_signature(*signature, transaction.hash), rounds, 200)
+    return results
+
+
+def chain_benchmarks(sizes: List[int], rounds: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for size in sizes:
+        blockchain = synthetic_blockchain(size)
+        consensus = blockchain.consensus
+        chain_rounds = max(1, rounds if size <= 10000 else rounds // 2)
+        results[f'consensus.validate_blockchain[{size}]'] = timed(lambda: consensus.validate_blockchain(blockchain), chain_rounds)
+        results[f'blockchain.to_dict+jsonable_encoder[{size}]'] = timed(lambda: jsonable_encoder(blockchain.to_dict()), chain_rounds)
+        results[f'blockchain.to_json[{size}]'] = timed(blockchain.to_json, chain_rounds)
+        # Segmented audit in a process pool, including the pool start-up
+        audit = ChainAudit()
+        results[f'chain_audit.audit[{size}]'] = timed(lambda: audit.audit(blockchain.snapshot()), chain_rounds)
+        # Should stay flat in the chain height: block production only reads the tip
+        blockchain.pending_transactions = synthetic_transactions(blockchain.transaction_limit, seed=1)
+        context = {'node_id': '0', 'entangled_pair_id': '1', 'key': 12345, 'entangled_pair_key': 54321}
+        results[f'blockchain.create_block[{size}]'] = timed(lambda: blockchain.create_block(context), rounds, 100)
+        del blockchain
+    return results
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': time.time()
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str, max_regression: float) -> List[str]:
+    """
+    Compares the medians of a run against a baseline file
+
+    Args:
+        results (dict): Results of the current run
+        baseline_path (str): Path of a JSON file written by a previous run
+        max_regression (float): Allowed relative slowdown, 0.1 means 10%
+
+    Returns:
+        list: Descriptions of the benchmarks that regressed
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file).get('results', {})
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current['median'] / previous['median'] if previous['median'] else 1.0
+        print(f'{name:<55} {previous["median"]:.3e}s -> {current["median"]:.3e}s ({ratio - 1:+.1%})')
+        if ratio - 1 > max_regression:
+            regressions.append(f'{name} regressed {ratio - 1:.1%}')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='no-local-net microbenchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Synthetic chain sizes, e.g. 1000 100000 1000000')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this path')
+    parser.add_argument('--compare', default=None, help='Baseline JSON written by a previous run')
+    parser.add_argument('--max-regression', type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    # The primitives log on every call; measure the work, not the log handlers
+    logging.disable(logging.CRITICAL)
+
+    results = primitive_benchmarks(args.rounds)
+    results.update(chain_benchmarks(args.sizes, args.rounds))
+
+    for name, result in results.items():
+        print(f'{name:<55} min {result["min"]:.3e}s  median {result["median"]:.3e}s')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'metadata': metadata(), 'results': results}, output_file, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        if regressions:
+            print('\n'.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
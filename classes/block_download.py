@@ -0,0 +1,229 @@
+import json
+import os
+import time
+import requests
+import logging
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import List, Optional, Tuple
+
+from classes.blockchain import Blockchain, encode_json
+from classes.chain_audit import check_pair, decode_pair, terminate_pool, verification_pool
+from classes.transaction import Transaction
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class InvalidRange(ValueError):
+    """
+    A downloaded range holds a block that fails verification
+    """
+
+def verify_range(body: bytes, start: int) -> List[tuple]:
+    """
+    Decodes and verifies a range of entangled pairs, runs in the worker processes
+
+    Checks everything that does not need the rest of the chain: heights, the hashes of the
+    blocks against their contents, links inside the range, the entangled hash and the
+    signatures of signed transactions. The link of the first pair to the previous range is
+    checked when the range is applied.
+
+    Args:
+        body (bytes): JSON array served by /blocks
+        start (int): Height of the first pair
+
+    Returns:
+        list: (Block, CoherenceBlock, block bytes, coherence block bytes, pruned) per height
+    """
+    pairs = []
+    for height, pair in enumerate(json.loads(body), start=start):
+        block, coherence_block = decode_pair(pair)
+        pruned = bool((pair.get('block') or {}).get('pruned'))
+        reason = check_pair(block, coherence_block, height, pairs[-1][:2] if pairs else None, pruned=pruned)
+        if reason is not None:
+            raise InvalidRange(f'{reason} at height {height}')
+        if block.coherence_block_hash != coherence_block.hash:
+            block.coherence_block_hash = coherence_block.hash
+        pairs.append((block, coherence_block, encode_json(block.to_dict()), encode_json(coherence_block.to_dict()), pruned))
+    return pairs
+
+class BlockDownloader:
+    """
+    Staged initial block download
+
+    Stages:
+        1. Fetch: ranges of batch_size pairs are requested concurrently from every source
+            serving the target height, round robin, retrying a failed range on the next source
+        2. Decode and verify: each fetched range goes to a process pool, so JSON decoding,
+            model construction, entanglement and signature checks use every core
+        3. Apply: ranges are committed in height order on the calling thread, checking the
+            link between consecutive ranges
+
+    At most max_pending ranges are fetched, queued or verified but not yet applied, so memory
+    stays flat whatever the length of the chain. Small chains are verified in the fetch
+    threads without starting the process pool.
+
+    A source serving a range that fails verification is dropped and the range is fetched
+    from the others; when none is left the download is aborted, never replaced by an
+    unverified one. A range not fetched or not verified within stage_timeout seconds also
+    aborts it, so a hung worker cannot block the start of the node.
+    """
+
+    def __init__(self, sources: List[str], batch_size: int = 256, fetch_concurrency: int = 8, processes: Optional[int] = None, max_pending: int = 16, timeout: float = 10, retries: int = 3, stage_timeout: float = 120):
+        self.sources = list(dict.fromkeys(source.rstrip('/') for source in sources if source))
+        self.batch_size = batch_size
+        self.fetch_concurrency = fetch_concurrency
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max(max_pending, fetch_concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.stage_timeout = stage_timeout
+        self._invalid_sources = set()
+
+    def heads(self) -> List[Tuple[str, dict]]:
+        """
+        Chain heads of the sources that answer /chain_head, highest first
+        """
+        heads = []
+        for source in self.sources:
+            try:
+                response = requests.get(f'{source}/chain_head', timeout=self.timeout)
+                if response.status_code == 200:
+                    heads.append((source, response.json()))
+            except requests.RequestException as e:
+                logger.warning(f'Could not get chain head from {source}: {e}')
+        return sorted(heads, key=lambda item: item[1].get('height') or 0, reverse=True)
+
+    def fetch(self, sources: List[Tuple[str, int]], start: int, end: int) -> Tuple[str, bytes]:
+        """
+        Fetches the range from the sources in turn, starting at the one assigned to it
+
+        Sources that retain full blocks for the range, archive nodes for old ranges, are tried
+        before pruned ones, which only serve headers below their pruned height. Sources that
+        served an invalid range are skipped.
+
+        Returns:
+            tuple: The source that answered and the body of the range
+        """
+        shift = start // self.batch_size
+        valid = [(source, pruned_height) for source, pruned_height in sources if source not in self._invalid_sources]
+        if not valid:
+            raise InvalidRange(f'No source left serving valid blocks {start}-{end}')
+        covering = [source for source, pruned_height in valid if pruned_height <= start]
+        pruned = [source for source, pruned_height in valid if pruned_height > start]
+        ordered = [group[(shift + offset) % len(group)] for group in (covering, pruned) for offset in range(len(group))]
+        errors = []
+        for attempt in range(self.retries):
+            source = ordered[attempt % len(ordered)]
+            try:
+                response = requests.get(f'{source}/blocks', params={'start': start, 'end': end}, timeout=self.timeout)
+                response.raise_for_status()
+                return source, response.content
+            except requests.RequestException as e:
+                errors.append(f'{source}: {e}')
+        raise requests.RequestException(f'Could not fetch blocks {start}-{end}: {"; ".join(errors)}')
+
+    def run(self) -> Optional[Blockchain]:
+        """
+        Downloads the chain of the highest source
+
+        Returns:
+            Blockchain: The verified chain, None when no source serves ranges
+
+        Raises:
+            InvalidRange: When no source serves a valid range or the ranges do not link
+            requests.RequestException: When a range cannot be fetched from any source
+            TimeoutError: When a range is not fetched or verified within stage_timeout
+        """
+        heads = self.heads()
+        if not heads or not heads[0][1].get('height'):
+            return None
+        head = heads[0][1]
+        height = head['height']
+        sources = [(source, source_head.get('pruned_height') or 0) for source, source_head in heads if source_head.get('height') == height and source_head.get('tip') == head.get('tip')]
+        ranges = deque((start, min(start + self.batch_size, height)) for start in range(0, height, self.batch_size))
+        logger.info(f'Downloading {height} blocks in {len(ranges)} ranges from {len(sources)} peers')
+
+        started = time.perf_counter()
+        verifier = verification_pool(self.processes) if len(ranges) > 1 and self.processes > 1 else None
+        fetcher = ThreadPoolExecutor(max_workers=self.fetch_concurrency, thread_name_prefix='block-download')
+
+        def fetch_and_verify(start: int, end: int):
+            source, body = self.fetch(sources, start, end)
+            if verifier is None:
+                done = Future()
+                try:
+                    done.set_result(verify_range(body, start))
+                except InvalidRange as e:
+                    done.set_exception(e)
+                return source, done
+            return source, verifier.submit(verify_range, body, start)
+
+        pending = deque()
+        blockchain = None
+        pruned_height = 0
+        try:
+            while ranges or pending:
+                while ranges and len(pending) < self.max_pending:
+                    start, end = ranges.popleft()
+                    pending.append((start, end, fetcher.submit(fetch_and_verify, start, end)))
+                start, end, fetched = pending.popleft()
+                source, verifying = fetched.result(timeout=self.stage_timeout)
+                try:
+                    pairs = verifying.result(timeout=self.stage_timeout)
+                    if len(pairs) != end - start:
+                        raise InvalidRange(f'Expected {end - start} blocks from height {start}, got {len(pairs)}')
+                except InvalidRange as e:
+                    logger.warning(f'Source {source} served an invalid range, dropping it: {e}')
+                    self._invalid_sources.add(source)
+                    pending.appendleft((start, end, fetcher.submit(fetch_and_verify, start, end)))
+                    continue
+                blockchain = self.apply(blockchain, pairs)
+                pruned_height = max([pruned_height] + [block.index + 1 for block, _, _, _, pruned in pairs if pruned])
+            blockchain.current_chain_index = head.get('current_chain_index', blockchain.current_chain_index)
+            blockchain.current_coherence_chain_index = head.get('current_coherence_chain_index', blockchain.current_coherence_chain_index)
+            blockchain.pending_transactions = [Transaction(**transaction) for transaction in head.get('pending_transactions') or []]
+            blockchain.transaction_limit = head.get('transaction_limit', blockchain.transaction_limit)
+            if pruned_height:
+                logger.warning(f'No archive node served the blocks below height {pruned_height}, keeping their headers only')
+                blockchain.prune_to(pruned_height)
+            elapsed = time.perf_counter() - started
+            logger.info(f'Downloaded {height} blocks in {elapsed:.2f}s ({height / max(elapsed, 1e-9):.0f} blocks/s)')
+            return blockchain
+        except (InvalidRange, requests.RequestException) as e:
+            logger.error(f'Block download failed: {e}')
+            raise
+        except FuturesTimeout:
+            logger.error(f'Block download failed: a range took longer than {self.stage_timeout} seconds')
+            raise
+        except Exception as e:
+            logger.error(f'Block download failed: {e}\n{traceback.format_exc()}')
+            raise
+        finally:
+            fetcher.shutdown(wait=False, cancel_futures=True)
+            if verifier is not None:
+                terminate_pool(verifier)
+
+    def apply(self, blockchain: Optional[Blockchain], pairs: List[tuple]) -> Blockchain:
+        """
+        Commits a verified range on top of the chain downloaded so far
+        """
+        for block, coherence_block, block_json, coherence_block_json, _ in pairs:
+            if blockchain is None:
+                if block.previous_hash != '0' or coherence_block.previous_hash != '0':
+                    raise InvalidRange('First block previous hash is not 0')
+                blockchain = Blockchain(chain=[block], coherence_chain=[coherence_block], current_chain_index=1, current_coherence_chain_index=1)
+                continue
+            if block.previous_hash != blockchain.chain[-1].hash or coherence_block.previous_hash != blockchain.coherence_chain[-1].hash:
+                raise InvalidRange(f'Block at height {block.index} does not follow the previous range')
+            blockchain.commit_blocks(block, coherence_block, coherence_block.entangled_hash, block_json, coherence_block_json)
+        return blockchain
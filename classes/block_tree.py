@@ -0,0 +1,183 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Set, Tuple
+
+from classes.block import Block
+from classes.coherence_block import CoherenceBlock
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+CONNECTED = 'connected'
+ORPHAN = 'orphan'
+INVALID = 'invalid'
+
+class BlockCandidate(BaseModel):
+    block: Block
+    coherence_block: CoherenceBlock
+    entangled_hash: str
+    node_id: Optional[str] = None
+    received: float = Field(default_factory=time.time)
+
+    @property
+    def hash(self) -> str:
+        return self.block.hash
+
+    @property
+    def height(self) -> int:
+        return self.block.index
+
+class BlockTree:
+    """
+    Entangled block pairs received off the tip of the chain
+
+    Candidates hang from a block of the chain or from another candidate and form the side
+    branches the fork choice picks from. Blocks whose parent is unknown wait in the orphan
+    pool, keyed by the missing parent hash, until the parent arrives; the pool is bounded by
+    max_orphans and orphan_ttl seconds. Candidates deeper than max_depth below the tip can no
+    longer win and are pruned.
+
+    Fork choice: the branch reaching the greatest height wins; on a tie the current tip stays,
+    so nodes do not flap between branches of the same length.
+    """
+
+    def __init__(self, max_candidates: int = 1024, max_orphans: int = 256, orphan_ttl: float = 600, max_depth: int = 64):
+        self.max_candidates = max_candidates
+        self.max_orphans = max_orphans
+        self.orphan_ttl = orphan_ttl
+        self.max_depth = max_depth
+        self._candidates: Dict[str, BlockCandidate] = {}
+        self._orphans: OrderedDict = OrderedDict()
+        self._waiting: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def has(self, hash: str) -> bool:
+        return hash in self._candidates or hash in self._orphans
+
+    def add(self, candidate: BlockCandidate, blockchain) -> str:
+        """
+        Links a validated candidate to its parent, or parks it in the orphan pool
+
+        Orphans waiting for the candidate are linked in turn.
+
+        Returns:
+            str: CONNECTED, ORPHAN or INVALID
+        """
+        with self._lock:
+            status = self._link(candidate, blockchain)
+            if status == ORPHAN:
+                self._park(candidate)
+            elif status == CONNECTED:
+                pending = [candidate.hash]
+                while pending:
+                    for child_hash in self._waiting.pop(pending.pop(), set()):
+                        child = self._orphans.pop(child_hash, None)
+                        if child is not None and self._link(child, blockchain) == CONNECTED:
+                            pending.append(child_hash)
+            return status
+
+    def best_branch(self, blockchain) -> Optional[Tuple[int, List[BlockCandidate]]]:
+        """
+        Branch chosen by the fork choice rule, when it beats the current tip
+
+        Returns:
+            tuple: Height of the fork point in the chain and the candidates to apply above it,
+                lowest first; None when the current tip stays
+        """
+        with self._lock:
+            tip_height = len(blockchain.chain) - 1
+            for tip in sorted(self._candidates.values(), key=lambda candidate: (-candidate.height, candidate.received)):
+                if tip.height <= tip_height:
+                    return None
+                suffix = []
+                candidate = tip
+                while candidate is not None:
+                    suffix.append(candidate)
+                    parent_height = blockchain.block_height(candidate.block.previous_hash)
+                    if parent_height is not None:
+                        return parent_height, list(reversed(suffix))
+                    candidate = self._candidates.get(candidate.block.previous_hash)
+                # Part of the branch was pruned, it can no longer be applied
+                for candidate in suffix:
+                    self._candidates.pop(candidate.hash, None)
+            return None
+
+    def discard(self, hash: str):
+        with self._lock:
+            self._candidates.pop(hash, None)
+
+    def prune(self, tip_height: int):
+        """
+        Drops candidates too deep below the tip and orphans over the age or size limits
+        """
+        with self._lock:
+            for hash, candidate in list(self._candidates.items()):
+                if candidate.height <= tip_height - self.max_depth:
+                    del self._candidates[hash]
+            while len(self._candidates) > self.max_candidates:
+                oldest = min(self._candidates.values(), key=lambda candidate: candidate.received)
+                del self._candidates[oldest.hash]
+            now = time.time()
+            while self._orphans:
+                hash, orphan = next(iter(self._orphans.items()))
+                if now - orphan.received < self.orphan_ttl and len(self._orphans) <= self.max_orphans:
+                    break
+                self._drop_orphan(hash)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'candidates': {hash: candidate.height for hash, candidate in self._candidates.items()},
+                'orphans': {hash: orphan.block.previous_hash for hash, orphan in self._orphans.items()}
+            }
+
+    def _link(self, candidate: BlockCandidate, blockchain) -> str:
+        parent_hash = candidate.block.previous_hash
+        parent_height = blockchain.block_height(parent_hash)
+        if parent_height is not None:
+            parent_coherence_hash = blockchain.coherence_chain[parent_height].hash
+        elif parent_hash in self._candidates:
+            parent = self._candidates[parent_hash]
+            parent_height, parent_coherence_hash = parent.height, parent.coherence_block.hash
+        else:
+            return ORPHAN
+
+        if candidate.height != parent_height + 1 or candidate.coherence_block.index != candidate.height:
+            logger.warning(f'Rejected block {candidate.hash}, height {candidate.height} does not follow its parent')
+            return INVALID
+        if candidate.coherence_block.previous_hash != parent_coherence_hash:
+            logger.warning(f'Rejected coherence block {candidate.coherence_block.hash} due to incorrect previous hash')
+            return INVALID
+        if candidate.coherence_block.block_hash != candidate.hash:
+            logger.warning(f'Rejected block {candidate.hash}, coherence block belongs to another block')
+            return INVALID
+        self._candidates[candidate.hash] = candidate
+        return CONNECTED
+
+    def _park(self, candidate: BlockCandidate):
+        self._orphans[candidate.hash] = candidate
+        self._waiting.setdefault(candidate.block.previous_hash, set()).add(candidate.hash)
+        logger.info(f'Block {candidate.hash} waiting for parent {candidate.block.previous_hash}, {len(self._orphans)} orphans')
+        while len(self._orphans) > self.max_orphans:
+            self._drop_orphan(next(iter(self._orphans)))
+
+    def _drop_orphan(self, hash: str):
+        orphan = self._orphans.pop(hash, None)
+        if orphan is None:
+            return
+        waiting = self._waiting.get(orphan.block.previous_hash)
+        if waiting is not None:
+            waiting.discard(hash)
+            if not waiting:
+                del self._waiting[orphan.block.previous_hash]
@@ -1,7 +1,9 @@
 from typing import List, Dict, Optional, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+from fastapi.encoders import jsonable_encoder
 from coincurve import PublicKey
 
+import json
 import logging
 import traceback
 
@@ -11,6 +13,7 @@ from classes.consensus import EntanglementConsensus
 from classes.transaction import Transaction
 from classes.zero_node import ZeroNode
 from classes.wallet import Wallet
+from utils.http_cache import make_etag
 
 logging.basicConfig(
     level= logging.DEBUG,
@@ -23,17 +26,30 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def encode_json(data) -> bytes:
+    """
+    Canonical compact JSON encoding used for cached block bytes and chain exports
+    """
+    return json.dumps(jsonable_encoder(data), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
 class Blockchain(BaseModel):
     chain: Optional[List[Block]] = Field(default_factory=list)
     coherence_chain: Optional[List[CoherenceBlock]] = Field(default_factory=list)
-    entangled_blocks: Optional[Dict[str, tuple[Block, CoherenceBlock]]] = Field(default_factory=dict)
     current_chain_index: Optional[int] = 0
     current_coherence_chain_index: Optional[int] = 0
     pending_transactions: Optional[List[Transaction]] = Field(default_factory=list)
     transaction_limit: Optional[int] = 4
+    retain_blocks: Optional[int] = None
+    pruned_height: Optional[int] = 0
     balances: Optional[Dict[str, Dict[str, float]]] = Field(default_factory=dict)
     nfts: Optional[Dict[str, Dict[str, Any]]] = Field(default_factory=Dict)
     consensus: Any = None
+    _entangled_index: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _block_heights: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _coherence_block_heights: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _block_json: Dict[str, bytes] = PrivateAttr(default_factory=dict)
+    _coherence_block_json: Dict[str, bytes] = PrivateAttr(default_factory=dict)
+    _revision: int = PrivateAttr(default=0)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -41,6 +57,216 @@ class Blockchain(BaseModel):
             self.consensus = EntanglementConsensus()
         if not self.chain:
             self.create_genesis_blocks()
+        else:
+            self.rebuild_indexes()
+
+    # Index functions
+
+    def rebuild_indexes(self):
+        """
+        Rebuilds the entangled hash and block hash -> height indexes from the chains
+
+        The indexes are not serialized; call this after replacing chain and coherence_chain.
+        Cached block bytes of blocks no longer in the chains are dropped and the missing ones
+        are encoded here, on the writer, so reads never have to fill the cache.
+        """
+        self._entangled_index = {
+            coherence_block.entangled_hash: height
+            for height, coherence_block in enumerate(self.coherence_chain)
+            if coherence_block.entangled_hash
+        }
+        self._block_heights = {block.hash: height for height, block in enumerate(self.chain)}
+        self._coherence_block_heights = {coherence_block.hash: height for height, coherence_block in enumerate(self.coherence_chain)}
+        block_json = self._block_json
+        coherence_block_json = self._coherence_block_json
+        self._block_json = {
+            block.hash: block_json.get(block.hash) or encode_json(self.block_document(block, height))
+            for height, block in enumerate(self.chain)
+        }
+        self._coherence_block_json = {
+            coherence_block.hash: coherence_block_json.get(coherence_block.hash) or encode_json(coherence_block.to_dict())
+            for coherence_block in self.coherence_chain
+        }
+
+    def entangled_height(self, entangled_hash: str) -> Optional[int]:
+        return self._entangled_index.get(entangled_hash)
+
+    def is_entangled(self, entangled_hash: str) -> bool:
+        return entangled_hash in self._entangled_index
+
+    def get_entangled_blocks(self, entangled_hash: str) -> Optional[tuple]:
+        """
+        Returns the (Block, CoherenceBlock) pair of an entangled hash, None when unknown
+        """
+        height = self._entangled_index.get(entangled_hash)
+        if height is None:
+            return None
+        return self.chain[height], self.coherence_chain[height]
+
+    def block_height(self, hash: str) -> Optional[int]:
+        return self._block_heights.get(hash)
+
+    def get_block(self, hash: str) -> Optional[Block]:
+        height = self._block_heights.get(hash)
+        return self.chain[height] if height is not None else None
+
+    def get_coherence_block(self, hash: str) -> Optional[CoherenceBlock]:
+        height = self._coherence_block_heights.get(hash)
+        return self.coherence_chain[height] if height is not None else None
+
+    def commit_blocks(self, block: Block, coherence_block: CoherenceBlock, entangled_hash: str, block_json: Optional[bytes] = None, coherence_block_json: Optional[bytes] = None):
+        """
+        Appends an entangled pair of blocks to both chains, indexes them and caches their bytes
+
+        Callers that already encoded the blocks, like the block download workers, pass the bytes.
+        """
+        self.chain.append(block)
+        self.coherence_chain.append(coherence_block)
+        self.current_chain_index += 1
+        self.current_coherence_chain_index += 1
+        height = len(self.chain) - 1
+        self._entangled_index[entangled_hash] = height
+        self._block_heights[block.hash] = height
+        self._coherence_block_heights[coherence_block.hash] = height
+        self._block_json[block.hash] = block_json or encode_json(block.to_dict())
+        self._coherence_block_json[coherence_block.hash] = coherence_block_json or encode_json(coherence_block.to_dict())
+        if self.retain_blocks:
+            self.prune_to(len(self.chain) - self.retain_blocks)
+
+    # Pruning functions
+
+    def prune_to(self, height: int) -> int:
+        """
+        Drops the transactions of the blocks below a height, keeping their headers
+
+        Headers, coherence blocks, balances and indexes stay, so links, entanglement and
+        block production keep working; only the bodies are gone. Called on every commit when
+        retain_blocks is set, so a pruned node keeps at most retain_blocks full bodies.
+
+        Returns:
+            int: Number of blocks pruned
+        """
+        height = min(height, len(self.chain))
+        if height <= self.pruned_height:
+            return 0
+        start = self.pruned_height
+        self.pruned_height = height
+        for index in range(start, height):
+            block = self.chain[index]
+            block.transactions = []
+            self._block_json[block.hash] = encode_json(self.block_document(block, index))
+        self._revision += 1
+        return height - start
+
+    def revert_to(self, height: int) -> List[tuple]:
+        """
+        Removes the blocks above a height from both chains, for a switch to another branch
+
+        Only the reverted suffix is unindexed; the blocks below the fork point keep their
+        indexes and cached bytes.
+
+        Returns:
+            list: (Block, CoherenceBlock, entangled hash) of the removed blocks, lowest first
+        """
+        reverted = []
+        while len(self.chain) > height + 1:
+            block = self.chain.pop()
+            coherence_block = self.coherence_chain.pop()
+            self.current_chain_index -= 1
+            self.current_coherence_chain_index -= 1
+            self._entangled_index.pop(coherence_block.entangled_hash, None)
+            self._block_heights.pop(block.hash, None)
+            self._coherence_block_heights.pop(coherence_block.hash, None)
+            self._block_json.pop(block.hash, None)
+            self._coherence_block_json.pop(coherence_block.hash, None)
+            reverted.append((block, coherence_block, coherence_block.entangled_hash))
+        if reverted:
+            self._revision += 1
+        return list(reversed(reverted))
+
+    # Serialization functions
+
+    def block_json(self, block: Block) -> bytes:
+        """
+        Encoded bytes of a committed block, encoded once and reused by every export
+
+        Read only: the cache is filled by the writer, a block missing from it is encoded
+        without being stored.
+        """
+        body = self._block_json.get(block.hash)
+        if body is None:
+            body = encode_json(self.block_document(block, self._block_heights.get(block.hash)))
+        return body
+
+    def block_document(self, block: Block, height: Optional[int] = None) -> dict:
+        """
+        Document of a block; blocks below pruned_height are headers flagged as pruned
+        """
+        if height is not None and height < self.pruned_height:
+            return {**block.to_dict(), 'pruned': True}
+        return block.to_dict()
+
+    def coherence_block_json(self, coherence_block: CoherenceBlock) -> bytes:
+        body = self._coherence_block_json.get(coherence_block.hash)
+        if body is None:
+            body = encode_json(coherence_block.to_dict())
+        return body
+
+    def pair_json(self, height: int) -> bytes:
+        """
+        Entangled pair at a height as {"block": ..., "coherence_block": ...}, from the cached bytes
+        """
+        return (
+            b'{"block":' + self.block_json(self.chain[height]) +
+            b',"coherence_block":' + self.coherence_block_json(self.coherence_chain[height]) + b'}'
+        )
+
+    def range_json(self, start: int, end: int) -> bytes:
+        """
+        JSON array of the entangled pairs from start up to end, exclusive, clamped to the chain
+        """
+        end = min(end, len(self.chain), len(self.coherence_chain))
+        return b'[' + b','.join([self.pair_json(height) for height in range(max(0, start), end)]) + b']'
+
+    def head(self) -> dict:
+        """
+        Height and tip of the chain with the mempool, what a joining node needs before downloading
+
+        pruned_height advertises the retained range: full blocks are served from that height up.
+        """
+        return {
+            'height': len(self.chain),
+            'tip': self.chain[-1].hash if self.chain else None,
+            'retain_blocks': self.retain_blocks,
+            'current_chain_index': self.current_chain_index,
+            'current_coherence_chain_index': self.current_coherence_chain_index,
+            'pending_transactions': [transaction.to_dict() for transaction in self.pending_transactions] if self.pending_transactions else [],
+            'transaction_limit': self.transaction_limit,
+            'pruned_height': self.pruned_height
+        }
+
+    def snapshot(self) -> dict:
+        """
+        Copy of the coherence chain, the entangled index and the bytes of every pair
+
+        Taken on the writer, so readers working off it for long, like the chain audit, never
+        see a revert_to or a rebuild_indexes half done.
+        """
+        return {
+            'coherence_chain': list(self.coherence_chain),
+            'entangled_index': dict(self._entangled_index),
+            'block_json': [self.block_json(block) for block in self.chain],
+            'coherence_block_json': [self.coherence_block_json(coherence_block) for coherence_block in self.coherence_chain]
+        }
+
+    def invalidate_block_json(self, block: Block):
+        """
+        Re-encodes the cached bytes of a committed block whose fields were corrected in place
+        """
+        height = self._block_heights.get(block.hash)
+        if height is not None:
+            self._block_json[block.hash] = encode_json(self.block_document(block, height))
+        self._revision += 1
 
     # Genesis functions
 
@@ -83,14 +309,9 @@ class Blockchain(BaseModel):
 
             if self.consensus.is_valid_block(epr_block, epr_coherence_block, entangled_hash):
                 logger.info(f'Mining blocks')
-                self.chain.append(epr_block)
-                self.coherence_chain.append(epr_coherence_block)
-                self.current_chain_index += 1
-                self.current_coherence_chain_index += 1
-                self.entangled_blocks[entangled_hash] = (epr_block, epr_coherence_block)
+                self.commit_blocks(epr_block, epr_coherence_block, entangled_hash)
                 logger.info(f'ERP Block: {epr_block.to_dict()}, ERP Coherence Block: {epr_coherence_block.to_dict()}, Entangled Hash: {entangled_hash}')
             else:
-                self.entangled_blocks.pop(entangled_hash, None)
                 logger.error('EPR Block and EPR Coherence Block Entanglement Failed, Please restart the network')
         except Exception as e:
             logger.error(f'Error creating genesis blocks: {e}\n{traceback.format_exc()}')
@@ -351,13 +572,47 @@ class Blockchain(BaseModel):
         wallet.wipe()
         return recovery_key
 
+    def etag(self) -> str:
+        """
+        Validator of the to_json() document: changes with the tip, the mempool or a corrected block
+        """
+        tip = self.chain[-1] if self.chain else None
+        coherence_tip = self.coherence_chain[-1] if self.coherence_chain else None
+        return make_etag(
+            len(self.chain),
+            tip.hash if tip else None,
+            tip.coherence_block_hash if tip else None,
+            len(self.coherence_chain),
+            coherence_tip.hash if coherence_tip else None,
+            self._revision,
+            ','.join([transaction.hash or '' for transaction in list(self.pending_transactions or [])]),
+            self.transaction_limit
+        )
+
+    def to_json(self) -> bytes:
+        """
+        Same document as to_dict() encoded as JSON, assembled from the cached block bytes
+
+        Only the mempool and the indexes are encoded per call; committed blocks are copied.
+        """
+        chain = b','.join([self.block_json(block) for block in list(self.chain)])
+        coherence_chain = b','.join([self.coherence_block_json(coherence_block) for coherence_block in list(self.coherence_chain)])
+        tail = encode_json({
+            'current_chain_index': self.current_chain_index,
+            'current_coherence_chain_index': self.current_coherence_chain_index,
+            'pending_transactions': [transaction.to_dict() for transaction in self.pending_transactions] if self.pending_transactions else [],
+            'transaction_limit': self.transaction_limit,
+            'pruned_height': self.pruned_height
+        })
+        return b'{"chain":[' + chain + b'],"coherence_chain":[' + coherence_chain + b'],' + tail[1:]
+
     def to_dict(self) -> dict:
         return {
             'chain': [block.to_dict() for block in self.chain] if self.chain else [],
             'coherence_chain': [coherence_block.to_dict() for coherence_block in self.coherence_chain] if self.coherence_chain else [],
-            'entangled_blocks': self.entangled_blocks,
             'current_chain_index': self.current_chain_index,
             'current_coherence_chain_index': self.current_coherence_chain_index,
             'pending_transactions': [transaction.to_dict() for transaction in self.pending_transactions] if self.pending_transactions else [],
-            'transaction_limit': self.transaction_limit
+            'transaction_limit': self.transaction_limit,
+            'pruned_height': self.pruned_height
         }
@@ -0,0 +1,290 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import logging
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Optional
+
+from classes.block import Block
+from classes.coherence_block import CoherenceBlock
+from classes.consensus import EntanglementConsensus
+from classes.transaction import Transaction
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+_consensus: Optional[EntanglementConsensus] = None
+
+def verification_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Process pool for chain verification, spawned rather than forked
+
+    Forking a process that runs the API threads copies their locks in whatever state they are,
+    which can deadlock the children.
+    """
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+
+def terminate_pool(executor: ProcessPoolExecutor):
+    """
+    Shuts a verification pool down without waiting, killing workers that hang
+    """
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+def decode_pair(pair: dict) -> tuple:
+    """
+    Block and CoherenceBlock of a {"block": ..., "coherence_block": ...} document
+    """
+    block_data = pair.get('block') or {}
+    transactions = [Transaction(**transaction) for transaction in block_data.get('transactions') or []]
+    return Block(**{**block_data, 'transactions': transactions}), CoherenceBlock(**(pair.get('coherence_block') or {}))
+
+def check_pair(block: Block, coherence_block: CoherenceBlock, height: int, previous: Optional[tuple] = None, verify_signatures: bool = True, pruned: bool = False) -> Optional[str]:
+    """
+    Checks of a pair that only need its predecessor, shared by the block download and the audit
+
+    Args:
+        block (Block): Block at the height
+        coherence_block (CoherenceBlock): Coherence block at the height
+        height (int): Expected height
+        previous (tuple): (Block, CoherenceBlock) below, None for the first pair of a segment
+        verify_signatures (bool): Verify the signatures of signed transactions
+        pruned (bool): The block is a header without transactions, its hash cannot be recomputed
+
+    Returns:
+        str: Why the pair is invalid, None when it is valid
+    """
+    global _consensus
+    if _consensus is None:
+        _consensus = EntanglementConsensus()
+    if block.index != height or coherence_block.index != height:
+        return f'Block at height {height} has index {block.index}'
+    if not pruned and block.hash != block.calculate_hash():
+        return 'Block hash does not match its contents'
+    if coherence_block.hash != coherence_block.calculate_hash():
+        return 'Coherence block hash does not match its contents'
+    if height == 0 and (block.previous_hash != '0' or coherence_block.previous_hash != '0'):
+        return 'First block previous hash is not 0'
+    if previous is not None and block.previous_hash != previous[0].hash:
+        return 'Block previous hash does not match previous block hash'
+    if previous is not None and coherence_block.previous_hash != previous[1].hash:
+        return 'Coherence block previous hash does not match previous coherence block hash'
+    if coherence_block.block_hash != block.hash:
+        return 'Block hash does not match coherence block block hash'
+    if not _consensus.is_valid_block(block, coherence_block, coherence_block.entangled_hash):
+        return 'Invalid entangled hash'
+    if verify_signatures:
+        for transaction in block.transactions:
+            if isinstance(transaction, Transaction) and transaction.is_signed() and not transaction.verify_signature():
+                return f'Invalid signature for transaction {transaction.hash}'
+    return None
+
+def audit_segment(body: bytes, start: int, verify_signatures: bool) -> dict:
+    """
+    Audits a segment of the chain, runs in the worker processes
+
+    Returns:
+        dict: start, end, the first invalid height and its reason, and the hashes the segment
+            links to below and exposes above, for the boundary checks
+    """
+    previous = None
+    first_link = None
+    height = start
+    try:
+        for height, pair in enumerate(json.loads(body), start=start):
+            block, coherence_block = decode_pair(pair)
+            if previous is None:
+                first_link = (block.previous_hash, coherence_block.previous_hash)
+            reason = check_pair(block, coherence_block, height, previous, verify_signatures, bool((pair.get('block') or {}).get('pruned')))
+            if reason is not None:
+                return {'start': start, 'end': height, 'invalid_height': height, 'reason': reason}
+            previous = (block, coherence_block)
+    except Exception as e:
+        return {'start': start, 'end': height, 'invalid_height': height, 'reason': f'Undecodable block: {e}'}
+    return {
+        'start': start,
+        'end': height + 1 if previous is not None else start,
+        'invalid_height': None,
+        'reason': None,
+        'first_link': first_link,
+        'last': (previous[0].hash, previous[1].hash) if previous is not None else None
+    }
+
+class ChainAudit:
+    """
+    Full-chain audit split in segments verified in parallel processes
+
+    The audit works on a snapshot of the chain taken on the writer (Blockchain.snapshot), so
+    it runs in its own thread while the node keeps serving requests and committing blocks.
+    Segments check hash links, coherence links, entangled hashes and optionally transaction
+    signatures; the links across segment boundaries and the entangled hash index are stitched
+    afterwards. The report holds the first invalid height and the throughput of the run; a
+    segment not verified within segment_timeout seconds of its submission fails the audit.
+    """
+
+    def __init__(self, segment_size: int = 2000, processes: Optional[int] = None, segment_timeout: float = 300):
+        self.segment_size = segment_size
+        self.processes = processes or os.cpu_count() or 1
+        self.segment_timeout = segment_timeout
+        self._report: Optional[dict] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, snapshot: dict, verify_signatures: bool = False) -> dict:
+        """
+        Starts an audit in the background unless one is already running
+
+        Args:
+            snapshot (dict): Snapshot of the chain, see Blockchain.snapshot
+
+        Returns:
+            dict: The report of the running audit
+        """
+        with self._lock:
+            if self.running():
+                return dict(self._report)
+            self._report = {
+                'status': 'running',
+                'height': len(snapshot['block_json']),
+                'verify_signatures': verify_signatures,
+                'segments': 0,
+                'first_invalid_height': None,
+                'reason': None,
+                'started': time.time(),
+                'elapsed': None,
+                'blocks_per_second': None
+            }
+            self._thread = threading.Thread(target=self._run, args=(snapshot, verify_signatures), name='chain-audit', daemon=True)
+            self._thread.start()
+            return dict(self._report)
+
+    def report(self) -> Optional[dict]:
+        with self._lock:
+            return dict(self._report) if self._report is not None else None
+
+    def audit(self, snapshot: dict, verify_signatures: bool = False) -> dict:
+        """
+        Audits a snapshot of the chain in the calling thread
+
+        When a segment is not verified within segment_timeout seconds of its submission, the
+        pool is terminated and that segment and every segment not verified yet are reported
+        in failed_segments.
+
+        Returns:
+            dict: first_invalid_height (None when valid), reason, segments and failed_segments
+        """
+        block_json, coherence_block_json = snapshot['block_json'], snapshot['coherence_block_json']
+        if len(block_json) != len(coherence_block_json):
+            return {'first_invalid_height': min(len(block_json), len(coherence_block_json)), 'reason': 'Coherence chain length does not match chain length', 'segments': 0}
+        bounds = [(start, min(start + self.segment_size, len(block_json))) for start in range(0, len(block_json), self.segment_size)]
+        segments = []
+        invalid = []
+        failed = []
+        for height, coherence_block in enumerate(snapshot['coherence_chain']):
+            if snapshot['entangled_index'].get(coherence_block.entangled_hash) != height:
+                invalid.append((height, 'Entangled hash not found in entangled blocks'))
+                break
+
+        def body(start: int, end: int) -> bytes:
+            return b'[' + b','.join([
+                b'{"block":' + block_json[height] + b',"coherence_block":' + coherence_block_json[height] + b'}'
+                for height in range(start, end)
+            ]) + b']'
+
+        if len(bounds) <= 1 or self.processes <= 1:
+            for start, end in bounds:
+                segments.append(audit_segment(body(start, end), start, verify_signatures))
+                if segments[-1]['invalid_height'] is not None:
+                    break
+        else:
+            # Segments are encoded as they are submitted, at most two per process in flight
+            first_invalid = None
+            executor = verification_pool(self.processes)
+            try:
+                pending = {}
+                for index, (start, end) in enumerate(bounds):
+                    if first_invalid is not None and start > first_invalid:
+                        break
+                    pending[executor.submit(audit_segment, body(start, end), start, verify_signatures)] = (start, end, time.monotonic())
+                    if len(pending) >= self.processes * 2:
+                        if not self._collect(pending, segments):
+                            failed = [item[:2] for item in pending.values()] + bounds[index + 1:]
+                            break
+                        first_invalid = min([segment['invalid_height'] for segment in segments if segment['invalid_height'] is not None], default=None)
+                while pending and not failed:
+                    if not self._collect(pending, segments):
+                        failed = [item[:2] for item in pending.values()]
+            finally:
+                terminate_pool(executor)
+
+        segments.sort(key=lambda segment: segment['start'])
+        for previous, segment in zip(segments, segments[1:]):
+            if previous['invalid_height'] is None and segment['invalid_height'] is None and previous['end'] == segment['start'] and segment['first_link'] != previous['last']:
+                invalid.append((segment['start'], 'Segment does not link to the previous segment'))
+        invalid.extend((segment['invalid_height'], segment['reason']) for segment in segments if segment['invalid_height'] is not None)
+        first = min(invalid, key=lambda item: item[0]) if invalid else (None, None)
+        reason = first[1]
+        if failed and reason is None:
+            reason = f'Timed out: {len(failed)} segments not verified within {self.segment_timeout} seconds'
+        return {'first_invalid_height': first[0], 'reason': reason, 'segments': len(segments), 'failed_segments': sorted(failed)}
+
+    def _collect(self, pending: dict, segments: list) -> bool:
+        """
+        Waits for at least one pending segment, until the oldest one runs out of time
+
+        Args:
+            pending (dict): (start, end, submission time) of each pending future
+            segments (list): Receives the results of the verified segments
+
+        Returns:
+            bool: False when the oldest pending segment was not verified within segment_timeout
+        """
+        oldest_start, _, oldest_submitted = min(pending.values(), key=lambda item: item[2])
+        done, _ = wait(list(pending), timeout=max(0, oldest_submitted + self.segment_timeout - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            del pending[future]
+            segments.append(future.result())
+        if not done:
+            logger.error(f'Segment at height {oldest_start} not verified within {self.segment_timeout} seconds')
+        return bool(done)
+
+    def _run(self, snapshot: dict, verify_signatures: bool):
+        started = time.perf_counter()
+        height = len(snapshot['block_json'])
+        try:
+            result = self.audit(snapshot, verify_signatures)
+            if result.get('failed_segments'):
+                status = 'failed'
+            else:
+                status = 'valid' if result['first_invalid_height'] is None else 'invalid'
+        except Exception as e:
+            logger.error(f'Chain audit failed: {e}\n{traceback.format_exc()}')
+            result, status = {'reason': str(e)}, 'failed'
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._report.update(result)
+            self._report.update({
+                'status': status,
+                'elapsed': round(elapsed, 3),
+                'blocks_per_second': round(height / elapsed, 1) if elapsed > 0 else None
+            })
+        logger.info(f'Chain audit {status}: {height} blocks in {elapsed:.2f}s, first invalid height {self._report.get("first_invalid_height")}')
+
+chain_audit = ChainAudit()
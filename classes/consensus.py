@@ -1,9 +1,15 @@
 import hashlib
 from pydantic import BaseModel
+from typing import Dict, List, Optional, Sequence
 import logging
 import traceback
 import random
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 logging.basicConfig(
     level= logging.DEBUG,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -15,6 +21,21 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+KEY_SPACE = 100000
+# 2^(32 * (7 - i)) mod KEY_SPACE, to reduce a SHA-256 digest split in eight 32-bit words
+DIGEST_WORD_WEIGHTS = [pow(2, 32 * (7 - i), KEY_SPACE) for i in range(8)]
+
+def digests_mod_key_space(digests: Sequence[bytes]) -> List[int]:
+    """
+    Computes int(digest, 16) % KEY_SPACE for many SHA-256 digests at once
+
+    With NumPy the digests are reduced as eight 32-bit words per row, which stays within uint64.
+    """
+    if np is None or len(digests) < 16:
+        return [int.from_bytes(digest, 'big') % KEY_SPACE for digest in digests]
+    words = np.frombuffer(b''.join(digests), dtype='>u4').reshape(-1, 8).astype(np.uint64)
+    return ((words * np.array(DIGEST_WORD_WEIGHTS, dtype=np.uint64)).sum(axis=1) % KEY_SPACE).tolist()
+
 class EntanglementConsensus(BaseModel):
     def generate_node_prediction(self, node_key: str, entangled_node_key: str) -> int:
         try:
@@ -131,20 +152,76 @@ class EntanglementConsensus(BaseModel):
     def find_best_prediction_score(self, prediction_scores: dict) -> str:
         try:
             logger.info(f'Finding best prediction score')
-            best_score = float('inf')
-            winner_node = None
-
-            for node_id, prediction_score in prediction_scores.items():
-                logger.info(f'Node ID: {node_id}, Prediction Score: {prediction_score}')
-                if prediction_score < best_score:
-                    logger.info(f'New best score found: {prediction_score}')
-                    best_score = prediction_score
-                    winner_node = node_id
-            logger.info(f'Best prediction score found: {best_score} for Node ID: {winner_node}')
+            ranking = self.rank_prediction_scores(prediction_scores)
+            winner_node = ranking[0][0] if ranking else None
+            logger.info(f'Best prediction score found: {ranking[0][1] if ranking else None} for Node ID: {winner_node}')
             return winner_node
         except Exception as e:
             logger.error(f'Error finding best prediction score: {e}\n{traceback.format_exc()}')
 
+    def rank_prediction_scores(self, prediction_scores: dict) -> List[tuple]:
+        """
+        Ranks prediction scores, lowest first
+
+        Ties are broken by node id so every node picks the same winner regardless of the order
+        in which it received the scores.
+
+        Returns:
+            list: (node_id, score) tuples in ranking order
+        """
+        return sorted(
+            ((node_id, score) for node_id, score in prediction_scores.items() if score is not None),
+            key=lambda item: (item[1], str(item[0]))
+        )
+
+    def score_round(self, node_ids: Sequence[str], node_predictions: Sequence[int], node_keys: Sequence, pair_keys: Sequence, coherence_keys: Sequence[int]) -> dict:
+        """
+        Computes the prediction scores of a whole round in one pass
+
+        Equivalent to calling prediction_score for every participant, without per-node logging,
+        and with the digest reductions and score validation done over arrays.
+
+        Args:
+            node_ids (Sequence[str]): Participants
+            node_predictions (Sequence[int]): Prediction of every participant
+            node_keys (Sequence): Entanglement key of every participant
+            pair_keys (Sequence): Entanglement key of every participant's pair
+            coherence_keys (Sequence[int]): Coherence key every participant scored against
+
+        Returns:
+            dict: winner node id and the ranking table, valid scores first
+        """
+        try:
+            logger.info(f'Scoring round with {len(node_ids)} participants')
+            prediction_digests = []
+            key_digests = []
+            for node_prediction, node_key, pair_key, coherence_key in zip(node_predictions, node_keys, pair_keys, coherence_keys):
+                keys = f'{node_key}{pair_key}'.encode('utf-8')
+                prediction_digests.append(hashlib.sha256(f'{node_prediction}'.encode('utf-8') + keys).digest())
+                key_digests.append(hashlib.sha256(f'{coherence_key}'.encode('utf-8') + keys).digest())
+            predictions = digests_mod_key_space(prediction_digests)
+            hashed_keys = digests_mod_key_space(key_digests)
+
+            if np is not None:
+                prediction_array = np.array(predictions, dtype=np.int64)
+                hashed_key_array = np.array(hashed_keys, dtype=np.int64)
+                valid = ((prediction_array == hashed_key_array) | ((prediction_array >= hashed_key_array * 0.5) & (prediction_array <= hashed_key_array * 1.5))).tolist()
+                scores = (prediction_array - hashed_key_array).tolist()
+            else:
+                valid = [prediction == hashed_key or (hashed_key * 0.5 <= prediction <= hashed_key * 1.5) for prediction, hashed_key in zip(predictions, hashed_keys)]
+                scores = [prediction - hashed_key for prediction, hashed_key in zip(predictions, hashed_keys)]
+
+            table = [
+                {'node_id': node_id, 'prediction': prediction, 'hashed_key': hashed_key, 'score': score if is_valid else None, 'valid': is_valid}
+                for node_id, prediction, hashed_key, score, is_valid in zip(node_ids, predictions, hashed_keys, scores, valid)
+            ]
+            table.sort(key=lambda row: (not row['valid'], row['score'] if row['valid'] else 0, str(row['node_id'])))
+            winner_node = table[0]['node_id'] if table and table[0]['valid'] else None
+            logger.info(f'Round scored, winner: {winner_node}')
+            return {'winner': winner_node, 'ranking': table}
+        except Exception as e:
+            logger.error(f'Error scoring round: {e}\n{traceback.format_exc()}')
+
     def validate_blockchain(self, blockchain) -> bool:
         try:
             logger.info(f'Validating blockchain')
@@ -179,12 +256,13 @@ class EntanglementConsensus(BaseModel):
                 if blockchain.chain[coherence_block.index].coherence_block_hash != coherence_block.hash:
                     logger.info(f'Block coherence block hash does not match coherence block hash, correcting')
                     blockchain.chain[coherence_block.index].coherence_block_hash = coherence_block.hash
+                    blockchain.invalidate_block_json(blockchain.chain[coherence_block.index])
 
                 if blockchain.chain[coherence_block.index].hash != coherence_block.block_hash:
                     logger.info(f'Block hash does not match coherence block block hash')
                     return False
 
-                if coherence_block.entangled_hash not in blockchain.entangled_blocks or blockchain.entangled_blocks[coherence_block.entangled_hash] != (blockchain.chain[coherence_block.index], coherence_block):
+                if blockchain.entangled_height(coherence_block.entangled_hash) != coherence_block.index:
                     logger.info(f'Entangled hash not found in entangled blocks')
                     return False
 
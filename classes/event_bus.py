@@ -0,0 +1,136 @@
+import asyncio
+import json
+import threading
+import logging
+from pydantic import BaseModel
+from typing import Iterable, Optional, Set
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('block_committed', 'chain_reorganized', 'transaction_accepted', 'round_started', 'round_decided')
+
+class Event(BaseModel):
+    seq: int
+    type: str
+    height: int
+    data: bytes
+
+    def to_json(self) -> bytes:
+        """
+        Event document, data is spliced in already encoded
+        """
+        return f'{{"seq":{self.seq},"type":"{self.type}","height":{self.height},"data":'.encode('utf-8') + self.data + b'}'
+
+    def to_sse(self) -> bytes:
+        """
+        Server-sent event frame; block events carry their height as id, so a reconnecting
+        EventSource resumes from Last-Event-ID + 1
+        """
+        frame = f'id: {self.height}\n' if self.type == 'block_committed' else ''
+        return f'{frame}event: {self.type}\ndata: '.encode('utf-8') + self.to_json() + b'\n\n'
+
+class Subscription:
+    """
+    Bounded buffer of one subscriber
+
+    Filled from the writer thread through the event loop of the subscriber. When the buffer
+    overflows the subscriber is marked as lagged and its stream ends with a 'lagged' event;
+    the client reconnects with from_height set to the last block it received.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, types: Set[str], buffer_size: int):
+        self.loop = loop
+        self.types = types
+        self.lagged = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+
+    def offer(self, event: Event):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        """
+        Next event, None on lag; raises asyncio.TimeoutError when nothing arrived in time
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+class EventBus:
+    """
+    Fan-out of node events to push subscribers
+
+    Events are encoded once by the publisher and shared by every subscriber, so the cost of
+    a block commit does not grow with the number of dashboards listening. Publishing with no
+    subscribers is a no-op; callers check active() before encoding.
+    """
+
+    def __init__(self, buffer_size: int = 256, heartbeat: float = 15):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def active(self) -> bool:
+        return bool(self._subscriptions)
+
+    def subscribe(self, types: Optional[Iterable[str]] = None, buffer_size: Optional[int] = None) -> Subscription:
+        """
+        Registers a subscriber, must be called from its event loop
+
+        Args:
+            types (Iterable): Event types wanted, all of EVENT_TYPES by default
+            buffer_size (int): Events buffered before the subscriber is considered lagged
+        """
+        wanted = set(types or EVENT_TYPES) & set(EVENT_TYPES)
+        subscription = Subscription(asyncio.get_running_loop(), wanted, buffer_size or self.buffer_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        logger.info(f'Subscriber added for {sorted(wanted)}, {len(self._subscriptions)} active')
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, height: int, data) -> Optional[Event]:
+        """
+        Delivers an event to every subscriber of its type
+
+        Args:
+            event_type (str): One of EVENT_TYPES
+            height (int): Height of the block, or of the chain when the event happened
+            data: Encoded JSON bytes, or a JSON serializable value
+        """
+        if not self._subscriptions:
+            return None
+        if not isinstance(data, bytes):
+            data = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._seq += 1
+            event = Event(seq=self._seq, type=event_type, height=height, data=data)
+            subscriptions = [subscription for subscription in self._subscriptions if event_type in subscription.types]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The loop of the subscriber is closed
+                self.unsubscribe(subscription)
+        return event
+
+event_bus = EventBus()
@@ -1,20 +1,34 @@
 import hashlib
+import math
 import random
+import threading
 import requests
 import time
 import logging
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel 
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, PrivateAttr
+from typing import Optional, Dict, Any, List, Set
 
-from classes.blockchain import Blockchain
+from classes.blockchain import Blockchain, encode_json
 from classes.transaction import Transaction
 from classes.block import Block
 from classes.coherence_block import CoherenceBlock
 from classes.wallet import Wallet
+from classes.transaction_batcher import TransactionBatcher
+from classes.round_certificate import CertificateEntry, RoundCertificate
+from classes.penalty_tracker import PenaltyTracker
+from classes.peer_client import PeerClient, PeerBackoff
+from classes.peer_manager import PeerManager
+from classes.peer_directory import PeerDirectory
+from classes.event_bus import event_bus
+from classes.block_tree import BlockTree, BlockCandidate, ORPHAN, INVALID
+from classes.chain_audit import chain_audit
+from classes.node_runtime import runtime
 
 logging.basicConfig(
     level= logging.DEBUG,
@@ -42,43 +56,146 @@ class Node(BaseModel):
     actual_block: Optional[Block] = None
     actual_coherence_block: Optional[CoherenceBlock] = None
     actual_entangled_hash: Optional[str] = None
-    penalized_nodes: Optional[Dict[str, int]] = {}
-    times_that_nodes_were_penalized: Optional[Dict[str, int]] = {}
     max_penalization_time: Optional[int] = 600
     max_penalties: Optional[int] = 3
-
-    def __init__(self, **kwargs):
+    penalty_decay_interval: Optional[int] = 3600
+    gossip_fanout: Optional[int] = 4
+    anti_entropy_interval: Optional[float] = 30
+    pairing_concurrency: Optional[int] = 16
+    pairing_sample: Optional[int] = 3
+    pairing_timeout: Optional[float] = 2
+    orphan_pool_size: Optional[int] = 256
+    orphan_ttl: Optional[float] = 600
+    orphan_fetch_depth: Optional[int] = 16
+    fork_depth: Optional[int] = 64
+    audit_interval: Optional[float] = None
+    retain_blocks: Optional[int] = None
+    audit_signatures: Optional[bool] = False
+    public_key: Optional[str] = None
+    peer_keys: Dict[str, str] = {}
+    _transaction_batcher: Optional[TransactionBatcher] = PrivateAttr(default=None)
+    _wallet: Optional[Wallet] = PrivateAttr(default=None)
+    _round_entries: Dict[str, CertificateEntry] = PrivateAttr(default_factory=dict)
+    _penalties: Optional[PenaltyTracker] = PrivateAttr(default=None)
+    _peer_client: Optional[PeerClient] = PrivateAttr(default=None)
+    _peer_manager: Optional[PeerManager] = PrivateAttr(default=None)
+    _peer_directory: Optional[PeerDirectory] = PrivateAttr(default=None)
+    _anti_entropy: Optional[threading.Thread] = PrivateAttr(default=None)
+    _block_tree: Optional[BlockTree] = PrivateAttr(default=None)
+    _auditor: Optional[threading.Thread] = PrivateAttr(default=None)
+    _certificates: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _fetching: Set[str] = PrivateAttr(default_factory=set)
+    _checking_keys: Set[str] = PrivateAttr(default_factory=set)
+    _gossip: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    _round_queued: bool = PrivateAttr(default=False)
+
+    def __init__(self, wallet: Optional[Wallet] = None, **kwargs):
+        """
+        Args:
+            wallet (Wallet): Persisted identity of the node, signs its round entries
+        """
         super().__init__(**kwargs)
         self.url = self.url or f'http://{self.ip}:{self.port}'
         self.peers = self.peers or {}
+        self._transaction_batcher = TransactionBatcher(self.broadcast_transactions)
+        # Rounds and block broadcasts talk to the peers here, one at a time, off the writer thread
+        self._gossip = ThreadPoolExecutor(max_workers=1, thread_name_prefix='node-gossip')
+        self._penalties = PenaltyTracker(self.max_penalization_time, self.max_penalties, self.penalty_decay_interval)
+        self._peer_manager = PeerManager()
+        self._peer_client = PeerClient(headers=self.peer_headers, peer_manager=self._peer_manager)
+        self._peer_directory = PeerDirectory(self.node_id)
+        self._peer_directory.merge(self.peers)
+        self._block_tree = BlockTree(max_orphans=self.orphan_pool_size, orphan_ttl=self.orphan_ttl, max_depth=self.fork_depth)
+        self._wallet = wallet or Wallet()
+        self.public_key = self._wallet.public_key.hex()
+        self.peer_keys[self.node_id] = self.public_key
         if self.blockchain is None:
             self.blockchain = Blockchain()
+        if self.retain_blocks:
+            # A pruned node must still be able to revert to any fork the block tree may choose
+            self.blockchain.retain_blocks = max(self.retain_blocks, self.fork_depth)
+            pruned = self.blockchain.prune_to(len(self.blockchain.chain) - self.blockchain.retain_blocks)
+            logger.info(f'Pruned mode: keeping the last {self.blockchain.retain_blocks} blocks, {pruned} bodies pruned')
         logger.info(f"Node {self.node_id} initialized with IP {self.ip} and port {self.port}")
 
         self.register_peer()
+        self._peer_manager.start_pinging(lambda: self.peers, exclude=self.node_id, on_evict=self.request_eviction)
+        self.start_anti_entropy()
+        self.start_auditing()
+
+    # Admission functions
+
+    def admit_peer(self, node_id: str) -> bool:
+        return self._penalties.admit(node_id)
+
+    @property
+    def peer_headers(self) -> Dict[str, str]:
+        return {'X-Node-Id': self.node_id}
 
     # Peers functions
 
+    def broadcast_targets(self) -> List[tuple]:
+        """
+        Peers to gossip with, healthiest first, skipping peers whose circuit is open
+        """
+        return self._peer_manager.order(self.peers, exclude=self.node_id)
+
+    def gossip_targets(self) -> List[tuple]:
+        """
+        Bounded random sample of reachable peers for delta gossip
+        """
+        return self._peer_manager.sample(self.peers, self.gossip_fanout, exclude=self.node_id)
+
+    def gossip_ttl(self) -> int:
+        return math.ceil(math.log2(len(self.peers) + 1)) + 1
+
+    def request_eviction(self, peer_id: str):
+        """
+        Called from the pinger thread, the eviction itself runs on the writer
+        """
+        runtime.submit('evict_peer', self.evict_peer, peer_id)
+
+    def evict_peer(self, peer_id: str):
+        if peer_id != self.node_id and self.peers.pop(peer_id, None) is not None:
+            logger.info(f'Peer {peer_id} removed from peers list')
+            self.broadcast_peers(self._peer_directory.remove(peer_id))
+
+    def peers_health(self) -> dict:
+        health = self._peer_manager.to_dict()
+        return {peer_id: health.get(peer_url) for peer_id, peer_url in dict(self.peers).items() if peer_id != self.node_id}
+
     def register_peer(self):
         try:
             logger.info(f'Registering peer {self.node_id}')
             self.peers[self.node_id] = self.url
-            self.broadcast_peers()
+            self.broadcast_peers(self._peer_directory.add(self.node_id, self.url, paired=bool(self.entangled_pair_id), public_key=self.public_key))
         except Exception as e:
             logger.error(f'Failed to register peer {self.node_id}: {e}\n{traceback.format_exc()}')
 
-    def broadcast_peers(self):
+    def broadcast_peers(self, entries: Optional[Dict[str, dict]] = None, ttl: Optional[int] = None):
+        """
+        Gossips peer table changes to a random sample of peers
+
+        Args:
+            entries (dict): Versioned entries that changed, by default the entry of this node
+            ttl (int): Remaining hops, by default enough to reach every peer with high probability
+        """
         try:
-            peers = jsonable_encoder(self.peers)
-            for peer_id, peer_url in self.peers.items():
+            entries = entries if entries is not None else self._peer_directory.entries([self.node_id])
+            if not entries:
+                return
+            payload = {'entries': jsonable_encoder(entries), 'ttl': self.gossip_ttl() if ttl is None else ttl}
+            for peer_id, peer_url in self.gossip_targets():
                 if peer_id != self.node_id:
                     try:
                         logger.info(f'Broadcasting peers to {peer_id}')
-                        response = requests.post(f'{peer_url}/receive_peers', json=peers)
-                        if response.status_code == 200:
+                        response = self._peer_client.post(peer_url, '/receive_peers', json=payload)
+                        if response.status_code in (200, 202):
                             logger.info(f'Peers synchronized with {peer_id}')
                         else:
                             logger.warning(f'Failed to sync with {peer_id}. Status Code: {response.status_code}')
+                    except PeerBackoff as e:
+                        logger.warning(f'Skipping peer {peer_id}: {e}')
                     except requests.Timeout:
                         logger.error(f'Timeout error: Could not sync with peer {peer_id}')
                     except requests.ConnectionError:
@@ -89,24 +206,137 @@ class Node(BaseModel):
                     logger.error(f'Error broadcasting peers: {e}\n{traceback.format_exc()}')
 
     def receive_peers(self, peers):
+        """
+        Applies a peer delta and forwards what was new while its ttl lasts
+
+        Args:
+            peers (dict): {'entries': {...}, 'ttl': int}, or a bare node id to URL table
+        """
         try:
             if peers:
-                for peer_id, peer_url in peers.items():
-                    if peer_id not in self.peers:
-                        logger.info(f'Receiving peer {peer_id}')
-                        self.peers[peer_id] = peer_url
-                        logger.info(f'peer {peer_id} added')
+                entries, ttl = (peers.get('entries') or {}, peers.get('ttl', 0)) if 'entries' in peers else (peers, 0)
+                changed = self.apply_peer_entries(entries)
+                if changed and ttl > 0:
+                    self.broadcast_peers(changed, ttl - 1)
         except Exception as e:
             logger.error(f'Failed to receive peers: {e}\n{traceback.format_exc()}')
 
+    def apply_peer_entries(self, entries: Dict[str, dict]) -> Dict[str, dict]:
+        changed = self._peer_directory.merge(entries)
+        for peer_id, entry in changed.items():
+            if entry.get('public_key') and peer_id != self.node_id and self.peer_keys.get(peer_id) != entry['public_key']:
+                self.request_key_check(peer_id, entry['url'], entry['public_key'])
+            if entry['removed']:
+                if peer_id != self.node_id and self.peers.pop(peer_id, None) is not None:
+                    logger.info(f'peer {peer_id} removed')
+                    self._peer_manager.forget(entry['url'])
+            elif self.peers.get(peer_id) != entry['url']:
+                logger.info(f'Receiving peer {peer_id}')
+                self.peers[peer_id] = entry['url']
+                logger.info(f'peer {peer_id} added')
+        return changed
+
+    def request_key_check(self, peer_id: str, peer_url: str, public_key: str):
+        """
+        Starts checking a gossiped public key against the node itself, off the writer thread
+
+        Gossip is unauthenticated, so a key is only trusted once the node at the announced URL
+        answers with that node id and key; a known key is never replaced by gossip.
+        """
+        if peer_id in self.peer_keys:
+            logger.warning(f'Ignoring new public key announced for peer {peer_id}')
+            return
+        if peer_id in self._checking_keys or len(self._checking_keys) >= self.pairing_concurrency:
+            return
+        self._checking_keys.add(peer_id)
+        threading.Thread(target=self.check_peer_key, args=(peer_id, peer_url, public_key), name='peer-key-check', daemon=True).start()
+
+    def check_peer_key(self, peer_id: str, peer_url: str, public_key: str):
+        try:
+            response = self.get_pairing_status(peer_url)
+            status = response.json() if response.status_code == 200 else {}
+            if status.get('node_id') == peer_id and status.get('public_key') == public_key:
+                runtime.submit('learn_peer_key', self.learn_peer_key, peer_id, public_key)
+            else:
+                logger.warning(f'Peer at {peer_url} does not confirm the public key announced for {peer_id}')
+        except PeerBackoff as e:
+            logger.warning(f'Skipping peer {peer_id}: {e}')
+        except requests.RequestException as e:
+            logger.error(f'Could not check the public key of peer {peer_id}: {e}')
+        except Exception as e:
+            logger.error(f'Failed to check the public key of peer {peer_id}: {e}\n{traceback.format_exc()}')
+        finally:
+            self._checking_keys.discard(peer_id)
+
+    def learn_peer_key(self, peer_id: str, public_key: str):
+        """
+        Trusts a public key confirmed by the node itself; keys are never learned from round certificates
+        """
+        current = self.peer_keys.get(peer_id)
+        if current is not None and current != public_key:
+            logger.warning(f'Peer {peer_id} already has a public key, keeping it')
+            return
+        self.peer_keys[peer_id] = public_key
+        logger.info(f'Public key of peer {peer_id} confirmed')
+
+    # Anti-entropy functions
+
+    def sync_peers(self, digest: Dict[str, int]) -> dict:
+        return self._peer_directory.reconcile(digest)
+
+    def anti_entropy(self):
+        """
+        Reconciles the peer table with one random peer, repairing lost or late deltas
+
+        Runs on the anti-entropy thread; the entries received are merged by a writer job.
+        """
+        targets = self._peer_manager.sample(self.peers, 1, exclude=self.node_id)
+        if not targets:
+            return
+        peer_id, peer_url = targets[0]
+        try:
+            response = self._peer_client.post(peer_url, '/sync_peers', json={'digest': self._peer_directory.digest()})
+            if response.status_code != 200:
+                logger.warning(f'Failed to reconcile peers with {peer_id}. Status Code: {response.status_code}')
+                return
+            data = response.json()
+            if data.get('entries'):
+                runtime.submit('/receive_peers', self.receive_peers, {'entries': data['entries'], 'ttl': 0})
+            wanted = self._peer_directory.entries(data.get('wanted') or [])
+            if wanted:
+                self._peer_client.post(peer_url, '/receive_peers', json={'entries': jsonable_encoder(wanted), 'ttl': 0})
+        except PeerBackoff as e:
+            logger.warning(f'Skipping peer {peer_id}: {e}')
+        except requests.RequestException as e:
+            logger.error(f'Could not reconcile peers with {peer_id}: {e}')
+
+    def start_anti_entropy(self):
+        if not self.anti_entropy_interval or (self._anti_entropy is not None and self._anti_entropy.is_alive()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.anti_entropy_interval * random.uniform(0.5, 1.5))
+                try:
+                    self.anti_entropy()
+                except Exception as e:
+                    logger.error(f'Error in peers anti-entropy: {e}\n{traceback.format_exc()}')
+
+        self._anti_entropy = threading.Thread(target=loop, name='peer-anti-entropy', daemon=True)
+        self._anti_entropy.start()
+
     # Entanglement key functions
 
+    def set_entanglement_key(self) -> int:
+        logger.info(f'Generating entanglement key for current node')
+        raw_key =  hashlib.sha256(str(self.node_id).encode('utf-8') + str(self.entangled_pair_id).encode('utf-8') + str(random.randint(1000, 9999)).encode('utf-8')).hexdigest()
+        self.key = int(raw_key, 16) % 100000
+        return self.key
+
     def generate_entanglement_key(self):
         try:
-            logger.info(f'Generating entanglement key for current node')
-            raw_key =  hashlib.sha256(str(self.node_id).encode('utf-8') + str(self.entangled_pair_id).encode('utf-8') + str(random.randint(1000, 9999)).encode('utf-8')).hexdigest()
-            self.key = int(raw_key, 16) % 100000
-            if self.broadcast_key(jsonable_encoder(self.key)):
+            key = runtime.call(self.set_entanglement_key)
+            if self.broadcast_key(jsonable_encoder(key)):
                 return True
         except Exception as e:
             logger.error(f'Failed to generate entanglement key: {e}\n{traceback.format_exc()}')
@@ -116,12 +346,14 @@ class Node(BaseModel):
             logger.info('Broadcasting entanglement key to pair')
             pair_url = self.peers[self.entangled_pair_id]
             try:
-                response = requests.post(f'{pair_url}/receive_pair_key', json={"key": key})
-                if response.status_code == 200:
+                response = self._peer_client.post(pair_url, '/receive_pair_key', json={"key": key})
+                if response.status_code in (200, 202):
                     logger.info('Entangled Key synchronized with pair')
                     return True
                 else:
                     logger.warning(f'Failed to sync entangled key with pair. Status Code: {response.status_code}')
+            except PeerBackoff as e:
+                logger.warning(f'Skipping pair: {e}')
             except requests.Timeout:
                 logger.error(f'Timeout error: Could not sync with pair')
             except requests.ConnectionError:
@@ -141,80 +373,169 @@ class Node(BaseModel):
     
     # Pair functions
   
+    def pairing_status(self) -> dict:
+        return {'node_id': self.node_id, 'entangled_pair_id': self.entangled_pair_id, 'public_key': self.public_key}
+
+    def get_pairing_status(self, peer_url: str) -> requests.Response:
+        """
+        Gets the pairing status of a peer, falling back to /node_info on nodes without /pairing_status
+        """
+        response = self._peer_client.get(peer_url, '/pairing_status', timeout=self.pairing_timeout)
+        if response.status_code == 404:
+            response = self._peer_client.get(peer_url, '/node_info', timeout=5)
+        return response
+
+    def announce_pairing(self):
+        self.broadcast_peers(self._peer_directory.add(self.node_id, self.url, paired=bool(self.entangled_pair_id), public_key=self.public_key))
+
+    def pairing_candidates(self) -> List[tuple]:
+        """
+        Reachable peers that the gossiped directory lists as unentangled, healthiest first
+        """
+        unpaired = self._peer_directory.unpaired()
+        return [(peer_id, peer_url) for peer_id, peer_url in self.broadcast_targets() if peer_id in unpaired]
+
+    def probe_pairing(self, peer_id, peer_url) -> bool:
+        try:
+            logger.info(f'Getting info from peer {peer_id}')
+            response = self.get_pairing_status(peer_url)
+            if response.status_code == 200:
+                logger.info(f'Info got from peer {peer_id}, verifying entangled pair id')
+                if not response.json().get('entangled_pair_id'):
+                    logger.info(f'Peer {peer_id} added to unentangled peers')
+                    return True
+            else:
+                logger.warning(f'Failed to get info from peer {peer_id}. Status Code: {response.status_code}')
+        except PeerBackoff as e:
+            logger.warning(f'Skipping peer {peer_id}: {e}')
+        except requests.Timeout:
+            logger.error(f'Timeout error: Could not sync  with peer {peer_id}')
+        except requests.ConnectionError:
+            logger.error(f'Connection error: Could not reach peer {peer_id}')
+        except requests.RequestException as e:
+            logger.error(f'Unexpected error getting info from peer {peer_id}: {e}\n{traceback.format_exc()}')
+        return False
+
+    def discover_unentangled_peers(self, candidates: List[tuple]) -> List[str]:
+        """
+        Probes candidates concurrently and stops as soon as pairing_sample of them are unentangled
+
+        The slowest or dead peers no longer bound the pairing time: probes still pending
+        when enough candidates answered are cancelled.
+        """
+        unentangled_peers = []
+        if not candidates:
+            return unentangled_peers
+        executor = ThreadPoolExecutor(max_workers=min(self.pairing_concurrency, len(candidates)), thread_name_prefix='pairing-probe')
+        try:
+            futures = {executor.submit(self.probe_pairing, peer_id, peer_url): peer_id for peer_id, peer_url in candidates}
+            for future in as_completed(futures):
+                if future.result():
+                    unentangled_peers.append(futures[future])
+                    if len(unentangled_peers) >= self.pairing_sample:
+                        break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return unentangled_peers
+
+    def reserve_pair(self, peer_id: str) -> Optional[str]:
+        """
+        Reserves the pair before the handshake, runs on the writer thread
+
+        Returns:
+            str: The pair already held, None when peer_id was reserved
+        """
+        if self.entangled_pair_id:
+            return self.entangled_pair_id
+        self.entangled_pair_id = peer_id
+        return None
+
+    def release_pair(self, peer_id: str):
+        if self.entangled_pair_id == peer_id:
+            self.entangled_pair_id = None
+
     def find_pair(self):
+        """
+        Probes and handshakes run in the calling thread, concurrently with the node; the pair
+        is reserved, released and announced by writer jobs
+        """
+        selected_peer = None
         try:
             if self.entangled_pair_id:
                 logger.info('Node already entangled')
                 return HTTPException(status_code=423, detail='Node already entangled')
-            
-            unentangled_peers = []
-            selected_peer = None
-        
-            for peer_id, peer_url in self.peers.items():
-                if peer_id !=  self.node_id:
-                    try:
-                        logger.info(f'Getting info from peer {peer_id}')
-                        response = requests.get(
-                            f'{peer_url}/node_info',
-                            timeout=5
-                            )
-                        if response.status_code == 200:
-                            logger.info(f'Info got from peer {peer_id}, verifying entangled pair id')
-                            remote_data = response.json()
-                            remote_entangled_pair_id = remote_data.get('entangled_pair_id')
-
-                            if not remote_entangled_pair_id:
-                                unentangled_peers.append(peer_id)
-                                logger.info(f'Peer {peer_id} added to unentangled peers')
-                        else:
-                            logger.warning(f'Failed to get info from peer {peer_id}. Status Code: {response.status_code}')
-                    except requests.Timeout:
-                        logger.error(f'Timeout error: Could not sync  with peer {peer_id}')
-                    except requests.ConnectionError:
-                        logger.error(f'Connection error: Could not reach peer {peer_id}')
-                    except requests.RequestException as e:
-                        logger.error(f'Unexpected error getting info from peer {peer_id}: {e}\n{traceback.format_exc()}')
+
+            unentangled_peers = self.discover_unentangled_peers(self.pairing_candidates())
             if len(unentangled_peers) <= 0:
                 logger.info(f'There is no peers availabe for entanglement request')
                 return HTTPException(status_code=404, detail='There is no peers availabe for entanglement request')
             logger.info(f'Selecting random peer from unentangled peers list')
-            random_selection = random.randint(0, len(unentangled_peers) - 1)
-            selected_peer = unentangled_peers[random_selection]
-            logger.info(f'Peer selected: Peer {selected_peer}')
-            self.entangled_pair_id = selected_peer
-            logger.info(f'Entangling with pair {selected_peer}')
-
-            try:
-                reponse = requests.post(
-                    f'{self.peers[selected_peer]}/entanglement_request',
-                    json={'remote_peer_id': self.node_id},
-                    timeout=5
-                    )
-                if reponse.status_code == 200:
+            random.shuffle(unentangled_peers)
+
+            for selected_peer in unentangled_peers:
+                current_pair = runtime.call(self.reserve_pair, selected_peer)
+                if current_pair:
+                    logger.info(f'Entangled with pair {current_pair} while searching')
+                    return HTTPException(status_code=200, detail=f'Entangled with pair {current_pair}')
+                logger.info(f'Peer selected: Peer {selected_peer}')
+                logger.info(f'Entangling with pair {selected_peer}')
+                if self.request_entanglement(selected_peer):
                     logger.info(f'Entangled with pair {selected_peer}')
+                    runtime.call(self.announce_pairing)
                     return HTTPException(status_code=200, detail=f'Entangled with pair {selected_peer}')
-            except requests.Timeout:
-                logger.error(f'Timeout error: Could not sync  with peer {selected_peer}')
-            except requests.ConnectionError:
-                logger.error(f'Connection error: Could not reach peer {selected_peer}')
-            except requests.RequestException as e:
-                logger.error(f'Unexpected error getting info from peer {selected_peer}: {e}\n{traceback.format_exc()}')  
+                runtime.call(self.release_pair, selected_peer)
+            return HTTPException(status_code=409, detail='Could not entangle with any available peer')
         except Exception as e:
             logger.error(f'An error occurs trying to connect node {selected_peer}: {e}\n{traceback.format_exc()}')
 
+    def request_entanglement(self, selected_peer) -> bool:
+        try:
+            reponse = self._peer_client.post(
+                self.peers[selected_peer],
+                '/entanglement_request',
+                json={'remote_peer_id': self.node_id},
+                timeout=5
+                )
+            if reponse.status_code == 200:
+                # The route answers with the HTTPException as body, its status_code is the outcome
+                return (reponse.json() or {}).get('status_code', 200) == 200
+            logger.warning(f'Failed to entangle with peer {selected_peer}. Status Code: {reponse.status_code}')
+        except PeerBackoff as e:
+            logger.warning(f'Skipping peer {selected_peer}: {e}')
+        except requests.Timeout:
+            logger.error(f'Timeout error: Could not sync  with peer {selected_peer}')
+        except requests.ConnectionError:
+            logger.error(f'Connection error: Could not reach peer {selected_peer}')
+        except requests.RequestException as e:
+            logger.error(f'Unexpected error getting info from peer {selected_peer}: {e}\n{traceback.format_exc()}')
+        return False
+
     def entanglement_request(self, remote_peer_id):
+        """
+        Handles the pair handshake of a remote peer
+
+        The pair is reserved by a writer job before the remote is verified, so concurrent
+        requests see the node as entangled, and two nodes that selected each other
+        simultaneously are both accepted without retrying. The verification runs in the
+        calling thread.
+        """
         try:
-            if self.entangled_pair_id:
-                logger.info(f'Current node already entangled')
-                return HTTPException(status_code=423, detail='Current node already entangled')
             if remote_peer_id not in self.peers:
                 logger.error(f'Peer {remote_peer_id} not found in peers list')
                 return HTTPException(status_code=404, detail=f'Peer not found in peers list')
+            current_pair = runtime.call(self.reserve_pair, remote_peer_id)
+            if current_pair == remote_peer_id:
+                logger.info(f'Peer {remote_peer_id} selected the current node too, entangled')
+                return HTTPException(status_code=200, detail=f'Entangled with pair {remote_peer_id}')
+            if current_pair:
+                logger.info(f'Current node already entangled')
+                return HTTPException(status_code=423, detail='Current node already entangled')
             if self.accept_entanglement(remote_peer_id) == True:
-                self.entangled_pair_id = remote_peer_id
                 logger.info(f'Entangled with pair {remote_peer_id}')
+                runtime.call(self.announce_pairing)
                 return HTTPException(status_code=200, detail=f'Entangled with pair {remote_peer_id}')
             else:
+                runtime.call(self.release_pair, remote_peer_id)
                 logger.info(f'Failed to entangle with pair {remote_peer_id}')
                 return HTTPException(status_code=400, detail=f'Failed to entangle with pair {remote_peer_id}')
         except Exception as e:
@@ -227,10 +548,7 @@ class Node(BaseModel):
                 logger.error(f'Peer {remote_peer_id} not found in peers list')
                 return False
             try:
-                response = requests.get(
-                    f'{pair_url}/node_info',
-                    timeout=5
-                    )
+                response = self.get_pairing_status(pair_url)
                 logger.info(f'Getting info from peer {remote_peer_id}')
                 if response.status_code == 200:
                     logger.info(f'Info got from peer {remote_peer_id}, trying to entangle')
@@ -243,6 +561,9 @@ class Node(BaseModel):
                 else:
                     logger.warning(f'Failed to entangle with peer {remote_peer_id}, status code: {response.status_code}')
                     return False
+            except PeerBackoff as e:
+                logger.warning(f'Skipping peer {remote_peer_id}: {e}')
+                return False
             except requests.Timeout:
                 logger.error(f'Timeout error: Could not sync  with peer {remote_peer_id}')
                 return False
@@ -260,24 +581,52 @@ class Node(BaseModel):
 
     def add_transaction(self, transaction: Transaction):
         try:
-            logger.info(f'Validating transaction')
-            if self.validate_transaction(transaction):
-                logger.info(f'Adding transaction {transaction}')
-                if len(self.blockchain.pending_transactions) < self.blockchain.transaction_limit:
-                    self.blockchain.pending_transactions.append(transaction)
-                    logger.info('Transaction added')
-                    self.broadcast_transaction(jsonable_encoder(transaction.to_dict()))
-                    if len(self.blockchain.pending_transactions) >= self.blockchain.transaction_limit:
-                        self.generate_prediction()
-                else:
-                    logger.warning('Transaction limit reached')
-                    self.generate_prediction()
+            return self.add_transactions([transaction])
         except Exception as e:
             logger.error(f'Failed to add transaction: {e}\n{traceback.format_exc()}')
 
+    def add_transactions(self, transactions: List[Transaction]):
+        try:
+            logger.info(f'Validating {len(transactions)} transactions')
+            known_hashes = {transaction.hash for transaction in self.blockchain.pending_transactions}
+            accepted = []
+            duplicates = 0
+            rejected = 0
+            for transaction in transactions:
+                if not self.validate_transaction(transaction):
+                    rejected += 1
+                    continue
+                if transaction.hash in known_hashes:
+                    duplicates += 1
+                    continue
+                if len(self.blockchain.pending_transactions) >= self.blockchain.transaction_limit:
+                    logger.warning('Transaction limit reached')
+                    rejected += 1
+                    continue
+                logger.info(f'Adding transaction {transaction}')
+                self.blockchain.pending_transactions.append(transaction)
+                known_hashes.add(transaction.hash)
+                accepted.append(transaction)
+
+            if accepted:
+                logger.info(f'{len(accepted)} transactions added')
+                encoded = [jsonable_encoder(transaction.to_dict()) for transaction in accepted]
+                self._transaction_batcher.add(encoded)
+                self.publish_transactions(encoded)
+            if len(self.blockchain.pending_transactions) >= self.blockchain.transaction_limit:
+                self.request_round()
+            return {'accepted': [transaction.hash for transaction in accepted], 'duplicates': duplicates, 'rejected': rejected}
+        except Exception as e:
+            logger.error(f'Failed to add transactions: {e}\n{traceback.format_exc()}')
+
     def validate_transaction(self, transaction: Transaction) -> bool:
         try:
-            return isinstance(transaction, Transaction)
+            if not isinstance(transaction, Transaction):
+                return False
+            if transaction.is_signed() and not transaction.verify_signature():
+                logger.warning(f'Invalid signature for transaction {transaction.hash}')
+                return False
+            return True
         except Exception as e:
             logger.error(f'Error validating transaction: {e}\n{traceback.format_exc()}')
 
@@ -291,41 +640,107 @@ class Node(BaseModel):
 
     def broadcast_transaction(self, transaction):
         try:
-            for peer_id, peer_url in self.peers.items():
+            self._transaction_batcher.add([transaction])
+        except Exception as e:
+            logger.error(f'An error ocurred while broadcating transaction: {e}\n{traceback.format_exc()}')
+
+    def broadcast_transactions(self, transactions):
+        try:
+            for peer_id, peer_url in self.broadcast_targets():
                 if peer_id != self.node_id:
-                    logger.info(f'Broadcasting transaction to {peer_id}')
+                    logger.info(f'Broadcasting {len(transactions)} transactions to {peer_id}')
                     try:
-                        receive_response = requests.post(
-                            f'{peer_url}/receive_transaction',
-                            json=transaction,
+                        receive_response = self._peer_client.post(
+                            peer_url,
+                            '/receive_transactions',
+                            json=transactions,
                             timeout=5
                         )
-                        if receive_response.status_code == 200:
+                        if receive_response.status_code in (200, 202):
                             logger.info(f'Pending Transactions synchronized with {peer_id}')
                         else:
-                            logger.warning(f'Failed to sync transaction with peer {peer_id}. Status Code: {receive_response.status_code}')
+                            logger.warning(f'Failed to sync transactions with peer {peer_id}. Status Code: {receive_response.status_code}')
+                    except PeerBackoff as e:
+                        logger.warning(f'Skipping peer {peer_id}: {e}')
                     except requests.Timeout:
-                        logger.error(f'Timeout error: Could not sync transaction with peer {peer_id}')
+                        logger.error(f'Timeout error: Could not sync transactions with peer {peer_id}')
                     except requests.ConnectionError:
                         logger.error(f'Connection error: Could not reach peer {peer_id}')
                     except requests.RequestException as e:
-                        logger.error(f'Unexpected error broadcating transaction to peer {peer_id}: {e}\n{traceback.format_exc()}')           
+                        logger.error(f'Unexpected error broadcating transactions to peer {peer_id}: {e}\n{traceback.format_exc()}')
         except Exception as e:
-            logger.error(f'An error ocurred while broadcating transaction: {e}\n{traceback.format_exc()}')
+            logger.error(f'An error ocurred while broadcating transactions: {e}\n{traceback.format_exc()}')
+
+    def publish_transactions(self, transactions: list):
+        if not event_bus.active():
+            return
+        for transaction in transactions:
+            data = transaction.to_dict() if isinstance(transaction, Transaction) else transaction
+            event_bus.publish('transaction_accepted', self.blockchain.current_chain_index, encode_json(data))
 
     def receive_transaction(self, transaction: Transaction):
         try:
-            if transaction not in self.blockchain.pending_transactions:
+            return self.receive_transactions([transaction])
+        except Exception as e:
+            logger.error(f'Failed to receive transaction: {e}\n{traceback.format_exc()}')
+
+    def receive_transactions(self, transactions: List[Transaction]):
+        try:
+            known_hashes = {transaction.hash for transaction in self.blockchain.pending_transactions}
+            received = []
+            rejected = 0
+            for transaction in transactions:
+                if transaction.hash in known_hashes:
+                    continue
+                if not self.validate_transaction(transaction):
+                    rejected += 1
+                    continue
                 logger.info(f'Receiving transaction {transaction}')
                 self.blockchain.pending_transactions.append(transaction)
-                if len(self.blockchain.pending_transactions) >= self.blockchain.transaction_limit:
-                    self.generate_prediction()
+                known_hashes.add(transaction.hash)
+                received.append(transaction)
+            self.publish_transactions(received)
+            if received and len(self.blockchain.pending_transactions) >= self.blockchain.transaction_limit:
+                self.request_round()
+            return {'received': len(received), 'duplicates': len(transactions) - len(received) - rejected, 'rejected': rejected}
         except Exception as e:
-            logger.error(f'Failed to receive transaction: {e}\n{traceback.format_exc()}')
+            logger.error(f'Failed to receive transactions: {e}\n{traceback.format_exc()}')
     
     # Prediction functions
 
+    def request_round(self):
+        """
+        Queues a prediction round on the gossip thread, once until it starts
+        """
+        if self._round_queued:
+            return
+        self._round_queued = True
+        self._gossip.submit(self.start_round)
+
+    def start_round(self):
+        """
+        Runs on the gossip thread: sends the buffered transactions, then the prediction round
+
+        Peers must hold the transactions before they receive our prediction, so the batcher is
+        flushed first and flush only returns once every batch taken so far was sent.
+        """
+        try:
+            runtime.call(self.dequeue_round)
+            self._transaction_batcher.flush()
+            self.generate_prediction()
+        except Exception as e:
+            logger.error(f'Failed to start round: {e}\n{traceback.format_exc()}')
+
+    def dequeue_round(self):
+        self._round_queued = False
+
     def generate_prediction(self):
+        """
+        Runs the prediction round from the gossip thread
+
+        The steps that change the node run on the writer through runtime.call, the broadcasts to
+        the pair and the peers run here so they never hold the writer.
+        """
         try:
             if not self.entangled_pair_id:
                 logger.info('This node is not entangled with anotherone')
@@ -333,46 +748,80 @@ class Node(BaseModel):
 
             if self.generate_entanglement_key():
                 logger.info('Generating prediction and score')
-                block, coherence_block, entangled_hash = self.generate_blocks()
-                    
+                block, coherence_block, entangled_hash, prediction = runtime.call(self.prepare_round)
+
                 if block and coherence_block and entangled_hash:
-                    self.set_actuals(block, coherence_block, entangled_hash)
-                    self.set_prediction()
-                    if self.broadcast_prediction(self.consensus_predictions[self.node_id]) == True:
-                        if self.set_score(coherence_block.coherence_key) == True:
-                            if self.broadcast_score(self.prediction_scores[self.node_id]) == True:
-                                min_percentage = len(self.peers) * 0.5
-                                if len(self.consensus_predictions) == len(self.prediction_scores) and len(self.prediction_scores) >= min_percentage and len(self.prediction_scores) != 1:
-                                    winner_node = self.blockchain.consensus.find_best_prediction_score(self.prediction_scores)
-                                    if winner_node == self.node_id:
-                                        self.mine_blocks(block, coherence_block, entangled_hash)
-                                        logger.info('Blocks mined by current node')
-                                    else:
-                                        logger.info(f'Blocks mined by node_id: {winner_node}')
-                                else:
-                                    logger.info('Waiting for new predictions')
-                        else:
+                    if self.broadcast_prediction(prediction) == True:
+                        scored = runtime.call(self.score_round, block, coherence_block.coherence_key)
+                        if scored is None:
+                            logger.info('Round already decided')
+                        elif scored == False:
                             logger.info('Failed to set score, retrying')
                             self.generate_prediction()
+                        elif self.broadcast_score(*scored) == True:
+                            runtime.call(self.decide_round, block, coherence_block, entangled_hash)
                 elif block is None or coherence_block is None or entangled_hash is None:
                     logger.warning(f'Blocks not created, retrying')
                     self.generate_prediction()
         except Exception as e:
             logger.error(f'Failed to generate prediction: {e}\n{traceback.format_exc()}')
 
+    def prepare_round(self):
+        block, coherence_block, entangled_hash = self.generate_blocks() or (None, None, None)
+        if not (block and coherence_block and entangled_hash):
+            return block, coherence_block, entangled_hash, None
+        self.set_actuals(block, coherence_block, entangled_hash)
+        self.set_prediction()
+        self.publish_round('round_started', node_id=self.node_id)
+        return block, coherence_block, entangled_hash, self.consensus_predictions.get(self.node_id)
+
+    def is_current_round(self, block) -> bool:
+        return self.actual_block is not None and self.actual_block.hash == block.hash
+
+    def score_round(self, block, coherence_key):
+        """
+        Sets and signs the score of the node for the round of block
+
+        Returns:
+            tuple: The score and the signed entry to broadcast, False if the score could not be
+            set, or None if the round was decided while the prediction was broadcast
+        """
+        if not self.is_current_round(block):
+            return None
+        if self.set_score(coherence_key) != True:
+            return False
+        return self.prediction_scores[self.node_id], self.sign_round_entry()
+
+    def decide_round(self, block, coherence_block, entangled_hash):
+        if not self.is_current_round(block):
+            return
+        min_percentage = len(self.peers) * 0.5
+        if len(self.consensus_predictions) == len(self.prediction_scores) and len(self.prediction_scores) >= min_percentage and len(self.prediction_scores) != 1:
+            winner_node = self.blockchain.consensus.find_best_prediction_score(self.prediction_scores)
+            self.publish_round('round_decided', winner=winner_node)
+            if winner_node == self.node_id:
+                self.mine_blocks(block, coherence_block, entangled_hash)
+                logger.info('Blocks mined by current node')
+            else:
+                logger.info(f'Blocks mined by node_id: {winner_node}')
+        else:
+            logger.info('Waiting for new predictions')
+
     def broadcast_prediction(self, prediction):
         try:
-            for peer_id, peer_url in self.peers.items():
+            for peer_id, peer_url in self.broadcast_targets():
                 if peer_id != self.node_id:
                     logger.info(f'Broadcasting prediction to peer {peer_id}')
                     try:
-                        response = requests.post(f'{peer_url}/receive_prediction', json={"node_id": self.node_id, "prediction": prediction})
-                        if response.status_code == 200:
+                        response = self._peer_client.post(peer_url, '/receive_prediction', json={"node_id": self.node_id, "prediction": prediction})
+                        if response.status_code in (200, 202):
                             logger.info(f'Prediction synchronized with {peer_id}')
                             return True
                         else:
                             logger.warning(f'Failed to sync prediction with peer {peer_id}. Status Code: {response.status_code}')
                             return False
+                    except PeerBackoff as e:
+                        logger.warning(f'Skipping peer {peer_id}: {e}')
                     except requests.Timeout:
                         logger.error(f'Timeout error: Could not sync prediction with peer {peer_id}')
                         return False
@@ -386,19 +835,24 @@ class Node(BaseModel):
             logger.error(f'An error occurs trying to connect node {peer_id}')
             return False
 
-    def broadcast_score(self, score):
+    def broadcast_score(self, score, entry: Optional[CertificateEntry] = None):
         try:
-            for peer_id, peer_url in self.peers.items():
+            payload = {"node_id": self.node_id, "score": score}
+            if entry is not None:
+                payload.update(entry.to_dict())
+            for peer_id, peer_url in self.broadcast_targets():
                 if peer_id != self.node_id:
                     logger.info(f'Broadcasting score to peer {peer_id}')
                     try:
-                        response = requests.post(f'{peer_url}/receive_score', json={"node_id": self.node_id, "score": score})
-                        if response.status_code == 200:
+                        response = self._peer_client.post(peer_url, '/receive_score', json=payload)
+                        if response.status_code in (200, 202):
                             logger.info(f'Score synchronized with {peer_id}')
                             return True
                         else:
                             logger.warning(f'Failed to sync score with peer {peer_id}. Status Code: {response.status_code}')
                             return False
+                    except PeerBackoff as e:
+                        logger.warning(f'Skipping peer {peer_id}: {e}')
                     except requests.Timeout:
                         logger.error(f'Timeout error: Could not sync score with peer {peer_id}')
                         return False
@@ -416,56 +870,45 @@ class Node(BaseModel):
         try:
             if len(self.blockchain.pending_transactions) < self.blockchain.transaction_limit:
                 logger.info(f'Pending transactions limit not reached, penalty applied to node {node_id}')
-                self.penalized_nodes[node_id] = time.time()
-                self.times_that_nodes_were_penalized[node_id] += 1
+                self._penalties.penalize(node_id)
 
-            if len(self.penalized_nodes) > 0:
-                if node_id in self.penalized_nodes:
-                    if self.times_that_nodes_were_penalized[node_id] >= self.max_penalties:
-                        logger.warning(f'Node {node_id} has been penalized too many times and cannot send predictions.')
-                        return False
-            
-                    penalty_time_left = self.max_penalization_time - (time.time() - self.penalized_nodes[node_id])
-                    if penalty_time_left > 0:
-                        logger.warning(f'Node {node_id} is penalized, penalty time remaining: {penalty_time_left:.2f} seconds')
-                        return False
-
-                    self.penalized_nodes.pop(node_id)
-                    logger.info(f'Node {node_id} penalty time has expired')
+            if not self._penalties.admit(node_id):
+                if self._penalties.is_banned(node_id):
+                    logger.warning(f'Node {node_id} has been penalized too many times and cannot send predictions.')
+                else:
+                    logger.warning(f'Node {node_id} is penalized, penalty time remaining: {self._penalties.remaining(node_id):.2f} seconds')
+                return False
 
             logger.info(f'Receiving prediction from node {node_id}')
+            if not self.consensus_predictions:
+                self.publish_round('round_started', node_id=node_id)
             self.consensus_predictions[node_id] = prediction
         except Exception as e:
             logger.error(f'Failed to receive prediction: {e}\n{traceback.format_exc()}')
 
-    def receive_score(self, node_id, score):
+    def receive_score(self, node_id, score, entry: Optional[dict] = None):
         try:
             if len(self.blockchain.pending_transactions) < self.blockchain.transaction_limit:
                 logger.info(f'Pending transactions limit not reached, penalty applied to node {node_id}')
-                self.penalized_nodes[node_id] = time.time()
-                self.times_that_nodes_were_penalized[node_id] += 1
+                self._penalties.penalize(node_id)
 
-            if len(self.penalized_nodes) > 0:
-                if node_id in self.penalized_nodes:
-                    if self.times_that_nodes_were_penalized[node_id] >= self.max_penalties:
-                        logger.warning(f'Node {node_id} has been penalized too many times and cannot send predictions.')
-                        return False
-            
-                    penalty_time_left = self.max_penalization_time - (time.time() - self.penalized_nodes[node_id])
-                    if penalty_time_left > 0:
-                        logger.warning(f'Node {node_id} is penalized, penalty time remaining: {penalty_time_left:.2f} seconds')
-                        return False
-            
-                    self.penalized_nodes.pop(node_id)
-                    logger.info(f'Node {node_id} penalty time has expired')
+            if not self._penalties.admit(node_id):
+                if self._penalties.is_banned(node_id):
+                    logger.warning(f'Node {node_id} has been penalized too many times and cannot send predictions.')
+                else:
+                    logger.warning(f'Node {node_id} is penalized, penalty time remaining: {self._penalties.remaining(node_id):.2f} seconds')
+                return False
 
             logger.info(f'Receiving prediction from node {node_id}')
             self.prediction_scores[node_id] = score
+            if entry:
+                self.record_round_entry(node_id, score, entry)
             min_percentage = len(self.peers) * 0.5
             if len(self.consensus_predictions) == len(self.prediction_scores) and len(self.prediction_scores) >= min_percentage and len(self.prediction_scores) != 1:
                 if len(self.consensus_predictions) == len(self.prediction_scores):
                     logger.info('Consensus reached, selecting winner node')
                     winner_node = self.blockchain.consensus.find_best_prediction_score(self.prediction_scores)
+                    self.publish_round('round_decided', winner=winner_node)
                     if winner_node == self.node_id:
                         self.mine_blocks(self.actual_block, self.actual_coherence_block, self.actual_entangled_hash)
                         logger.info('Blocks minded by current node')
@@ -501,28 +944,92 @@ class Node(BaseModel):
             logger.error(f'Failed to set score: {e}\n{traceback.format_exc()}')
             return False
 
+    # Round certificate functions
+
+    def round_id(self) -> str:
+        previous_block = self.blockchain.chain[-1] if self.blockchain.chain else None
+        return RoundCertificate.round_id_for(self.blockchain.current_chain_index, previous_block.hash if previous_block else '0')
+
+    def sign_round_entry(self) -> Optional[CertificateEntry]:
+        try:
+            entry = CertificateEntry.sign(self._wallet, self.round_id(), self.node_id, self.consensus_predictions[self.node_id], self.prediction_scores[self.node_id])
+            self._round_entries[self.node_id] = entry
+            return entry
+        except Exception as e:
+            logger.error(f'Failed to sign round entry: {e}\n{traceback.format_exc()}')
+
+    def record_round_entry(self, node_id, score, entry: dict):
+        try:
+            certificate_entry = CertificateEntry(**entry)
+            if certificate_entry.node_id != node_id or certificate_entry.score != score:
+                logger.warning(f'Round entry of node {node_id} does not match its score')
+                return False
+            if self.peer_keys.get(node_id) != certificate_entry.public_key or not certificate_entry.verify():
+                logger.warning(f'Round entry of node {node_id} is not signed with its advertised key')
+                return False
+            self._round_entries[node_id] = certificate_entry
+            return True
+        except Exception as e:
+            logger.error(f'Failed to record round entry: {e}\n{traceback.format_exc()}')
+            return False
+
+    def publish_round(self, event_type: str, **data):
+        if event_bus.active():
+            data.update({'round_id': self.round_id(), 'predictions': dict(self.consensus_predictions), 'scores': dict(self.prediction_scores)})
+            event_bus.publish(event_type, self.blockchain.current_chain_index, encode_json(data))
+
+    def round_certificate(self) -> Optional[RoundCertificate]:
+        round_id = self.round_id()
+        entries = [entry for entry in self._round_entries.values() if entry.round_id == round_id]
+        return RoundCertificate(round_id=round_id, entries=entries) if entries else None
+
     # Blocks functions
 
+    def block_context(self) -> dict:
+        """
+        The fields of the node that block production reads, instead of the whole node
+        """
+        return {
+            'node_id': self.node_id,
+            'entangled_pair_id': self.entangled_pair_id,
+            'key': self.key,
+            'entangled_pair_key': self.entangled_pair_key
+        }
+
     def generate_blocks(self):
         try:
             if not self.entangled_pair_id:
                 return None, None, None
-            return self.blockchain.create_block(self.to_dict())
+            return self.blockchain.create_block(self.block_context())
         except Exception as e:
             logger.error(f'Failed to generate blocks: {e}\n{traceback.format_exc()}')
 
+    def commit_blocks(self, block, coherence_block, entangled_hash):
+        """
+        Appends the blocks to the chain and notifies the push subscribers
+        """
+        self.blockchain.commit_blocks(block, coherence_block, entangled_hash)
+        if event_bus.active():
+            height = len(self.blockchain.chain) - 1
+            event_bus.publish('block_committed', height, self.block_event(height))
+
+    def block_event(self, height: int) -> bytes:
+        """
+        Committed blocks at a height as an event payload, built from the cached block bytes
+        """
+        return self.blockchain.pair_json(height)
+
     def mine_blocks(self, block, coherence_block, entangled_hash):
         try:
             if self.blockchain.consensus.is_valid_block(block, coherence_block, entangled_hash):
                 logger.info('Mining blocks')
-                if block not in self.blockchain.chain and coherence_block not in self.blockchain.coherence_chain and not self.blockchain.entangled_blocks.get(entangled_hash, False):
-                    self.blockchain.current_chain_index += 1
-                    self.blockchain.current_coherence_chain_index +=1
-                    self.blockchain.chain.append(block)
-                    self.blockchain.coherence_chain.append(coherence_block)
-                    self.blockchain.entangled_blocks[entangled_hash] = (block, coherence_block)
+                if block not in self.blockchain.chain and coherence_block not in self.blockchain.coherence_chain and not self.blockchain.is_entangled(entangled_hash):
+                    certificate = self.round_certificate()
+                    if certificate is not None:
+                        self.remember_certificate(block.hash, certificate.to_dict(), self.node_id)
+                    self.commit_blocks(block, coherence_block, entangled_hash)
                     self.restart_transactions()
-                    self.broadcast_blocks(block, coherence_block, entangled_hash)
+                    self._gossip.submit(self.broadcast_blocks, block, coherence_block, entangled_hash, certificate)
                     self.clear_actuals()
                     self.restart_transactions()
                     self.validate_blockchain()
@@ -530,28 +1037,30 @@ class Node(BaseModel):
         except Exception as e:
             logger.error(f'Failed to mine blocks: {e}\n{traceback.format_exc()}')
 
-    def broadcast_blocks(self, block, coherence_block, entangled_hash):
+    def broadcast_blocks(self, block, coherence_block, entangled_hash, certificate: Optional[RoundCertificate] = None):
         try:
-            for peer_id, peer_url in self.peers.items():
+            payload = (
+                b'{"block":' + self.blockchain.block_json(block) +
+                b',"coherence_block":' + self.blockchain.coherence_block_json(coherence_block) + b',' +
+                encode_json({'entangled_hash': entangled_hash, 'node_id': self.node_id, 'certificate': certificate.to_dict() if certificate else None})[1:]
+            )
+            for peer_id, peer_url in self.broadcast_targets():
                 if peer_id != self.node_id:
                     try:
                         logger.info(f'Broadcasting blocks to peer {peer_id}')
-                        response = requests.get(f'{peer_url}/blockchain')
-                        if response.status_code == 200:
-                            remote_blockchain = response.json()
+                        response = self._peer_client.get(peer_url, f'/block/{block.hash}')
+                        if response.status_code == 200 and response.json():
+                            logger.info(f'Peer {peer_id} already has block {block.hash}')
+                            continue
+
+                        logger.info(f'Synchronizing blocks with peer {peer_id}')
+                        receive_response = self._peer_client.post(peer_url, '/receive_blocks', data=payload, headers={'Content-Type': 'application/json'})
+                        if receive_response.status_code in (200, 202):
+                            logger.info(f'Block and Coherence Block synchronized with {peer_id}')
                         else:
-                            logger.warning(f'Failed to get blockchain from peer {peer_id}. Statis Code: {response.status_code}')
-
-                        if 'chain' not in remote_blockchain or 'coherence_chain' not in remote_blockchain:
-                            logger.error(f'Invalid blockchain data got from peer {peer_id}')
-
-                        if block not in remote_blockchain['chain'] or coherence_block not in remote_blockchain['coherence_chain']:
-                            logger.info(f'Synchronizing blocks with peer {peer_id}')
-                            receive_response = requests.post(f'{peer_url}/receive_blocks', json={'block': jsonable_encoder(block.to_dict()), 'coherence_block': jsonable_encoder(coherence_block.to_dict()), 'entangled_hash': jsonable_encoder(entangled_hash), 'node_id': jsonable_encoder(self.node_id)})
-                            if receive_response.status_code == 200:
-                                logger.info(f'Block and Coherence Block synchronized with {peer_id}')
-                            else:
-                                logger.warning(f'Failed to sync blocks with peer {peer_id}. Status Code: {receive_response.status_code}')
+                            logger.warning(f'Failed to sync blocks with peer {peer_id}. Status Code: {receive_response.status_code}')
+                    except PeerBackoff as e:
+                        logger.warning(f'Skipping peer {peer_id}: {e}')
                     except requests.Timeout:
                         logger.error(f'Timeout error: Could not sync blocks with peer {peer_id}')
                     except requests.ConnectionError:
@@ -561,84 +1070,279 @@ class Node(BaseModel):
         except Exception as e:
             logger.error(f'An error ocurred while broadcasting blocks: {e}\n{traceback.format_exc()}')
     
-    def receive_blocks(self, block, coherence_block, entangled_hash, node_id):
+    def receive_blocks(self, block, coherence_block, entangled_hash, node_id, certificate: Optional[dict] = None):
         try:
             messages = []
 
-            if len(self.consensus_predictions) < (len(self.peers) * 0.5) and len(self.prediction_scores) < (len(self.peers) * 0.5):
+            # The admission middleware trusts X-Node-Id, the sender in the message is checked here
+            if not self._penalties.admit(node_id):
+                logger.warning(f'Node {node_id} is penalized, blocks ignored')
+                return
+
+            if not self.admit_block(block, node_id, certificate):
                 messages.append(f'Denied blocks, consensus not reached, Penality applied to node {node_id}')
-                self.penalized_nodes[node_id] = time.time()
-                self.times_that_nodes_were_penalized[node_id] += 1
-                
-            block_transactions = []
-                
-            transactions = block.get('transactions')
-            for transaction in transactions:
-                block_transactions.append(Transaction(**transaction))
-                
-                block['transactions'] = block_transactions
-
-                processed_block = Block(**block)
-                processed_coherence_block = CoherenceBlock(**coherence_block)
-
-                if processed_block not in self.blockchain.chain and processed_coherence_block not in self.blockchain.coherence_chain and not self.blockchain.entangled_blocks.get(entangled_hash, False):
-                    if self.blockchain.consensus.is_valid_block(processed_block, processed_coherence_block, entangled_hash):
-                        previous_block = self.blockchain.chain[-1] if self.blockchain.chain else None
-                        if previous_block and processed_block.previous_hash != previous_block.hash:
-                            logger.warning('Rejected block due to inccorect previous hash')
-                            return
-                
-                        previous_coherence_block = self.blockchain.coherence_chain[-1] if self.blockchain.coherence_chain else None
-                        if previous_coherence_block and processed_coherence_block.previous_hash != previous_coherence_block.hash:
-                            logger.warning('Rejected coherence block due to incorrect previous hash')
-                            return
-                        
-                        self.blockchain.current_chain_index += 1
-                        self.blockchain.chain.append(processed_block)
-                        self.clear_actuals()
-                        self.restart_transactions()
-                        messages.append('New Block synchronized ')
-                        self.blockchain.current_coherence_chain_index +=1
-                        self.blockchain.coherence_chain.append(processed_coherence_block)
-                        messages.append('New Coherence Block synchronized ')
-                        self.blockchain.entangled_blocks[entangled_hash] = (processed_block, processed_coherence_block)
-                        messages.append('New Entangled Hash synchronized ')
-                        self.validate_blockchain()
-                    else:
-                        logger.error('Invalid Blocks or Hash')
-                        return
-                else:
-                    messages.append('All blocks and hashes already up to date ')
-                    return
+                self._penalties.penalize(node_id)
+                logger.warning(''.join(messages))
+                return
+
+            candidate = self.block_candidate(block, coherence_block, entangled_hash, node_id)
+            if candidate is None:
+                messages.append('All blocks and hashes already up to date ')
                 logger.info(''.join(messages))
-                return 
+                return
+
+            if not self.hashes_match(candidate) or not self.blockchain.consensus.is_valid_block(candidate.block, candidate.coherence_block, entangled_hash):
+                logger.error('Invalid Blocks or Hash')
+                return
+
+            status = self._block_tree.add(candidate, self.blockchain)
+            if status == INVALID:
+                return
+            if status == ORPHAN:
+                self.request_missing_parents(node_id, candidate.block.previous_hash)
+            if not self.apply_fork_choice():
+                self._block_tree.prune(len(self.blockchain.chain) - 1)
+                messages.append(f'Block {candidate.hash} kept in the block tree ')
+                logger.info(''.join(messages))
+                return
+            messages.append('New Block synchronized ')
+            messages.append('New Coherence Block synchronized ')
+            messages.append('New Entangled Hash synchronized ')
+            logger.info(''.join(messages))
         except Exception as e:
             logger.error(f'Failed to receive blocks: {e}\n{traceback.format_exc()}')
 
+    def block_candidate(self, block: dict, coherence_block: dict, entangled_hash, node_id=None) -> Optional[BlockCandidate]:
+        """
+        Parses a received pair of blocks, None when it is already known
+        """
+        processed_block = Block(**{**block, 'transactions': [Transaction(**transaction) for transaction in block.get('transactions') or []]})
+        processed_coherence_block = CoherenceBlock(**coherence_block)
+        if self.blockchain.block_height(processed_block.hash) is not None or self._block_tree.has(processed_block.hash) or self.blockchain.is_entangled(entangled_hash):
+            return None
+        return BlockCandidate(block=processed_block, coherence_block=processed_coherence_block, entangled_hash=entangled_hash, node_id=node_id)
+
+    @staticmethod
+    def hashes_match(candidate: BlockCandidate) -> bool:
+        """
+        True when the claimed hashes of a received pair are the hashes of its contents
+
+        The entangled hash only covers the claimed hashes, so they are recomputed before the
+        pair can take part in the fork choice.
+        """
+        return candidate.block.hash == candidate.block.calculate_hash() and candidate.coherence_block.hash == candidate.coherence_block.calculate_hash()
+
+    def admit_block(self, block: dict, node_id, certificate: Optional[dict] = None, require_certificate: bool = False) -> bool:
+        """
+        Admission check of every received block, at the tip or fetched as an ancestor
+
+        The block is admitted with a round certificate proving node_id won its round or, without
+        one, when this node reached consensus in the current round. The current round says
+        nothing about an ancestor, so ancestors require the certificate.
+        """
+        if certificate and self.verify_round_certificate(certificate, block, node_id):
+            logger.info(f'Round certificate of node {node_id} verified')
+            self.remember_certificate(block.get('hash'), certificate, node_id)
+            return True
+        if require_certificate:
+            return False
+        return len(self.consensus_predictions) >= len(self.peers) * 0.5 or len(self.prediction_scores) >= len(self.peers) * 0.5
+
+    def remember_certificate(self, hash: str, certificate: dict, node_id):
+        """
+        Keeps the round certificate of an admitted block, so peers fetching it as an ancestor can check it
+        """
+        self._certificates[hash] = (certificate, node_id)
+        while len(self._certificates) > self.orphan_pool_size + self.fork_depth:
+            self._certificates.popitem(last=False)
+
+    def get_block_certificate(self, hash) -> Optional[dict]:
+        entry = self._certificates.get(hash)
+        return {'certificate': entry[0], 'node_id': entry[1]} if entry is not None else None
+
+    def request_missing_parents(self, node_id, parent_hash):
+        """
+        Starts fetching the missing ancestors of an orphan off the writer thread
+        """
+        if parent_hash in self._fetching or len(self._fetching) >= self.pairing_concurrency:
+            return
+        self._fetching.add(parent_hash)
+        threading.Thread(target=self.fetch_missing_parents, args=(node_id, parent_hash), name='parent-fetcher', daemon=True).start()
+
+    def fetch_missing_parents(self, node_id, parent_hash):
+        """
+        Asks the sender of an orphan for its missing ancestors, up to orphan_fetch_depth blocks
+
+        Runs on its own thread, so the writer never waits for the peer; stops as soon as an
+        ancestor links to a known block and hands the ancestors, with their round certificates,
+        to receive_ancestors on the writer.
+        """
+        peer_url = self.peers.get(node_id)
+        requested_hash = parent_hash
+        ancestors = []
+        try:
+            for _ in range(self.orphan_fetch_depth):
+                if peer_url is None or self._block_tree.has(parent_hash) or self.blockchain.block_height(parent_hash) is not None:
+                    break
+                logger.info(f'Fetching missing block {parent_hash} from peer {node_id}')
+                block_response = self._peer_client.get(peer_url, f'/block/{parent_hash}', timeout=5)
+                block = block_response.json() if block_response.status_code == 200 else None
+                if not block:
+                    break
+                coherence_response = self._peer_client.get(peer_url, f'/coherence_block/{block.get("coherence_block_hash")}', timeout=5)
+                coherence_block = coherence_response.json() if coherence_response.status_code == 200 else None
+                if not coherence_block:
+                    break
+                certificate_response = self._peer_client.get(peer_url, f'/certificate/{parent_hash}', timeout=5)
+                proof = (certificate_response.json() if certificate_response.status_code == 200 else None) or {}
+                entangled_hash = coherence_block.get('entangled_hash')
+                candidate = self.block_candidate(block, coherence_block, entangled_hash, node_id)
+                if candidate is None or candidate.hash != parent_hash or not self.hashes_match(candidate):
+                    logger.warning(f'Peer {node_id} sent an invalid block for {parent_hash}')
+                    break
+                ancestors.append((candidate, block, proof.get('certificate'), proof.get('node_id')))
+                parent_hash = candidate.block.previous_hash
+        except PeerBackoff as e:
+            logger.warning(f'Skipping peer {node_id}: {e}')
+        except requests.RequestException as e:
+            logger.error(f'Could not fetch missing blocks from peer {node_id}: {e}')
+        except Exception as e:
+            logger.error(f'Failed to fetch missing blocks: {e}\n{traceback.format_exc()}')
+        finally:
+            self._fetching.discard(requested_hash)
+        if ancestors:
+            runtime.submit('receive_ancestors', self.receive_ancestors, ancestors)
+
+    def receive_ancestors(self, ancestors: list):
+        """
+        Admits fetched ancestors into the block tree, nearest first, and applies the fork choice
+
+        Every ancestor needs a verified round certificate and passes the same validation as a
+        block received at the tip; the first one failing stops the branch.
+        """
+        try:
+            for candidate, block, certificate, winner in ancestors:
+                if self._block_tree.has(candidate.hash) or self.blockchain.block_height(candidate.hash) is not None:
+                    break
+                if not self.admit_block(block, winner, certificate, require_certificate=True):
+                    logger.warning(f'Ancestor {candidate.hash} from peer {candidate.node_id} not admitted, no verified round certificate')
+                    break
+                if not self.blockchain.consensus.is_valid_block(candidate.block, candidate.coherence_block, candidate.entangled_hash):
+                    logger.warning(f'Peer {candidate.node_id} sent an invalid block for {candidate.hash}')
+                    break
+                if self._block_tree.add(candidate, self.blockchain) != ORPHAN:
+                    break
+            if not self.apply_fork_choice():
+                self._block_tree.prune(len(self.blockchain.chain) - 1)
+        except Exception as e:
+            logger.error(f'Failed to receive ancestors: {e}\n{traceback.format_exc()}')
+
+    def apply_fork_choice(self) -> bool:
+        """
+        Switches to the best branch of the block tree when it beats the current tip
+
+        Only the differing suffix is applied: the blocks above the fork point are reverted into
+        the block tree, so the node can switch back, and the branch is committed on top.
+
+        Returns:
+            bool: True when the tip changed
+        """
+        branch = self._block_tree.best_branch(self.blockchain)
+        if branch is None:
+            return False
+        fork_height, suffix = branch
+        if fork_height + 1 < self.blockchain.pruned_height:
+            logger.warning(f'Branch forks at height {fork_height}, below the pruned height {self.blockchain.pruned_height}')
+            return False
+        reverted = self.blockchain.revert_to(fork_height)
+        if reverted:
+            logger.info(f'Switching branch at height {fork_height}, {len(reverted)} blocks reverted, {len(suffix)} applied')
+            if event_bus.active():
+                event_bus.publish('chain_reorganized', fork_height, encode_json({'fork_height': fork_height, 'reverted': [block.hash for block, _, _ in reverted]}))
+            for block, coherence_block, entangled_hash in reverted:
+                self._block_tree.add(BlockCandidate(block=block, coherence_block=coherence_block, entangled_hash=entangled_hash), self.blockchain)
+        for candidate in suffix:
+            self._block_tree.discard(candidate.hash)
+            self.commit_blocks(candidate.block, candidate.coherence_block, candidate.entangled_hash)
+        self._block_tree.prune(len(self.blockchain.chain) - 1)
+        self.clear_actuals()
+        self.requeue_transactions([transaction for block, _, _ in reverted for transaction in block.transactions], suffix)
+        self.validate_blockchain()
+        return True
+
+    def requeue_transactions(self, reverted: list, branch: List[BlockCandidate]):
+        """
+        Mempool after a branch switch: the reverted transactions the new branch does not
+        include go back to it, and the pending ones the branch committed leave it
+        """
+        try:
+            committed = {transaction.hash for candidate in branch for transaction in candidate.block.transactions}
+            pending = []
+            for transaction in reverted + list(self.blockchain.pending_transactions or []):
+                if isinstance(transaction, dict):
+                    transaction = Transaction(**transaction)
+                if transaction.hash not in committed:
+                    committed.add(transaction.hash)
+                    pending.append(transaction)
+            self.blockchain.pending_transactions = pending
+            logger.info(f'{len(pending)} transactions pending after the branch switch')
+        except Exception as e:
+            logger.error(f'Error requeuing transactions: {e}\n{traceback.format_exc()}')
+
+    def verify_round_certificate(self, certificate: dict, block: dict, node_id) -> bool:
+        try:
+            round_certificate = RoundCertificate(**certificate)
+            round_id = RoundCertificate.round_id_for(block.get('index'), block.get('previous_hash'))
+            # When the node took part in the round, what it received must all be in the certificate
+            in_round = round_id == self.round_id()
+            winner_node = round_certificate.verify(
+                round_id,
+                len(self.peers) * 0.5,
+                self.blockchain.consensus,
+                self.peer_keys,
+                self.consensus_predictions if in_round else None,
+                self.prediction_scores if in_round else None
+            )
+            if winner_node is None or winner_node != node_id:
+                logger.warning(f'Round certificate does not prove node {node_id} won the round')
+                return False
+            return True
+        except Exception as e:
+            logger.error(f'Failed to verify round certificate: {e}\n{traceback.format_exc()}')
+            return False
+
     def get_block(self, hash):
         try:
             logger.info('Getting block')
-            for block in self.blockchain.chain:
-                if block.hash == hash:
-                    logger.info('Block found')
-                    return block
-                logger.warning('Block not found')
-                return None
+            block = self.blockchain.get_block(hash)
+            if block is not None:
+                logger.info('Block found')
+                return block
+            logger.warning('Block not found')
+            return None
         except Exception as e:
             logger.error(f'Failed to get block: {e}\n{traceback.format_exc()}')
             
     def get_coherence_block(self, hash):
         try:
             logger.info('Getting block')
-            for coherence_block in self.blockchain.coherence_chain:
-                if coherence_block.hash == hash:
-                    logger.info('Coherence Block found')
-                    return coherence_block
-                logger.warning('Coherence Block not found')
-                return None
+            coherence_block = self.blockchain.get_coherence_block(hash)
+            if coherence_block is not None:
+                logger.info('Coherence Block found')
+                return coherence_block
+            logger.warning('Coherence Block not found')
+            return None
         except Exception as e:
             logger.error(f'Failed to get block: {e}\n{traceback.format_exc()}')
 
+    def get_block_json(self, hash) -> bytes:
+        block = self.get_block(hash)
+        return self.blockchain.block_json(block) if block is not None else b'null'
+
+    def get_coherence_block_json(self, hash) -> bytes:
+        coherence_block = self.get_coherence_block(hash)
+        return self.blockchain.coherence_block_json(coherence_block) if coherence_block is not None else b'null'
+
     # Actuals functions
 
     def clear_actuals(self):
@@ -649,6 +1353,7 @@ class Node(BaseModel):
             self.actual_entangled_hash = None
             self.consensus_predictions = {}
             self.prediction_scores = {}
+            self._round_entries = {}
         except Exception as e:
             logger.error(f'Failed to clear actuals: {e}\n{traceback.format_exc()}')    
 
@@ -670,6 +1375,37 @@ class Node(BaseModel):
         except Exception as e:
             logger.error(f'Failed to validate blockchain: {e}\n{traceback.format_exc()}')
 
+    def audit_blockchain(self, verify_signatures: Optional[bool] = None) -> dict:
+        """
+        Starts a parallel audit of the whole chain in the background, see ChainAudit
+
+        Returns:
+            dict: The report of the audit, status 'running' until it finishes
+        """
+        if chain_audit.running():
+            return chain_audit.report()
+        # The snapshot is taken on the writer, never while a branch switch is half applied
+        snapshot = runtime.call(self.blockchain.snapshot)
+        return chain_audit.start(snapshot, self.audit_signatures if verify_signatures is None else verify_signatures)
+
+    def audit_report(self) -> Optional[dict]:
+        return chain_audit.report()
+
+    def start_auditing(self):
+        if not self.audit_interval or (self._auditor is not None and self._auditor.is_alive()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.audit_interval)
+                try:
+                    self.audit_blockchain()
+                except Exception as e:
+                    logger.error(f'Error starting chain audit: {e}\n{traceback.format_exc()}')
+
+        self._auditor = threading.Thread(target=loop, name='chain-auditor', daemon=True)
+        self._auditor.start()
+
     def sync_blockchain(self):
         try:
             longest_chain = self.blockchain.chain
@@ -677,17 +1413,16 @@ class Node(BaseModel):
             source_peer = None
             peers_blockchain = {}
 
-            for peer_id, peer_url in self.peers.items():
+            for peer_id, peer_url in list(self.peers.items()):
                 try:
                     
                     logger.info(f'Getting blockchain from peer {peer_id}')
-                    response = requests.get(
-                        f'{peer_url}/blockchain',
-                        timeout=5
-                    )
+                    response = self._peer_client.get(peer_url, '/blockchain', timeout=5)
                     response.raise_for_status()
                     response_data = response.json()
                     peers_blockchain[peer_id] = response_data
+                except PeerBackoff as e:
+                    logger.warning(f'Skipping peer {peer_id}: {e}')
                 except requests.Timeout:
                     logger.error(f'Timeout error: Could not get blockchain from peer {peer_id}')
                 except requests.ConnectionError:
@@ -712,8 +1447,7 @@ class Node(BaseModel):
                         source_peer = peer_id
                     else:
                         logger.warning(f'Peer {peer_id} chain and coherence chain are not valid, penalty applied')
-                        self.penalized_nodes[peer_id] = time.time()
-                        self.times_that_nodes_were_penalized[peer_id] += 1
+                        self._penalties.penalize(peer_id)
                         return
 
             updated = False
@@ -722,6 +1456,7 @@ class Node(BaseModel):
             if longest_chain != self.blockchain.chain and longest_coherence_chain != self.blockchain.coherence_chain:
                 self.blockchain.chain = longest_chain
                 self.blockchain.coherence_chain = longest_coherence_chain
+                self.blockchain.rebuild_indexes()
                 messages.append(f'Your chain and coherence chain was updated from peer {source_peer}')
                 updated = True
 
@@ -771,27 +1506,42 @@ class Node(BaseModel):
             logger.error(f'Failed to recover wallet: {e}\n{traceback.format_exc()}')
 
 
-    def to_dict(self):
+    def to_json(self, blockchain_json: Optional[bytes] = None) -> bytes:
+        """
+        Same document as to_dict() encoded as JSON, with the chain spliced in from Blockchain.to_json()
+
+        Args:
+            blockchain_json (bytes): Already encoded chain, encoded here when not given
+        """
+        node_info = self.to_dict(include_blockchain=False) or {}
+        node_info.pop('blockchain', None)
+        blockchain_json = blockchain_json if blockchain_json is not None else self.blockchain.to_json()
+        body = encode_json(node_info)
+        return body[:-1] + (b',' if node_info else b'') + b'"blockchain":' + blockchain_json + b'}'
+
+    def to_dict(self, include_blockchain: bool = True):
             try:
+                penalties = self._penalties.to_dict()
                 return {
                     "node_id": self.node_id,
                     "ip": self.ip,
                     "port": self.port,
                     "url": self.url,
-                    'blockchain': self.blockchain.to_dict(),
+                    'blockchain': self.blockchain.to_dict() if include_blockchain else None,
                     "entangled_pair_id": self.entangled_pair_id if self.entangled_pair_id else None,
                     "key": self.key if self.key else None,
                     "entangled_pair_key": self.entangled_pair_key if self.entangled_pair_key else None,
-                    "peers": self.peers,
-                    "consensus_predictions": self.consensus_predictions if self.consensus_predictions else None,
-                    "prediction_scores": self.prediction_scores if self.prediction_scores else None,
+                    "peers": dict(self.peers),
+                    "consensus_predictions": dict(self.consensus_predictions) if self.consensus_predictions else None,
+                    "prediction_scores": dict(self.prediction_scores) if self.prediction_scores else None,
                     "actual_block": self.actual_block if self.actual_block else None,
                     "actual_coherence_block": self.actual_coherence_block if self.actual_coherence_block else None,
                     "actual_entangled_hash": self.actual_entangled_hash if self.actual_entangled_hash else None,
-                    "penalized_nodes": self.penalized_nodes if self.penalized_nodes else None,
-                    "times_that_nodes_were_penalized": self.times_that_nodes_were_penalized if self.times_that_nodes_were_penalized else None,
+                    "penalized_nodes": penalties['penalized_nodes'] or None,
+                    "times_that_nodes_were_penalized": penalties['times_that_nodes_were_penalized'] or None,
                     "max_penalization_time": self.max_penalization_time,
-                    "max_penalties": self.max_penalties
+                    "max_penalties": self.max_penalties,
+                    "public_key": self.public_key
                 }
             except Exception as e:
                 logger.error(f'Failed to convert node to dict: {e}\n{traceback.format_exc()}')
\ No newline at end of file
@@ -0,0 +1,203 @@
+import asyncio
+import math
+import threading
+import time
+import uuid
+import logging
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from classes.node_store import NodeStore
+from classes.rate_limiter import RateLimiter
+from utils.request_profiler import profiler
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Bounded writer queue per operation and the load-shedding policy applied when it is full:
+# 'reject' answers 429 to the newest message, 'drop_oldest' sheds the oldest queued one
+QUEUE_LIMITS: Dict[str, Tuple[int, str]] = {
+    '/add_transaction': (2000, 'reject'),
+    '/add_transactions': (200, 'reject'),
+    '/receive_transaction': (2000, 'drop_oldest'),
+    '/receive_transactions': (200, 'drop_oldest'),
+    '/receive_prediction': (100, 'reject'),
+    '/receive_score': (100, 'reject'),
+    '/receive_blocks': (100, 'reject'),
+    '/receive_peers': (50, 'drop_oldest'),
+    '/receive_pair_key': (10, 'reject'),
+    'evict_peer': (100, 'drop_oldest'),
+    'receive_ancestors': (50, 'drop_oldest'),
+    'learn_peer_key': (100, 'drop_oldest')
+}
+DEFAULT_QUEUE_LIMIT = (1000, 'reject')
+
+class NodeRuntime:
+    """
+    Owner of the node state inside the API process
+
+    Every mutation runs on a single writer thread, so Node methods never race each other no
+    matter which threadpool thread served the request. After each mutation the state is
+    published to the NodeStore, when one is configured, so read-only workers can serve
+    /blockchain, /block/{hash} and /peers from it.
+
+    Reads in the owning process use the live node directly; they never wait for the writer.
+    Gossip handlers enqueue their work with submit() and answer immediately with a job id,
+    so peers calling each other never hold a request open while the other side is busy.
+    """
+
+    def __init__(self, store: Optional[NodeStore] = None, max_jobs: int = 10000, rate_limiter: Optional[RateLimiter] = None):
+        self.node = None
+        self.store = store if store is not None else NodeStore.from_env()
+        self.max_jobs = max_jobs
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self._jobs: OrderedDict = OrderedDict()
+        self._queued: Dict[str, deque] = {}
+        self._queue_lock = threading.Lock()
+        self._job_seconds = 0.01
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='node-writer')
+
+    def require_node(self, detail: str = "El nodo no está inicializado."):
+        if self.node is None:
+            raise HTTPException(status_code=400, detail=detail)
+        return self.node
+
+    def admit(self, peer_id: str) -> bool:
+        """
+        Admission filter for inbound gossip, checked before the request body is parsed
+        """
+        return self.node is None or self.node.admit_peer(peer_id)
+
+    def rate_limit(self, peer_id: str, message_type: str) -> float:
+        """
+        Returns 0 when the peer may send this message type now, otherwise seconds to wait
+        """
+        return self.rate_limiter.check(peer_id, message_type)
+
+    async def start(self, factory: Callable, *args, **kwargs):
+        """
+        Creates the node on the writer thread
+
+        Args:
+            factory (Callable): Function returning the node, usually run_node
+
+        Returns:
+            Node: The running node, or None when it was already running
+        """
+        def create():
+            if self.node is not None:
+                return None
+            self.node = factory(*args, **kwargs)
+            self.publish()
+            return self.node
+        return await asyncio.wrap_future(self._writer.submit(create))
+
+    async def write(self, operation: Callable, *args, **kwargs) -> Any:
+        """
+        Runs a mutating operation on the writer thread and waits for its result
+
+        Only for operations whose caller needs the answer, like the pairing handshake.
+
+        Args:
+            operation (Callable): Bound Node method or any callable mutating the node
+
+        Returns:
+            Any: The result of the operation
+        """
+        apply = profiler.wrap(self._apply, ' [writer]', getattr(operation, '__name__', None))
+        return await asyncio.wrap_future(self._writer.submit(apply, operation, args, kwargs))
+
+    def call(self, operation: Callable, *args, **kwargs) -> Any:
+        """
+        Runs a mutating operation on the writer thread and blocks until it is done
+
+        For node code running in the threadpool that needs the answer mid-way, like the pairing
+        handshake; never call it from the writer thread itself.
+        """
+        return self._writer.submit(self._apply, operation, args, kwargs).result()
+
+    def submit(self, name: str, operation: Callable, *args, **kwargs) -> str:
+        """
+        Enqueues a mutating operation on the writer thread without waiting for it
+
+        Args:
+            name (str): Name of the operation, reported by job() and used by the profiler
+            operation (Callable): Bound Node method or any callable mutating the node
+
+        Returns:
+            str: The tracking id of the job
+        """
+        job_id = uuid.uuid4().hex
+        limit, policy = QUEUE_LIMITS.get(name, DEFAULT_QUEUE_LIMIT)
+        with self._queue_lock:
+            queued = self._queued.setdefault(name, deque())
+            if len(queued) >= limit:
+                if policy != 'drop_oldest':
+                    retry_after = max(1, math.ceil(len(queued) * self._job_seconds))
+                    logger.warning(f'Queue of {name} is full, rejecting message')
+                    raise HTTPException(status_code=429, detail="Cola de mensajes llena.", headers={'Retry-After': str(retry_after)})
+                shed_job_id = queued.popleft()
+                self._jobs.get(shed_job_id, {})['status'] = 'shed'
+                logger.warning(f'Queue of {name} is full, shedding job {shed_job_id}')
+            queued.append(job_id)
+
+        self._jobs[job_id] = {'job_id': job_id, 'operation': name, 'status': 'queued', 'submitted': time.time(), 'finished': None, 'result': None}
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        self._writer.submit(self._run_job, job_id, name, profiler.wrap(self._apply, ' [writer]', name), operation, args, kwargs)
+        return job_id
+
+    def job(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id)
+
+    def _run_job(self, job_id: str, name: str, apply: Callable, operation: Callable, args: tuple, kwargs: dict):
+        with self._queue_lock:
+            queued = self._queued.get(name)
+            if queued and queued[0] == job_id:
+                queued.popleft()
+            elif queued and job_id in queued:
+                queued.remove(job_id)
+            else:
+                logger.info(f'Job {job_id} ({name}) was shed')
+                return
+        job = self._jobs.get(job_id, {})
+        job['status'] = 'running'
+        started = time.perf_counter()
+        try:
+            result = apply(operation, args, kwargs)
+            job['result'] = jsonable_encoder(result)
+            job['status'] = 'done'
+        except Exception as e:
+            logger.error(f'Job {job_id} ({name}) failed: {e}\n{traceback.format_exc()}')
+            job['result'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            job['finished'] = time.time()
+            self._job_seconds = 0.9 * self._job_seconds + 0.1 * (time.perf_counter() - started)
+
+    def _apply(self, operation: Callable, args: tuple, kwargs: dict) -> Any:
+        try:
+            return operation(*args, **kwargs)
+        finally:
+            self.publish()
+
+    def publish(self):
+        try:
+            if self.store is not None and self.node is not None:
+                self.store.publish(self.node)
+        except Exception as e:
+            logger.error(f'Error publishing node state: {e}\n{traceback.format_exc()}')
+
+runtime = NodeRuntime()
@@ -0,0 +1,364 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+import traceback
+from fastapi.encoders import jsonable_encoder
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class NodeStore:
+    """
+    SQLite store with the published state of a node
+
+    The process owning the node publishes a snapshot after every state change; any number of
+    read-only workers, in this or other processes, serve reads from it without touching the node.
+
+    Tables:
+        snapshots: Latest JSON of node_info, blockchain, chain_head, transactions and peers
+        blocks: Committed blocks and coherence blocks by hash, inserted incrementally
+        dictionaries: zstd dictionary trained on each complete segment of the chain, an empty
+            body for segments whose training failed
+
+    Publishing is incremental: new blocks are inserted on every publish, but the full
+    blockchain and node_info snapshots, O(chain length) to build, are only rewritten when the
+    tip or the peer table changed, or at most every snapshot_interval seconds for the other
+    node fields. The mempool is published on its own in the small transactions and
+    chain_head snapshots, so a new transaction never rewrites the chain.
+
+    Block bodies are immutable per hash, so readers keep the hottest ones in an LRU bounded
+    by block_cache_size and skip SQLite for repeated /block/{hash} reads.
+
+    When zstandard is installed, bodies are stored zstd compressed. Every segment_size
+    heights a dictionary is trained on the blocks of the segment, which are recompressed
+    with it; blocks of the open segment use the latest dictionary. Training and
+    recompression run on a background thread, one segment at a time, and the next publish
+    stores the result; a segment whose training fails is recorded and its blocks keep the
+    compression they were inserted with. Each row records the dictionary it was compressed
+    with (NULL for plain JSON, -1 for zstd without dictionary), so reads decompress
+    transparently and stores written without zstandard stay readable.
+    """
+
+    def __init__(self, path: Optional[str] = None, block_cache_size: int = 4096, segment_size: int = 1024, dictionary_size: int = 64 * 1024, compression_level: int = 9, snapshot_interval: float = 5):
+        self.path = path or os.environ.get('NODE_STORE_PATH', 'node_state.db')
+        self.snapshot_interval = snapshot_interval
+        self.block_cache_size = block_cache_size
+        self.segment_size = segment_size
+        self.dictionary_size = dictionary_size
+        self.compression_level = compression_level
+        self._dictionaries: Dict[int, object] = {}
+        self._dictionaries_lock = threading.Lock()
+        self._compressors: Dict[int, object] = {}
+        self._latest_dictionary = -1
+        self._trained_segment = -1
+        self._trainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='store-trainer')
+        self._training: Optional[Future] = None
+        self._block_cache: OrderedDict = OrderedDict()
+        self._block_cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._published_height = 0
+        self._published_coherence_height = 0
+        self._published_hashes = []
+        self._published_pruned_height = 0
+        self._published_tip = None
+        self._published_peers = None
+        self._published_mempool = None
+        self._snapshots_written = 0.0
+        self._create_tables()
+        row = self._connection().execute('SELECT MAX(CASE WHEN LENGTH(body) > 0 THEN segment END), MAX(segment) FROM dictionaries').fetchone()
+        self._latest_dictionary = row[0] if row and row[0] is not None else -1
+        self._trained_segment = row[1] if row and row[1] is not None else -1
+
+    @classmethod
+    def from_env(cls) -> Optional['NodeStore']:
+        """
+        Returns a store when NODE_STORE_PATH is configured, None otherwise
+        """
+        path = os.environ.get('NODE_STORE_PATH')
+        return cls(path) if path else None
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _create_tables(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS snapshots (name TEXT PRIMARY KEY, body TEXT NOT NULL, updated REAL NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS blocks (hash TEXT PRIMARY KEY, kind TEXT NOT NULL, height INTEGER NOT NULL, body TEXT NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS blocks_kind_height ON blocks (kind, height)')
+            connection.execute('CREATE TABLE IF NOT EXISTS dictionaries (segment INTEGER PRIMARY KEY, body BLOB NOT NULL)')
+            for table in ('snapshots', 'blocks'):
+                columns = [column[1] for column in connection.execute(f'PRAGMA table_info({table})')]
+                if 'dictionary' not in columns:
+                    connection.execute(f'ALTER TABLE {table} ADD COLUMN dictionary INTEGER')
+
+    # Compression functions
+
+    def _dictionary(self, segment: int):
+        with self._dictionaries_lock:
+            dictionary = self._dictionaries.get(segment)
+        if dictionary is None:
+            row = self._connection().execute('SELECT body FROM dictionaries WHERE segment = ?', (segment,)).fetchone()
+            if row is None:
+                raise KeyError(f'Unknown compression dictionary {segment}')
+            dictionary = zstandard.ZstdCompressionDict(row[0])
+            with self._dictionaries_lock:
+                self._dictionaries[segment] = dictionary
+        return dictionary
+
+    def _encode(self, body: bytes, dictionary: Optional[int] = None) -> tuple:
+        """
+        Compresses a body with a dictionary, the latest one by default; writer thread only
+
+        Returns:
+            tuple: Stored value and the dictionary column
+        """
+        if zstandard is None:
+            return body.decode('utf-8'), None
+        dictionary = self._latest_dictionary if dictionary is None else dictionary
+        compressor = self._compressors.get(dictionary)
+        if compressor is None:
+            if dictionary >= 0:
+                compressor = zstandard.ZstdCompressor(level=self.compression_level, dict_data=self._dictionary(dictionary))
+            else:
+                compressor = zstandard.ZstdCompressor(level=self.compression_level)
+            self._compressors[dictionary] = compressor
+        return compressor.compress(body), dictionary
+
+    def _decode(self, value, dictionary: Optional[int]) -> str:
+        if dictionary is None:
+            return value if isinstance(value, str) else value.decode('utf-8')
+        if zstandard is None:
+            raise RuntimeError('The node store is zstd compressed, install zstandard to read it')
+        decompressors = getattr(self._local, 'decompressors', None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dictionary)
+        if decompressor is None:
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._dictionary(dictionary)) if dictionary >= 0 else zstandard.ZstdDecompressor()
+            decompressors[dictionary] = decompressor
+        return decompressor.decompress(value).decode('utf-8')
+
+    def _train_segments(self, connection: sqlite3.Connection, blockchain):
+        """
+        Stores the dictionary trained in the background, if done, and starts training the
+        next completed segment; writer thread only
+        """
+        if zstandard is None:
+            return
+        if self._training is not None:
+            if not self._training.done():
+                return
+            segment, dictionary, recompressed = self._training.result()
+            self._training = None
+            self._trained_segment = segment
+            connection.execute('INSERT OR REPLACE INTO dictionaries (segment, body) VALUES (?, ?)', (segment, dictionary.as_bytes() if dictionary is not None else b''))
+            if dictionary is not None:
+                with self._dictionaries_lock:
+                    self._dictionaries[segment] = dictionary
+                self._latest_dictionary = segment
+                # Blocks pruned or replaced while the segment was trained keep their new body
+                connection.executemany(
+                    'UPDATE blocks SET body = ?, dictionary = ? WHERE hash = ? AND kind = ?',
+                    [(body, segment, hash, kind) for hash, kind, sample, body in recompressed if self._current_body(blockchain, hash, kind) == sample]
+                )
+                logger.info(f'Stored the compression dictionary of segment {segment}')
+        segment = self._trained_segment + 1
+        if segment >= min(len(blockchain.chain), len(blockchain.coherence_chain)) // self.segment_size:
+            return
+        start, end = segment * self.segment_size, (segment + 1) * self.segment_size
+        blocks = [(block.hash, 'block', blockchain.block_json(block)) for block in blockchain.chain[start:end]]
+        blocks += [(coherence_block.hash, 'coherence_block', blockchain.coherence_block_json(coherence_block)) for coherence_block in blockchain.coherence_chain[start:end]]
+        self._training = self._trainer.submit(self._train_segment, segment, blocks)
+
+    def _train_segment(self, segment: int, blocks: list) -> tuple:
+        """
+        Trains the dictionary of a segment and recompresses its blocks, on the trainer thread
+
+        Returns:
+            tuple: segment, dictionary (None when training failed) and (hash, kind, body,
+                recompressed body) per block
+        """
+        try:
+            dictionary = zstandard.train_dictionary(self.dictionary_size, [body for _, _, body in blocks])
+            compressor = zstandard.ZstdCompressor(level=self.compression_level, dict_data=dictionary)
+            logger.info(f'Trained the compression dictionary of segment {segment}, heights {segment * self.segment_size}-{(segment + 1) * self.segment_size - 1}')
+            return segment, dictionary, [(hash, kind, body, compressor.compress(body)) for hash, kind, body in blocks]
+        except Exception as e:
+            logger.warning(f'Could not train the dictionary of segment {segment}, keeping its blocks as they are: {e}')
+            return segment, None, []
+
+    @staticmethod
+    def _current_body(blockchain, hash: str, kind: str) -> Optional[bytes]:
+        if kind == 'block':
+            block = blockchain.get_block(hash)
+            return blockchain.block_json(block) if block is not None else None
+        coherence_block = blockchain.get_coherence_block(hash)
+        return blockchain.coherence_block_json(coherence_block) if coherence_block is not None else None
+
+    # Writer functions
+
+    def publish(self, node):
+        """
+        Publishes the current state of a node
+
+        Args:
+            node (Node): The node owning the state
+
+        Workflow:
+            1. Remove the published blocks above the fork point if the node switched branch
+            2. Shrink the blocks pruned since the last publish to their headers
+            3. Insert the blocks and coherence blocks committed since the last publish
+            4. Store the dictionary trained in the background and train the next segment
+            5. Replace the transactions and chain_head snapshots when the mempool or the tip changed
+            6. Replace the node_info, blockchain and peers snapshots when the tip or the peers
+                changed, or snapshot_interval elapsed, in the same transaction
+        """
+        try:
+            now = time.time()
+            blockchain = node.blockchain
+            connection = self._connection()
+            with connection:
+                fork_height = self._fork_height(blockchain)
+                if fork_height < self._published_height:
+                    # The node switched branch: only the blocks above the fork point are replaced
+                    self._published_height = self._published_coherence_height = fork_height
+                    self._published_pruned_height = min(self._published_pruned_height, fork_height)
+                    del self._published_hashes[fork_height:]
+                    connection.execute('DELETE FROM blocks WHERE height >= ?', (fork_height,))
+                # Bodies pruned since the last publish shrink to their headers on disk too
+                connection.executemany(
+                    'UPDATE blocks SET body = ?, dictionary = ? WHERE hash = ? AND kind = ?',
+                    [(*self._encode(blockchain.block_json(block)), block.hash, 'block') for block in blockchain.chain[self._published_pruned_height:min(blockchain.pruned_height, self._published_height)]]
+                )
+                connection.executemany(
+                    'INSERT OR REPLACE INTO blocks (hash, kind, height, body, dictionary) VALUES (?, ?, ?, ?, ?)',
+                    [(block.hash, 'block', block.index, *self._encode(blockchain.block_json(block))) for block in blockchain.chain[self._published_height:]]
+                )
+                connection.executemany(
+                    'INSERT OR REPLACE INTO blocks (hash, kind, height, body, dictionary) VALUES (?, ?, ?, ?, ?)',
+                    [(coherence_block.hash, 'coherence_block', coherence_block.index, *self._encode(blockchain.coherence_block_json(coherence_block))) for coherence_block in blockchain.coherence_chain[self._published_coherence_height:]]
+                )
+                self._train_segments(connection, blockchain)
+                tip = self._tip(blockchain)
+                peers = dict(node.peers)
+                pending_transactions = list(blockchain.pending_transactions or [])
+                mempool = [transaction.hash for transaction in pending_transactions]
+                snapshots = []
+                if mempool != self._published_mempool or tip != self._published_tip:
+                    snapshots.append(('transactions', json.dumps(jsonable_encoder([transaction.to_dict() for transaction in pending_transactions])), None, now))
+                    snapshots.append(('chain_head', json.dumps(jsonable_encoder(blockchain.head())), None, now))
+                    self._published_mempool = mempool
+                if tip != self._published_tip or peers != self._published_peers or now - self._snapshots_written >= self.snapshot_interval:
+                    # The chain is assembled from cached block bytes once and spliced into node_info
+                    blockchain_json = blockchain.to_json()
+                    node_info_json = node.to_json(blockchain_json)
+                    snapshots.append(('node_info', *self._encode(node_info_json, -1), now))
+                    snapshots.append(('blockchain', *self._encode(blockchain_json, -1), now))
+                    if peers != self._published_peers:
+                        snapshots.append(('peers', json.dumps(jsonable_encoder(peers)), None, now))
+                    self._published_tip = tip
+                    self._published_peers = peers
+                    self._snapshots_written = now
+                connection.executemany('INSERT OR REPLACE INTO snapshots (name, body, dictionary, updated) VALUES (?, ?, ?, ?)', snapshots)
+            self._published_hashes.extend(block.hash for block in blockchain.chain[self._published_height:])
+            self._published_height = len(blockchain.chain)
+            self._published_pruned_height = max(self._published_pruned_height, blockchain.pruned_height)
+            self._published_coherence_height = len(blockchain.coherence_chain)
+        except Exception as e:
+            logger.error(f'Error publishing node state: {e}\n{traceback.format_exc()}')
+
+    @staticmethod
+    def _tip(blockchain) -> tuple:
+        """
+        What the blockchain snapshot depends on besides the mempool: the tips, pruning and corrected blocks
+        """
+        return (
+            len(blockchain.chain),
+            blockchain.chain[-1].hash if blockchain.chain else None,
+            len(blockchain.coherence_chain),
+            blockchain.coherence_chain[-1].hash if blockchain.coherence_chain else None,
+            blockchain.pruned_height,
+            blockchain._revision
+        )
+
+    def _fork_height(self, blockchain) -> int:
+        """
+        Lowest published height whose block is no longer in the chain, the published height if none
+        """
+        height = min(self._published_height, len(blockchain.chain))
+        while height > 0 and blockchain.chain[height - 1].hash != self._published_hashes[height - 1]:
+            height -= 1
+        return height
+
+    # Reader functions
+
+    def get_snapshot(self, name: str) -> Optional[str]:
+        row = self._connection().execute('SELECT body, dictionary FROM snapshots WHERE name = ?', (name,)).fetchone()
+        return self._decode(*row) if row else None
+
+    def get_snapshot_version(self, name: str) -> Optional[float]:
+        """
+        Publish time of a snapshot, lets readers answer If-None-Match without loading the body
+        """
+        row = self._connection().execute('SELECT updated FROM snapshots WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def get_block_range(self, start: int, end: int) -> str:
+        """
+        JSON array of the entangled pairs from start up to end, exclusive, as served by /blocks
+        """
+        rows = self._connection().execute(
+            "SELECT kind, height, body, dictionary FROM blocks WHERE kind IN ('block', 'coherence_block') AND height >= ? AND height < ? ORDER BY height",
+            (start, end)
+        ).fetchall()
+        pairs = {}
+        for kind, height, body, dictionary in rows:
+            pairs.setdefault(height, {})[kind] = self._decode(body, dictionary)
+        return '[' + ','.join(
+            f'{{"block":{pair["block"]},"coherence_block":{pair["coherence_block"]}}}'
+            for height, pair in sorted(pairs.items()) if 'block' in pair and 'coherence_block' in pair
+        ) + ']'
+
+    def get_block(self, hash: str, kind: str = 'block') -> Optional[str]:
+        key = (kind, hash)
+        with self._block_cache_lock:
+            body = self._block_cache.get(key)
+            if body is not None:
+                self._block_cache.move_to_end(key)
+                return body
+        row = self._connection().execute('SELECT body, dictionary FROM blocks WHERE hash = ? AND kind = ?', (hash, kind)).fetchone()
+        if row is None:
+            return None
+        # The cache holds decompressed bodies, so hot blocks are decompressed once
+        body = self._decode(*row)
+        with self._block_cache_lock:
+            self._block_cache[key] = body
+            if len(self._block_cache) > self.block_cache_size:
+                self._block_cache.popitem(last=False)
+        return body
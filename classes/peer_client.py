@@ -0,0 +1,96 @@
+import math
+import threading
+import time
+import requests
+import logging
+from typing import Dict, Optional, Tuple
+
+from classes.peer_manager import PeerManager
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class PeerBackoff(requests.RequestException):
+    """
+    Raised instead of sending when the peer asked us to wait with a 429
+    """
+
+class PeerUnavailable(PeerBackoff):
+    """
+    Raised instead of sending when the circuit of the peer is open
+    """
+
+class PeerClient:
+    """
+    Outbound HTTP client for peer gossip
+
+    Honors 429 responses: the Retry-After of a peer is recorded per route and further requests
+    to that route of the peer raise PeerBackoff until it elapses, instead of adding load to an
+    overloaded peer; its other routes, like the consensus messages, keep flowing. When a
+    PeerManager is given, round trip times and failures are reported to it and peers with an
+    open circuit raise PeerUnavailable without a connection attempt.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, default_retry_after: float = 1.0, max_retry_after: float = 60.0, peer_manager: Optional[PeerManager] = None):
+        self.headers = headers or {}
+        self.peer_manager = peer_manager
+        self.default_retry_after = default_retry_after
+        self.max_retry_after = max_retry_after
+        self._backoff_until: Dict[Tuple[str, str], float] = {}
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+
+    def backoff_remaining(self, peer_url: str, path: str) -> float:
+        return max(self._backoff_until.get((peer_url, path), 0) - time.monotonic(), 0)
+
+    def request(self, method: str, peer_url: str, path: str, **kwargs) -> requests.Response:
+        remaining = self.backoff_remaining(peer_url, path)
+        if remaining > 0:
+            raise PeerBackoff(f'Peer {peer_url} asked to retry {path} in {remaining:.2f} seconds')
+        if self.peer_manager is not None and not self.peer_manager.allow(peer_url):
+            raise PeerUnavailable(f'Peer {peer_url} is unreachable, circuit open')
+
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
+        kwargs.setdefault('timeout', 5)
+        start = time.perf_counter()
+        try:
+            response = self._session.request(method, f'{peer_url}{path}', headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if self.peer_manager is not None:
+                self.peer_manager.record_failure(peer_url)
+            raise
+        if self.peer_manager is not None:
+            if response.status_code >= 500:
+                self.peer_manager.record_failure(peer_url)
+            else:
+                self.peer_manager.record_success(peer_url, time.perf_counter() - start)
+        if response.status_code == 429:
+            retry_after = self._retry_after(response)
+            with self._lock:
+                self._backoff_until[(peer_url, path)] = time.monotonic() + retry_after
+            logger.warning(f'Peer {peer_url} is rate limiting {path}, backing off {retry_after:.2f} seconds')
+        return response
+
+    def post(self, peer_url: str, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', peer_url, path, **kwargs)
+
+    def get(self, peer_url: str, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', peer_url, path, **kwargs)
+
+    def _retry_after(self, response: requests.Response) -> float:
+        try:
+            retry_after = float(response.headers.get('Retry-After', self.default_retry_after))
+        except ValueError:
+            retry_after = self.default_retry_after
+        if math.isnan(retry_after):
+            retry_after = self.default_retry_after
+        return min(max(retry_after, 0), self.max_retry_after)
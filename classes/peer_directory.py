@@ -0,0 +1,164 @@
+import threading
+import time
+import logging
+from pydantic import BaseModel
+from typing import Dict, Iterable, List, Optional, Set
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class PeerEntry(BaseModel):
+    url: str
+    version: int = 0
+    removed: bool = False
+    paired: bool = False
+    public_key: Optional[str] = None
+
+    def key(self) -> tuple:
+        """
+        Order of concurrent versions: higher version wins, then removal, then URL
+        """
+        return (self.version, self.removed, self.url)
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'version': self.version,
+            'removed': self.removed,
+            'paired': self.paired,
+            'public_key': self.public_key
+        }
+
+class PeerDirectory:
+    """
+    Versioned peer table for delta gossip
+
+    Every entry carries a Lamport version; merges keep the higher version, so deltas can be
+    applied in any order and from any number of peers. Removals are kept as tombstones for
+    tombstone_ttl seconds so they win over stale announcements. A node that learns about
+    its own removal refutes it with a higher version. Entries also carry whether the node is
+    entangled, which serves find_pair as a cached directory of pairing availability, and the
+    public key of its persisted identity. The first key learned for a node id is kept: later
+    entries announcing another key for it are merged with the known key.
+
+    Thread safe: merges arrive from the writer thread and from anti-entropy.
+    """
+
+    def __init__(self, node_id: str, tombstone_ttl: float = 3600):
+        self.node_id = node_id
+        self.tombstone_ttl = tombstone_ttl
+        self.clock = 0
+        self._entries: Dict[str, PeerEntry] = {}
+        self._removed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, peer_id: str, url: str, paired: bool = False, public_key: Optional[str] = None) -> Dict[str, dict]:
+        with self._lock:
+            return self._set(peer_id, PeerEntry(url=url, version=self._tick(), paired=paired, public_key=public_key))
+
+    def remove(self, peer_id: str) -> Dict[str, dict]:
+        with self._lock:
+            entry = self._entries.get(peer_id)
+            if entry is None or entry.removed:
+                return {}
+            return self._set(peer_id, PeerEntry(url=entry.url, version=self._tick(), removed=True, public_key=entry.public_key))
+
+    def merge(self, entries: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        Applies entries received from a peer
+
+        Args:
+            entries (dict): node id to entry dict, or to a bare URL for tables without versions
+
+        Returns:
+            dict: The entries that changed, to be gossiped further
+        """
+        changed = {}
+        with self._lock:
+            self._collect()
+            for peer_id, data in entries.items():
+                try:
+                    incoming = PeerEntry(url=data) if isinstance(data, str) else PeerEntry(**data)
+                except Exception as e:
+                    logger.warning(f'Invalid peer entry {peer_id}: {e}')
+                    continue
+                self.clock = max(self.clock, incoming.version)
+                current = self._entries.get(peer_id)
+                if current is not None and incoming.key() <= current.key():
+                    continue
+                if peer_id == self.node_id and current is not None:
+                    logger.info(f'Refuting stale entry about this node, version {incoming.version}')
+                    changed.update(self._set(peer_id, PeerEntry(url=current.url, version=self._tick(), paired=current.paired, public_key=current.public_key)))
+                    continue
+                if current is not None and current.public_key and incoming.public_key != current.public_key:
+                    if incoming.public_key:
+                        logger.warning(f'Ignoring new public key announced for peer {peer_id}')
+                    incoming.public_key = current.public_key
+                changed.update(self._set(peer_id, incoming))
+        return changed
+
+    def public_keys(self) -> Dict[str, str]:
+        with self._lock:
+            return {peer_id: entry.public_key for peer_id, entry in self._entries.items() if entry.public_key}
+
+    def live(self) -> Dict[str, str]:
+        with self._lock:
+            return {peer_id: entry.url for peer_id, entry in self._entries.items() if not entry.removed}
+
+    def unpaired(self) -> Set[str]:
+        """
+        Node ids last announced as available for entanglement
+        """
+        with self._lock:
+            return {peer_id for peer_id, entry in self._entries.items() if not entry.removed and not entry.paired}
+
+    def entries(self, peer_ids: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        with self._lock:
+            if peer_ids is None:
+                return {peer_id: entry.to_dict() for peer_id, entry in self._entries.items()}
+            return {peer_id: self._entries[peer_id].to_dict() for peer_id in peer_ids if peer_id in self._entries}
+
+    def digest(self) -> Dict[str, int]:
+        with self._lock:
+            self._collect()
+            return {peer_id: entry.version for peer_id, entry in self._entries.items()}
+
+    def reconcile(self, digest: Dict[str, int]) -> dict:
+        """
+        Compares the digest of a peer with the local table
+
+        Returns:
+            dict: entries the peer is missing or has older, and node ids the peer has newer
+        """
+        with self._lock:
+            self._collect()
+            entries = {peer_id: entry.to_dict() for peer_id, entry in self._entries.items() if digest.get(peer_id, -1) < entry.version}
+            wanted: List[str] = [peer_id for peer_id, version in digest.items() if peer_id not in self._entries or self._entries[peer_id].version < version]
+            return {'entries': entries, 'wanted': wanted}
+
+    def _tick(self) -> int:
+        self.clock += 1
+        return self.clock
+
+    def _set(self, peer_id: str, entry: PeerEntry) -> Dict[str, dict]:
+        self._entries[peer_id] = entry
+        if entry.removed:
+            self._removed_at[peer_id] = time.monotonic()
+        else:
+            self._removed_at.pop(peer_id, None)
+        return {peer_id: entry.to_dict()}
+
+    def _collect(self):
+        now = time.monotonic()
+        for peer_id, removed_at in list(self._removed_at.items()):
+            if now - removed_at >= self.tombstone_ttl:
+                del self._removed_at[peer_id]
+                self._entries.pop(peer_id, None)
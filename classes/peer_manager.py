@@ -0,0 +1,221 @@
+import random
+import threading
+import time
+import requests
+import logging
+import traceback
+from pydantic import BaseModel
+from typing import Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class PeerHealth(BaseModel):
+    url: str
+    rtt: Optional[float] = None
+    failures: int = 0
+    total_failures: int = 0
+    last_seen: Optional[float] = None
+    last_failure: Optional[float] = None
+    state: str = CLOSED
+    opened_at: Optional[float] = None
+
+    def score(self) -> tuple:
+        """
+        Sort key, healthiest first: circuit state, consecutive failures, then round trip time
+        """
+        return ({CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[self.state], self.failures, self.rtt if self.rtt is not None else float('inf'))
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'rtt': self.rtt,
+            'failures': self.failures,
+            'total_failures': self.total_failures,
+            'last_seen': self.last_seen,
+            'last_failure': self.last_failure,
+            'state': self.state
+        }
+
+class PeerManager:
+    """
+    Health of every known peer
+
+    Tracks round trip time (EWMA), consecutive failures, last-seen time and a circuit breaker
+    per peer URL. After failure_threshold consecutive failures the circuit opens and
+    broadcasts skip the peer; after open_timeout one request is let through (half open) and
+    its outcome closes or reopens the circuit. A background thread pings every peer so dead
+    peers are detected without a broadcast paying for the timeout, and peers dead for longer
+    than eviction_time are handed to the eviction callback.
+    """
+
+    def __init__(self, failure_threshold: int = 3, open_timeout: float = 30, ping_interval: float = 15, ping_timeout: float = 2, eviction_time: float = 600):
+        self.failure_threshold = failure_threshold
+        self.open_timeout = open_timeout
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.eviction_time = eviction_time
+        self._health: Dict[str, PeerHealth] = {}
+        self._lock = threading.Lock()
+        self._pinger: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _get(self, peer_url: str) -> PeerHealth:
+        health = self._health.get(peer_url)
+        if health is None:
+            health = PeerHealth(url=peer_url)
+            self._health[peer_url] = health
+        return health
+
+    # Outcome functions
+
+    def record_success(self, peer_url: str, rtt: float):
+        with self._lock:
+            health = self._get(peer_url)
+            health.rtt = rtt if health.rtt is None else 0.8 * health.rtt + 0.2 * rtt
+            health.failures = 0
+            health.last_seen = time.time()
+            if health.state != CLOSED:
+                logger.info(f'Circuit of peer {peer_url} closed')
+            health.state = CLOSED
+            health.opened_at = None
+
+    def record_failure(self, peer_url: str):
+        with self._lock:
+            health = self._get(peer_url)
+            health.failures += 1
+            health.total_failures += 1
+            health.last_failure = time.time()
+            if health.state == HALF_OPEN or health.failures >= self.failure_threshold:
+                if health.state != OPEN:
+                    logger.warning(f'Circuit of peer {peer_url} opened after {health.failures} failures')
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+
+    def available(self, peer_url: str) -> bool:
+        """
+        Returns True when allow() would let a request through, without changing the circuit
+        """
+        health = self._health.get(peer_url)
+        if health is None or health.state == CLOSED:
+            return True
+        return health.state == OPEN and time.monotonic() - health.opened_at >= self.open_timeout
+
+    def allow(self, peer_url: str) -> bool:
+        """
+        Returns True when a request to the peer should be attempted
+
+        An open circuit whose timeout elapsed lets exactly one request through and stays half
+        open until its outcome is recorded.
+        """
+        health = self._health.get(peer_url)
+        if health is None or health.state == CLOSED:
+            return True
+        with self._lock:
+            if health.state == OPEN and time.monotonic() - health.opened_at >= self.open_timeout:
+                health.state = HALF_OPEN
+                return True
+            return False
+
+    # Selection functions
+
+    def order(self, peers: Dict[str, str], exclude: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Orders peers healthiest first and drops the ones whose circuit is open
+
+        Args:
+            peers (dict): node id to URL
+            exclude (str): Node id left out, usually the current node
+
+        Returns:
+            list: (node_id, url) tuples
+        """
+        with self._lock:
+            candidates = [
+                (self._health[peer_url].score() if peer_url in self._health else (0, 0, float('inf')), peer_id, peer_url)
+                for peer_id, peer_url in list(peers.items())
+                if peer_id != exclude
+            ]
+        candidates.sort(key=lambda candidate: (candidate[0], candidate[1]))
+        return [(peer_id, peer_url) for _, peer_id, peer_url in candidates if self.available(peer_url)]
+
+    def sample(self, peers: Dict[str, str], size: int, exclude: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Random sample of reachable peers, for gossip fanout
+        """
+        reachable = self.order(peers, exclude)
+        return random.sample(reachable, min(size, len(reachable)))
+
+    def forget(self, peer_url: str):
+        with self._lock:
+            self._health.pop(peer_url, None)
+
+    # Liveness functions
+
+    def start_pinging(self, get_peers: Callable[[], Dict[str, str]], exclude: Optional[str] = None, on_evict: Optional[Callable[[str], None]] = None):
+        """
+        Starts the background liveness probe
+
+        Args:
+            get_peers (Callable): Returns the current node id to URL table
+            exclude (str): Node id not probed, usually the current node
+            on_evict (Callable): Called with the node id of peers dead for longer than eviction_time
+        """
+        if self._pinger is not None and self._pinger.is_alive():
+            return
+        self._stop.clear()
+        self._pinger = threading.Thread(target=self._ping_loop, args=(get_peers, exclude, on_evict), name='peer-pinger', daemon=True)
+        self._pinger.start()
+
+    def stop_pinging(self):
+        self._stop.set()
+
+    def _ping_loop(self, get_peers: Callable[[], Dict[str, str]], exclude: Optional[str], on_evict: Optional[Callable[[str], None]]):
+        session = requests.Session()
+        while not self._stop.wait(self.ping_interval):
+            try:
+                for peer_id, peer_url in list(get_peers().items()):
+                    if peer_id == exclude:
+                        continue
+                    self.ping(session, peer_url)
+                    if on_evict is not None and self._is_dead(peer_url):
+                        logger.warning(f'Peer {peer_id} unreachable for {self.eviction_time} seconds, evicting')
+                        on_evict(peer_id)
+                        self.forget(peer_url)
+            except Exception as e:
+                logger.error(f'Error pinging peers: {e}\n{traceback.format_exc()}')
+
+    def ping(self, session: requests.Session, peer_url: str) -> bool:
+        start = time.perf_counter()
+        try:
+            response = session.get(f'{peer_url}/health', timeout=self.ping_timeout)
+            if response.status_code == 200:
+                self.record_success(peer_url, time.perf_counter() - start)
+                return True
+        except requests.RequestException:
+            pass
+        self.record_failure(peer_url)
+        return False
+
+    def _is_dead(self, peer_url: str) -> bool:
+        health = self._health.get(peer_url)
+        if health is None or health.state == CLOSED:
+            return False
+        last_alive = health.last_seen or (health.last_failure - health.failures * self.ping_interval)
+        return time.time() - last_alive >= self.eviction_time
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {peer_url: health.to_dict() for peer_url, health in self._health.items()}
@@ -0,0 +1,106 @@
+import heapq
+import threading
+import time
+import logging
+from typing import Dict, List, Tuple
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class PenaltyTracker:
+    """
+    Penalties and reputation of peers
+
+    Active penalties are kept in a dict for O(1) checks and in a min-heap ordered by expiry,
+    which is drained lazily, so expired penalties disappear without scanning every peer.
+    Penalty counts decay by one every decay_interval seconds; a peer reaching max_penalties
+    is refused until its count decays below the limit.
+
+    Thread safe: admit() is called from the request middleware while the writer thread
+    applies penalties.
+    """
+
+    def __init__(self, penalty_time: float = 600, max_penalties: int = 3, decay_interval: float = 3600):
+        self.penalty_time = penalty_time
+        self.max_penalties = max_penalties
+        self.decay_interval = decay_interval
+        self._expiries: Dict[str, float] = {}
+        self._penalized_at: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._counts: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def penalize(self, node_id: str) -> int:
+        """
+        Penalizes a peer for penalty_time seconds
+
+        Returns:
+            int: The penalty count of the peer after this penalty
+        """
+        with self._lock:
+            now = time.monotonic()
+            expiry = now + self.penalty_time
+            self._expiries[node_id] = expiry
+            self._penalized_at[node_id] = time.time()
+            heapq.heappush(self._heap, (expiry, node_id))
+            count = self._count(node_id, now) + 1
+            self._counts[node_id] = (count, now)
+            logger.info(f'Node {node_id} penalized, penalty count: {count}')
+            return count
+
+    def admit(self, node_id: str) -> bool:
+        """
+        Returns True when the peer is neither penalized nor banned
+        """
+        if node_id not in self._expiries and node_id not in self._counts:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            return node_id not in self._expiries and self._count(node_id, now) < self.max_penalties
+
+    def is_banned(self, node_id: str) -> bool:
+        with self._lock:
+            return self._count(node_id, time.monotonic()) >= self.max_penalties
+
+    def remaining(self, node_id: str) -> float:
+        with self._lock:
+            return max(self._expiries.get(node_id, 0) - time.monotonic(), 0)
+
+    def _expire(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expiry, node_id = heapq.heappop(self._heap)
+            if self._expiries.get(node_id) == expiry:
+                del self._expiries[node_id]
+                self._penalized_at.pop(node_id, None)
+                logger.info(f'Node {node_id} penalty time has expired')
+
+    def _count(self, node_id: str, now: float) -> int:
+        if node_id not in self._counts:
+            return 0
+        count, updated = self._counts[node_id]
+        decayed = int((now - updated) // self.decay_interval) if self.decay_interval else 0
+        if decayed:
+            count = max(count - decayed, 0)
+            if count:
+                self._counts[node_id] = (count, updated + decayed * self.decay_interval)
+            else:
+                del self._counts[node_id]
+        return count
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            return {
+                'penalized_nodes': dict(self._penalized_at),
+                'times_that_nodes_were_penalized': {node_id: self._count(node_id, now) for node_id in list(self._counts)}
+            }
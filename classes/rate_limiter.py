@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Refill rate (tokens per second) and burst capacity per message type
+DEFAULT_RATES: Dict[str, Tuple[float, float]] = {
+    '/receive_transaction': (50, 100),
+    '/receive_transactions': (10, 20),
+    '/receive_prediction': (5, 10),
+    '/receive_score': (5, 10),
+    '/receive_blocks': (5, 10),
+    '/receive_peers': (5, 10),
+    '/sync_peers': (1, 5),
+    '/receive_pair_key': (2, 5)
+}
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, tokens: float = 1) -> float:
+        """
+        Takes tokens from the bucket
+
+        Returns:
+            float: 0 when the tokens were taken, otherwise seconds until they are available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+class RateLimiter:
+    """
+    Token-bucket rate limits per peer and per message type
+
+    Buckets are kept in an LRU bounded by max_buckets, so a flood of distinct peer ids cannot
+    grow memory without limit.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, Tuple[float, float]]] = None, max_buckets: int = 10000):
+        self.rates = dict(DEFAULT_RATES if rates is None else rates)
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, peer_id: str, message_type: str) -> float:
+        """
+        Consumes one token for a message
+
+        Args:
+            peer_id (str): Sender of the message
+            message_type (str): Route of the message
+
+        Returns:
+            float: 0 when the message is allowed, otherwise the seconds the peer should wait
+        """
+        if message_type not in self.rates:
+            return 0.0
+        key = (peer_id, message_type)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(*self.rates[message_type])
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take()
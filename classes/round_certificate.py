@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import traceback
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from classes.wallet import Wallet, verify_transaction_signature
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class CertificateEntry(BaseModel):
+    round_id: str
+    node_id: str
+    prediction: int
+    score: int
+    public_key: str
+    r: Optional[str] = None
+    s: Optional[str] = None
+    v: Optional[int] = None
+
+    @classmethod
+    def sign(cls, wallet: Wallet, round_id: str, node_id: str, prediction: int, score: int) -> 'CertificateEntry':
+        entry = cls(round_id=round_id, node_id=node_id, prediction=prediction, score=score, public_key=wallet.public_key.hex())
+        entry.r, entry.s, entry.v = wallet.sign_transaction(entry.digest())
+        return entry
+
+    def digest(self) -> str:
+        payload = json.dumps([self.round_id, self.node_id, self.prediction, self.score, self.public_key], separators=(',', ':'))
+        return 'Φx' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def verify(self) -> bool:
+        return verify_transaction_signature(self.public_key, self.r, self.s, self.v, self.digest())
+
+    def to_dict(self) -> dict:
+        return {
+            'round_id': self.round_id,
+            'node_id': self.node_id,
+            'prediction': self.prediction,
+            'score': self.score,
+            'public_key': self.public_key,
+            'r': self.r,
+            's': self.s,
+            'v': self.v
+        }
+
+class RoundCertificate(BaseModel):
+    """
+    Signed (node_id, prediction, score) entries of a consensus round
+
+    The winner attaches the certificate to the blocks it broadcasts, so followers verify the
+    winner in one pass over the entries instead of waiting for every prediction and score.
+    Entries only count when they come from known peers signed with the key the peer
+    advertised beforehand, so a winner can neither invent participants nor re-key real ones.
+    """
+    round_id: str
+    entries: List[CertificateEntry]
+
+    @staticmethod
+    def round_id_for(index: int, previous_hash: str) -> str:
+        return f'{index}:{previous_hash}'
+
+    def verify(self, round_id: str, min_entries: float, consensus, peer_keys: Dict[str, str], predictions: Optional[Dict[str, int]] = None, scores: Optional[Dict[str, int]] = None) -> Optional[str]:
+        """
+        Verifies the certificate and returns its winner
+
+        Args:
+            round_id (str): Round the receiver expects, from the block index and previous hash
+            min_entries (float): Minimum number of participants for the round to be decided
+            consensus (EntanglementConsensus): Consensus used to rank the scores
+            peer_keys (dict): Public keys exchanged with the peers, by node id
+            predictions (dict): Predictions the receiver got in this round, every one must be
+                in the certificate unchanged, so the winner cannot drop participants
+            scores (dict): Scores the receiver got in this round, checked the same way
+
+        Returns:
+            str: The winner node id, None when the certificate is not valid
+        """
+        try:
+            if self.round_id != round_id:
+                logger.info(f'Certificate round {self.round_id} does not match round {round_id}')
+                return None
+            node_ids = [entry.node_id for entry in self.entries]
+            if len(set(node_ids)) != len(node_ids) or len(node_ids) < min_entries or len(node_ids) <= 1:
+                logger.info('Certificate entries are duplicated or not enough')
+                return None
+            entries = {entry.node_id: entry for entry in self.entries}
+            for entry in self.entries:
+                if entry.round_id != round_id:
+                    logger.info(f'Certificate entry of node {entry.node_id} belongs to another round')
+                    return None
+                if peer_keys.get(entry.node_id) != entry.public_key:
+                    logger.info(f'Certificate entry of node {entry.node_id} is not signed with a known peer key')
+                    return None
+                if not entry.verify():
+                    logger.info(f'Certificate entry of node {entry.node_id} has an invalid signature')
+                    return None
+            for node_id, prediction in (predictions or {}).items():
+                if node_id not in entries or entries[node_id].prediction != prediction:
+                    logger.info(f'Certificate leaves out or changes the prediction of node {node_id}')
+                    return None
+            for node_id, score in (scores or {}).items():
+                if node_id not in entries or entries[node_id].score != score:
+                    logger.info(f'Certificate leaves out or changes the score of node {node_id}')
+                    return None
+            return consensus.find_best_prediction_score({entry.node_id: entry.score for entry in self.entries})
+        except Exception as e:
+            logger.error(f'Error verifying round certificate: {e}\n{traceback.format_exc()}')
+
+    def to_dict(self) -> dict:
+        return {
+            'round_id': self.round_id,
+            'entries': [entry.to_dict() for entry in self.entries]
+        }
@@ -5,9 +5,7 @@ import traceback
 from pydantic import BaseModel, Field
 from typing import Optional, Tuple
 from coincurve import PublicKey
-from classes.wallet import Wallet
-
-from classes.wallet import Wallet
+from classes.wallet import Wallet, verify_transaction_signature
 
 class Transaction(BaseModel):
     sender: str
@@ -40,6 +38,14 @@ class Transaction(BaseModel):
         }
         return 'Φx' + hashlib.sha256((json.dumps(qtx_data, sort_keys=True)).encode()).hexdigest()
 
+    def is_signed(self) -> bool:
+        return bool(self.r and self.s and self.v)
+
+    def verify_signature(self) -> bool:
+        if not self.is_signed() or self.hash != self.calculate_hash():
+            return False
+        return verify_transaction_signature(self.public_key, self.r, self.s, self.v, self.hash, self.sender)
+
     def to_dict(self):
         return {
             "sender": self.sender,
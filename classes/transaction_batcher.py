@@ -0,0 +1,81 @@
+import threading
+import logging
+import traceback
+from typing import Callable, List, Optional
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class TransactionBatcher:
+    """
+    Coalesces outgoing transactions into batches
+
+    Transactions are buffered and handed to the send callback together, either when the
+    flush timer fires or as soon as the buffer holds max_batch_size transactions, so a burst
+    of transactions costs one request per peer instead of one per transaction. Batches are
+    always sent from the timer thread, never from the thread that adds the transactions.
+    """
+
+    def __init__(self, send: Callable[[List[dict]], None], flush_interval: float = 0.05, max_batch_size: int = 256):
+        self.send = send
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._buffer: List[dict] = []
+        self._hashes = set()
+        self._lock = threading.Lock()
+        self._sending = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, transactions: List[dict]):
+        """
+        Buffers encoded transactions for the next flush, ignoring hashes already buffered
+
+        Args:
+            transactions (list): Transactions already encoded with jsonable_encoder
+        """
+        with self._lock:
+            for transaction in transactions:
+                if transaction.get('hash') in self._hashes:
+                    continue
+                self._hashes.add(transaction.get('hash'))
+                self._buffer.append(transaction)
+            if len(self._buffer) >= self.max_batch_size and (self._timer is None or self._timer.interval):
+                # A full buffer is sent right away, but still off the caller's thread
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = threading.Timer(0, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            elif self._buffer and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Sends the buffered transactions and returns once every batch taken so far was sent
+
+        A flush that starts while another one is sending waits for it, so callers that need
+        peers to hold the transactions first can rely on flush having returned.
+        """
+        with self._sending:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batch, self._buffer = self._buffer, []
+                self._hashes = set()
+            for start in range(0, len(batch), self.max_batch_size):
+                try:
+                    logger.info(f'Flushing {len(batch[start:start + self.max_batch_size])} transactions')
+                    self.send(batch[start:start + self.max_batch_size])
+                except Exception as e:
+                    logger.error(f'Error flushing transactions: {e}\n{traceback.format_exc()}')
@@ -2,7 +2,9 @@ import hashlib
 import hmac
 import secrets
 import base64
-from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from coincurve import PrivateKey, PublicKey
 from pydantic import Field, PrivateAttr
 from utils.word_list import WORD_LIST
@@ -14,6 +16,95 @@ BIP39_STRENGTH = 128
 PBKDF2_ROUNDS = 2048
 HMAC_KEY = b'Bitcoin seed'
 SECP256K1_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+HARDENED = 0x80000000
+ADDRESS_CACHE_SIZE = 65536
+
+# HD derivation primitives, shared by Wallet and Keychain
+
+def derive_seed(mnemonic: str, passphrase: str = "") -> bytes:
+    return hashlib.pbkdf2_hmac(
+        'sha512',
+        mnemonic.encode('utf-8'),
+        salt=f'mnemonic{passphrase}'.encode('utf-8'),
+        iterations=PBKDF2_ROUNDS
+    )
+
+def derive_master_key(seed: bytes) -> Tuple[bytes, bytes]:
+    h = hmac.new(HMAC_KEY, seed, hashlib.sha512).digest()
+    return h[:32], h[32:]
+
+def ckd_priv(private_key: bytes, chain_code: bytes, index: int) -> Tuple[bytes, bytes]:
+    data = b'\x00' + private_key + index.to_bytes(4, 'big')
+    h = hmac.new(chain_code, data, hashlib.sha512).digest()
+    child_private = (int.from_bytes(private_key, 'big') + int.from_bytes(h[:32], 'big')) % SECP256K1_ORDER
+    return child_private.to_bytes(32, 'big'), h[32:]
+
+def checksum_address(address: str) -> str:
+    addr_hash = keccak(address.lower().encode()).hex()
+    return 'Φx' + ''.join(
+        c.upper() if int(addr_hash[i], 16) > 7 else c
+        for i, c in enumerate(address)
+    )
+
+def eth_address(public_key: bytes) -> str:
+    keccak_hash = keccak(public_key[1:])
+    return checksum_address(keccak_hash[-20:].hex())
+
+def derive_children(private_key: bytes, chain_code: bytes, indexes: List[int]) -> List[Dict[str, str]]:
+    """
+    Derives the addresses of several children of one extended key
+
+    Top-level so it can run in a process pool.
+    """
+    children = []
+    for index in indexes:
+        child_private, _ = ckd_priv(private_key, chain_code, index)
+        public_key = PrivateKey(child_private).public_key.format(compressed=True)
+        children.append({'index': index, 'address': eth_address(public_key), 'public_key': public_key.hex()})
+    return children
+
+# Stateless signature verification
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def public_key_address(public_key: bytes) -> str:
+    """
+    Address of a compressed public key, memoized since the same senders recur constantly
+    """
+    return eth_address(public_key)
+
+def recover_public_key(r: str, s: str, v: int, qtx_hash: str) -> bytes:
+    if not r or not s or not v or not qtx_hash:
+        raise ValueError('Invalid signature or transaction hash')
+    signature = bytes.fromhex(r) + bytes.fromhex(s) + bytes([v - 27])
+    return PublicKey.from_signature_and_message(signature, bytes.fromhex(qtx_hash.replace('Φx', ''))).format()
+
+def verify_transaction_signature(public_key: Optional[str], r: str, s: str, v: int, qtx_hash: str, sender: Optional[str] = None) -> bool:
+    """
+    Verifies a signature without the signer's private key
+
+    Args:
+        public_key (str): Hex compressed public key claimed by the transaction
+        r (str): Signature r, hex
+        s (str): Signature s, hex
+        v (int): Recovery id plus 27
+        qtx_hash (str): The signed transaction hash
+        sender (str): Sender address, must be the Φx address of the recovered key; None only
+            for messages bound to a public key instead, like round entries
+
+    Returns:
+        bool: True when the recovered key matches the public key and the sender address
+    """
+    if sender is None and not public_key:
+        return False
+    if sender is not None and not (isinstance(sender, str) and sender.startswith('Φx') and len(sender) == 42):
+        return False
+    try:
+        recovered = recover_public_key(r, s, v, qtx_hash)
+    except Exception:
+        return False
+    if public_key and recovered.hex() != public_key.lower():
+        return False
+    return sender is None or public_key_address(recovered) == sender
 
 class Wallet:
 
@@ -49,6 +140,19 @@ class Wallet:
 
         return wallet
 
+    @classmethod
+    def from_extended_key(cls, mnemonic: str, private_key: bytes, chain_code: bytes):
+        """
+        Builds a wallet from an already derived BIP-44 key, skipping PBKDF2 and the path walk
+        """
+        wallet = cls.__new__(cls)
+        wallet.__mnemonic = mnemonic
+        wallet.__private_key = private_key
+        wallet.__chain_code = chain_code
+        wallet.public_key = PrivateKey(private_key).public_key.format(compressed=True)
+        wallet.address = eth_address(wallet.public_key)
+        return wallet
+
     @staticmethod
     def __generate_bip39_mnemonic() -> str:
         entropy = secrets.token_bytes(BIP39_STRENGTH // 8)
@@ -59,42 +163,22 @@ class Wallet:
         return ' '.join([BIP39_WORDLIST[int(bits[i*11:(i+1)*11], 2)] for i in range(len(bits) // 11)])
     
     def __derive_seed(self, passphrase: str) -> bytes:
-        return hashlib.pbkdf2_hmac(
-            'sha512',
-            self.__mnemonic.encode('utf-8'),
-            salt=f'mnemonic{passphrase}'.encode('utf-8'),
-            iterations=PBKDF2_ROUNDS
-        )
+        return derive_seed(self.__mnemonic, passphrase)
     
     def __derive_master_key(self, seed: bytes) -> Tuple[bytes, bytes]:
-        h = hmac.new(HMAC_KEY, seed, hashlib.sha512).digest()
-        return h[:32], h[32:]
+        return derive_master_key(seed)
     
     def __derive_bip44_keys(self, account: int, index: int):
-        hardened = 0x80000000
-        path = [ 44 | hardened, 60 | hardened, account | hardened, 0, index]
+        path = [ 44 | HARDENED, 60 | HARDENED, account | HARDENED, 0, index]
         for depth, i in enumerate(path):
             self.__private_key, self.__chain_code = self.__cdk_priv(i)
         self.public_key = PrivateKey(self.__private_key).public_key.format(compressed=True)
 
     def __cdk_priv(self, index: int):
-        data = b'\x00' + self.__private_key + index.to_bytes(4, 'big')
-        h = hmac.new(self.__chain_code, data, hashlib.sha512).digest()
-        child_private = (int.from_bytes(self.__private_key, 'big') + int.from_bytes(h[:32], 'big')) % SECP256K1_ORDER
-        return child_private.to_bytes(32, 'big'), h[32:]
+        return ckd_priv(self.__private_key, self.__chain_code, index)
     
     def __generate_eth_address(self) -> str:
-        keccak_hash = keccak(self.public_key[1:])
-        address = keccak_hash[-20:].hex()
-        return self.__checksum_address(address)
-    
-    @staticmethod
-    def __checksum_address(address: str) -> str:
-        addr_hash = keccak(address.lower().encode()).hex()
-        return 'Φx' + ''.join(
-            c.upper() if int(addr_hash[i], 16) > 7 else c
-            for i, c in enumerate(address)
-        )
+        return eth_address(self.public_key)
     
     def sign_transaction(self, qtx_hash: str) -> Tuple[str,str,int]:
         if not qtx_hash:
@@ -116,14 +200,7 @@ class Wallet:
         return r, s, v
     
     def verify_signature(self, r: str, s: str, v: int, qtx_hash: str) -> bool:
-        if not r or not s or not v or not qtx_hash:
-            raise ValueError('Invalid signature or transaction hash')
-        hash_for_verification = qtx_hash.replace('Φx', '')
-        v = v - 27
-        signature = bytes.fromhex(r) + bytes.fromhex(s) + bytes([v])
-        pubkey = PublicKey.from_signature_and_message(signature, bytes.fromhex(hash_for_verification))
-        print(f'pubkey: {pubkey.format().hex()}, public key: {self.public_key.hex()}')
-        return pubkey.format() == self.public_key
+        return recover_public_key(r, s, v, qtx_hash) == self.public_key
     
     def export_private_key(self) -> str:
         return self.__private_key.hex()
@@ -139,4 +216,62 @@ class Wallet:
         self.__chain_code = b'\x00' * 32
         self.__mnemonic = 'x' * 99
         self.public_key = b'\x00' * 65
-        self.address = 'Φx0000000000000000000000000000000000000000'
\ No newline at end of file
+        self.address = 'Φx0000000000000000000000000000000000000000'
+
+class Keychain:
+    """
+    HD keychain deriving many BIP-44 wallets from one mnemonic
+
+    The seed and master key are derived once; every intermediate extended key is cached
+    by path, so each new address costs a single child derivation instead of a PBKDF2 run.
+    Addresses match the ones produced by Wallet(mnemonic, passphrase, account, index).
+    """
+
+    def __init__(self, mnemonic: str, passphrase: str = ""):
+        self.__mnemonic = mnemonic
+        self.__nodes: Dict[Tuple[int, ...], Tuple[bytes, bytes]] = {(): derive_master_key(derive_seed(mnemonic, passphrase))}
+
+    def __extended_key(self, path: Tuple[int, ...]) -> Tuple[bytes, bytes]:
+        if path not in self.__nodes:
+            private_key, chain_code = self.__extended_key(path[:-1])
+            self.__nodes[path] = ckd_priv(private_key, chain_code, path[-1])
+        return self.__nodes[path]
+
+    @staticmethod
+    def __account_path(account: int) -> Tuple[int, ...]:
+        return (44 | HARDENED, 60 | HARDENED, account | HARDENED, 0)
+
+    def wallet(self, account: int = 0, index: int = 0) -> Wallet:
+        private_key, chain_code = self.__extended_key(self.__account_path(account) + (index,))
+        return Wallet.from_extended_key(self.__mnemonic, private_key, chain_code)
+
+    def derive_addresses(self, account: int = 0, start: int = 0, count: int = 1, processes: Optional[int] = None, chunk_size: int = 1000) -> List[Dict[str, str]]:
+        """
+        Derives a range of addresses of an account
+
+        Args:
+            account (int): BIP-44 account
+            start (int): First address index
+            count (int): Number of addresses
+            processes (int): Worker processes, None derives in the current process
+            chunk_size (int): Indexes per worker task
+
+        Returns:
+            list: index, address and public_key of every derived child, in index order
+
+        Security:
+            Worker processes receive the account extended private key
+        """
+        private_key, chain_code = self.__extended_key(self.__account_path(account))
+        indexes = list(range(start, start + count))
+        if not processes or count <= chunk_size:
+            return derive_children(private_key, chain_code, indexes)
+
+        chunks = [indexes[i:i + chunk_size] for i in range(0, len(indexes), chunk_size)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = executor.map(derive_children, [private_key] * len(chunks), [chain_code] * len(chunks), chunks)
+            return [child for chunk in results for child in chunk]
+
+    def wipe(self):
+        self.__nodes = {}
+        self.__mnemonic = 'x' * 99
@@ -1,55 +1,60 @@
+import json
+import os
+import uuid
 import requests
 
 from classes.node import Node
-from classes.blockchain import Blockchain
-from classes.block import Block
-from classes.coherence_block import CoherenceBlock
+from classes.blockchain import Blockchain, encode_json
+from classes.block_download import BlockDownloader, InvalidRange, verify_range
 from classes.transaction import Transaction
+from classes.wallet import Wallet
 
-def set_blockchain(bootstrap_node):
+def set_blockchain(bootstrap_node, peers=None):
+    """
+    Downloads the chain with the staged block download from the bootstrap node and its peers
+
+    Falls back to a single /blockchain request only when no node serves /chain_head and
+    /blocks; a download that fails verification aborts the start instead. The fallback chain
+    goes through the same verification as a downloaded range, so an invalid chain from the
+    bootstrap node aborts the start as well.
+
+    Raises:
+        InvalidRange: When the chain served by /blockchain fails verification
+    """
+    downloader = BlockDownloader([bootstrap_node] + list((peers or {}).values()))
+    blockchain = downloader.run()
+    if blockchain is not None:
+        return blockchain
     try:
         blockchain_response = requests.get(f'{bootstrap_node}/blockchain')
         if blockchain_response.status_code == 200:
-            chain = []
-            coherence_chain = []
-            entangled_blocks = {}
-
-            remote_chain = blockchain_response.json().get('chain')
-            remote_coherence_chain = blockchain_response.json().get('coherence_chain')
-
-            for block, coherence_block in zip(remote_chain, remote_coherence_chain):
-                transactions = []
-                
-                block_transactions = block.get('transactions')
-                for transaction in block_transactions:
-                    transactions.append(Transaction(**transaction))
-
-                processed_block = Block(**block)
-                processed_block.transactions = block_transactions
-                processed_coherence_block = CoherenceBlock(**coherence_block)
-
-                entangled_hash = processed_coherence_block.entangled_hash
-                chain.append(processed_block)
-                coherence_chain.append(processed_coherence_block)
-                entangled_blocks[entangled_hash] = (processed_block, processed_coherence_block)
-                
-
-            blockchain_kwargs = {
-                'chain': chain,
-                'coherence_chain': coherence_chain,
-                'entangled_blocks': entangled_blocks,
-                'current_chain_index': blockchain_response.json().get('current_chain_index'),
-                'current_coherence_chain_index': blockchain_response.json().get('current_coherence_chain_index'),
-                'pending_transactions': blockchain_response.json().get('pending_transactions')
-            }
-            blockchain = Blockchain(**blockchain_kwargs)
+            remote = blockchain_response.json()
+            remote_chain = remote.get('chain') or []
+            remote_coherence_chain = remote.get('coherence_chain') or []
+            if len(remote_chain) != len(remote_coherence_chain):
+                raise InvalidRange(f'Bootstrap node served {len(remote_chain)} blocks and {len(remote_coherence_chain)} coherence blocks')
+            # A pruned source serves the blocks below its pruned height as headers only
+            pruned_height = remote.get('pruned_height') or 0
+            body = encode_json([
+                {'block': {**block, 'pruned': True} if (block.get('index') or 0) < pruned_height else block, 'coherence_block': coherence_block}
+                for block, coherence_block in zip(remote_chain, remote_coherence_chain)
+            ])
+            pairs = verify_range(body, 0)
+            blockchain = downloader.apply(None, pairs)
+            if blockchain is None:
+                blockchain = Blockchain()
+            blockchain.current_chain_index = remote.get('current_chain_index', blockchain.current_chain_index)
+            blockchain.current_coherence_chain_index = remote.get('current_coherence_chain_index', blockchain.current_coherence_chain_index)
+            blockchain.pending_transactions = [Transaction(**transaction) for transaction in remote.get('pending_transactions') or []]
+            pruned_height = max([pruned_height] + [block.index + 1 for block, _, _, _, pruned in pairs if pruned])
+            if pruned_height:
+                blockchain.prune_to(pruned_height)
             return blockchain
     except requests.RequestException:
         pass
     bc_kwargs = {
         'chain': [],
         'coherence_chain': [],
-        'entangled_blocks': {},
         'current_chain_index': 0,
         'current_coherence_chain_index': 0,
         'pending_transactions': [],
@@ -69,12 +74,36 @@ def set_peers(bootstrap_node):
         pass 
     return {}
 
+def generate_node_id():
+    """
+    Random 64-bit node id, unique without coordination so concurrent joins never collide
+    """
+    return uuid.uuid4().hex[:16]
+
+def load_identity(port):
+    """
+    Node id and identity wallet, created on the first start and reused afterwards
+
+    Peers only accept round entries signed with the key a node advertised, so the key must
+    survive restarts. Stored in NODE_IDENTITY_PATH, by default one file per port.
+    """
+    path = os.environ.get('NODE_IDENTITY_PATH', f'node_identity_{port}.json')
+    if os.path.exists(path):
+        with open(path) as identity_file:
+            identity = json.load(identity_file)
+        return identity['node_id'], Wallet.from_recovery_key(identity['recovery_key'])
+    node_id, wallet = generate_node_id(), Wallet()
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as identity_file:
+        json.dump({'node_id': node_id, 'recovery_key': wallet.get_recovery_key()}, identity_file)
+    return node_id, wallet
+
 def run_node(ip, port, url=None):
     bootstrap_node = 'http://127.0.0.1:5000'
 
-    blockchain = set_blockchain(bootstrap_node)
     peers = set_peers(bootstrap_node)
-    node_id = str(len(peers)) if isinstance(peers, dict) else '0'
+    blockchain = set_blockchain(bootstrap_node, peers)
+    node_id, wallet = load_identity(port)
+    retain_blocks = os.environ.get('NODE_RETAIN_BLOCKS')
 
     kwargs = {
         'node_id': node_id, 
@@ -82,7 +111,9 @@ def run_node(ip, port, url=None):
         'port':port, 
         'url':url, 
         'blockchain':blockchain, 
-        'peers':peers
+        'peers':peers,
+        'retain_blocks': int(retain_blocks) if retain_blocks else None,
+        'wallet': wallet
         }
     node = Node(**kwargs)
 
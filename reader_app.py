@@ -0,0 +1,6 @@
+from fastapi import FastAPI
+from routes.reader_routes import reader_router
+
+app = FastAPI()
+
+app.include_router(reader_router)
\ No newline at end of file
@@ -0,0 +1,35 @@
+import os
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from utils.request_profiler import profiler
+
+from schemas.profiler_config import ProfilerConfig
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    admin_token = os.environ.get('NODE_ADMIN_TOKEN')
+    if admin_token and x_admin_token != admin_token:
+        raise HTTPException(status_code=403, detail="Token de administración inválido.")
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(verify_admin_token)])
+
+# Profiler routes
+
+@admin_router.get("/profile")
+def get_profile(limit: int = 25):
+    return profiler.summary(limit)
+
+@admin_router.get("/profile/flamegraph", response_class=PlainTextResponse)
+def get_flamegraph():
+    return profiler.folded_stacks()
+
+@admin_router.post("/profile")
+def configure_profile(config: ProfilerConfig):
+    profiler.configure(config.sample_rate, config.interval)
+    return {'message': 'Profiler configured', 'sample_rate': profiler.sample_rate, 'interval': profiler.interval}
+
+@admin_router.delete("/profile")
+def reset_profile():
+    profiler.reset()
+    return {'message': 'Profiler reset'}
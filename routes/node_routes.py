@@ -1,9 +1,18 @@
-from fastapi import APIRouter, HTTPException, Body
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Body, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
-from typing import Dict
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional
 
 from config.node_generation import run_node
+from routes.admin_routes import verify_admin_token
+from utils.request_profiler import profiler
+from utils.http_cache import cached_response, immutable_response
 
+from classes.node_runtime import runtime
+from classes.event_bus import Event, Subscription, event_bus
 from classes.transaction import Transaction
 
 from schemas.pair_request import PairRequest
@@ -12,155 +21,325 @@ from schemas.prediction import Prediction
 from schemas.score import Score
 
 node_router = APIRouter()
-node = None
+
+MAX_TRANSACTION_BATCH = 1000
+EVENT_REPLAY_BATCH = 64
+MAX_BLOCK_RANGE = 1024
+GOSSIP_ROUTES = {
+    "/receive_peers",
+    "/sync_peers",
+    "/receive_pair_key",
+    "/receive_transaction",
+    "/receive_transactions",
+    "/receive_prediction",
+    "/receive_score",
+    "/receive_blocks"
+}
+
+async def read_transaction_batch(request: Request) -> List[Transaction]:
+    """
+    Reads a batch of transactions sent as a JSON array or as newline-delimited JSON
+    """
+    body = await request.body()
+    try:
+        if request.headers.get('content-type', '').startswith('application/x-ndjson'):
+            raw_transactions = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            raw_transactions = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Lote de transacciones inválido.")
+    if not isinstance(raw_transactions, list):
+        raise HTTPException(status_code=400, detail="Se esperaba una lista de transacciones.")
+    if len(raw_transactions) > MAX_TRANSACTION_BATCH:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_TRANSACTION_BATCH} transacciones por lote.")
+    try:
+        return await run_in_threadpool(profiler.wrap(lambda: [Transaction(**transaction) for transaction in raw_transactions]))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+async def node_events(node, subscription: Subscription, from_height: Optional[int]):
+    """
+    Replays the blocks committed from from_height, then follows the live events
+
+    The subscription is registered before the replay starts, so blocks committed meanwhile are
+    buffered and the ones already replayed are skipped. Yields None when a heartbeat is due and
+    ends with a 'lagged' event carrying the height to resume from if the buffer overflowed.
+    """
+    last_height = from_height - 1 if from_height is not None else len(node.blockchain.chain) - 1
+    if from_height is not None and 'block_committed' in subscription.types:
+        height = max(0, from_height)
+        while height < min(len(node.blockchain.chain), len(node.blockchain.coherence_chain)):
+            end = min(height + EVENT_REPLAY_BATCH, len(node.blockchain.chain), len(node.blockchain.coherence_chain))
+            bodies = await run_in_threadpool(lambda: [node.block_event(index) for index in range(height, end)])
+            for index, body in enumerate(bodies, start=height):
+                yield Event(seq=0, type='block_committed', height=index, data=body)
+            last_height = end - 1
+            height = end
+    replayed = last_height
+    while True:
+        try:
+            event = await subscription.next(event_bus.heartbeat)
+        except asyncio.TimeoutError:
+            yield None
+            continue
+        if event is None:
+            yield Event(seq=0, type='lagged', height=last_height, data=json.dumps({'from_height': last_height + 1}).encode('utf-8'))
+            return
+        if event.type == 'chain_reorganized':
+            # Heights above the fork point are committed again by the new branch
+            replayed = min(replayed, event.height)
+            last_height = min(last_height, event.height)
+        elif event.type == 'block_committed':
+            if event.height <= replayed:
+                continue
+            last_height = event.height
+        yield event
+
+def event_types(types: Optional[str]) -> Optional[List[str]]:
+    return [event_type.strip() for event_type in types.split(',') if event_type.strip()] if types else None
 
 # Node routes
 
 @node_router.post("/run_node")
-def start_node(ip: str = '127.0.0.1', port: int = 5000, url: str = None):
-    global node
-    if node is None:
-        node = run_node(ip, port, url)
+@profiler.route("/run_node")
+async def start_node(ip: str = '127.0.0.1', port: int = 5000, url: str = None):
+    node = await runtime.start(run_node, ip, port, url)
+    if node is not None:
         return {'message': 'Node running', 'Node': node}
     return {'message': 'Node is already running'}
 
 @node_router.get("/node_info")
-def get_node_info():
-    global node
+@profiler.route("/node_info")
+async def get_node_info(request: Request):
+    node = runtime.require_node()
+    return await run_in_threadpool(profiler.wrap(cached_response), request, None, node.to_json)
+
+@node_router.get("/health")
+async def get_health():
+    return {"status": "ok", "node_id": runtime.node.node_id if runtime.node is not None else None}
+
+# Event routes
+
+@node_router.get("/events")
+async def stream_events(request: Request, from_height: Optional[int] = None, types: Optional[str] = None):
+    node = runtime.require_node()
+    last_event_id = request.headers.get('last-event-id', '')
+    if from_height is None and last_event_id.isdigit():
+        from_height = int(last_event_id) + 1
+    subscription = event_bus.subscribe(event_types(types))
+
+    async def stream():
+        try:
+            async for event in node_events(node, subscription, from_height):
+                if await request.is_disconnected():
+                    break
+                yield b': heartbeat\n\n' if event is None else event.to_sse()
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@node_router.websocket("/ws/events")
+async def websocket_events(websocket: WebSocket, from_height: Optional[int] = None, types: Optional[str] = None):
+    node = runtime.node
     if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.to_dict())
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    subscription = event_bus.subscribe(event_types(types))
+    try:
+        async for event in node_events(node, subscription, from_height):
+            await websocket.send_text('{"type":"heartbeat"}' if event is None else event.to_json().decode('utf-8'))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
+
+# Job routes
+
+@node_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = runtime.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return job
 
 # Pair routes
 
 @node_router.get("/find_pair")
-def find_pair():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return node.find_pair()
+@profiler.route("/find_pair")
+async def find_pair():
+    node = runtime.require_node()
+    return await run_in_threadpool(profiler.wrap(node.find_pair))
 
 @node_router.post("/entanglement_request")
-def entanglement_request(pair_request: PairRequest):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return node.entanglement_request(pair_request.remote_peer_id)
+@profiler.route("/entanglement_request")
+async def entanglement_request(pair_request: PairRequest):
+    node = runtime.require_node()
+    return await run_in_threadpool(profiler.wrap(node.entanglement_request), pair_request.remote_peer_id)
 
-@node_router.post("/receive_pair_key")
-def receive_key(key: PairKey):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicicializado.")
-    return node.receive_key(key.key)
+@node_router.get("/pairing_status")
+async def get_pairing_status():
+    node = runtime.require_node()
+    return node.pairing_status()
+
+@node_router.post("/receive_pair_key", status_code=202)
+@profiler.route("/receive_pair_key")
+async def receive_key(key: PairKey):
+    node = runtime.require_node("El nodo no está inicicializado.")
+    return {"message": "Key queued", "job_id": runtime.submit("/receive_pair_key", node.receive_key, key.key)}
 
 # Blockchain routes
 
 @node_router.get("/blockchain")
-def get_blockchain():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado. Llama primero a /run_node")
-    return jsonable_encoder(node.blockchain.to_dict())
+@profiler.route("/blockchain")
+async def get_blockchain(request: Request):
+    node = runtime.require_node("El nodo no está inicializado. Llama primero a /run_node")
+    return await run_in_threadpool(profiler.wrap(lambda: cached_response(request, node.blockchain.etag(), node.blockchain.to_json)))
+
+@node_router.get("/chain_head")
+async def get_chain_head():
+    node = runtime.require_node()
+    return node.blockchain.head()
+
+@node_router.get("/blocks")
+@profiler.route("/blocks")
+async def get_block_range(request: Request, start: int = 0, end: Optional[int] = None):
+    node = runtime.require_node()
+    end = min(end if end is not None else start + MAX_BLOCK_RANGE, start + MAX_BLOCK_RANGE)
+    return await run_in_threadpool(profiler.wrap(lambda: cached_response(request, None, lambda: node.blockchain.range_json(start, end))))
 
 @node_router.get("/validate_blockchain")
-def validate_blockchain():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no esta inicializado.")
-    return jsonable_encoder(node.validate_blockchain())
+@profiler.route("/validate_blockchain")
+async def validate_blockchain():
+    node = runtime.require_node("El nodo no esta inicializado.")
+    return jsonable_encoder(await runtime.write(node.validate_blockchain))
+
+@node_router.post("/audit_blockchain", status_code=202, dependencies=[Depends(verify_admin_token)])
+async def audit_blockchain(verify_signatures: Optional[bool] = None):
+    node = runtime.require_node()
+    return await run_in_threadpool(node.audit_blockchain, verify_signatures)
+
+@node_router.get("/audit_blockchain")
+async def get_audit_report():
+    node = runtime.require_node()
+    report = node.audit_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No se ha auditado la cadena.")
+    return report
 
 # Peers routes
 
 @node_router.get("/peers")
-def get_peers():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.peers)
+@profiler.route("/peers")
+async def get_peers():
+    node = runtime.require_node()
+    return jsonable_encoder(dict(node.peers))
 
-@node_router.post("/receive_peers")
-def receive_peers(peers: dict):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    
-    node.receive_peers(peers)
-    return {"message": "Peers received", "updated_peers": jsonable_encoder(node.peers)}
+@node_router.get("/peers/health")
+@profiler.route("/peers/health")
+async def get_peers_health():
+    node = runtime.require_node()
+    return jsonable_encoder(node.peers_health())
+
+@node_router.post("/receive_peers", status_code=202)
+@profiler.route("/receive_peers")
+async def receive_peers(peers: dict):
+    node = runtime.require_node()
+    job_id = runtime.submit("/receive_peers", node.receive_peers, peers)
+    return {"message": "Peers received", "job_id": job_id}
+
+@node_router.post("/sync_peers")
+@profiler.route("/sync_peers")
+async def sync_peers(body: dict):
+    node = runtime.require_node()
+    return jsonable_encoder(await runtime.write(node.sync_peers, body.get("digest") or {}))
 
 # Transaction routes
 
-@node_router.post("/add_transaction")
-def add_transaction(transaction: dict):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    
-    return node.add_transaction(Transaction(**transaction))
+@node_router.post("/add_transaction", status_code=202)
+@profiler.route("/add_transaction")
+async def add_transaction(transaction: dict):
+    node = runtime.require_node()
+    return {"message": "Transaction queued", "job_id": runtime.submit("/add_transaction", node.add_transaction, Transaction(**transaction))}
+
+@node_router.post("/add_transactions", status_code=202)
+@profiler.route("/add_transactions")
+async def add_transactions(request: Request):
+    node = runtime.require_node()
+    transactions = await read_transaction_batch(request)
+    return {"message": "Transactions queued", "count": len(transactions), "job_id": runtime.submit("/add_transactions", node.add_transactions, transactions)}
 
 @node_router.get("/transactions")
-def get_transactions():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.blockchain.pending_transactions)
+@profiler.route("/transactions")
+async def get_transactions():
+    node = runtime.require_node()
+    return jsonable_encoder(list(node.blockchain.pending_transactions))
 
-@node_router.post("/receive_transaction")
-def receive_transaction(transaction: dict):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    node.receive_transaction(Transaction(**transaction))
+@node_router.post("/receive_transaction", status_code=202)
+@profiler.route("/receive_transaction")
+async def receive_transaction(transaction: dict):
+    node = runtime.require_node()
+    return {"message": "Transaction queued", "job_id": runtime.submit("/receive_transaction", node.receive_transaction, Transaction(**transaction))}
+
+@node_router.post("/receive_transactions", status_code=202)
+@profiler.route("/receive_transactions")
+async def receive_transactions(request: Request):
+    node = runtime.require_node()
+    transactions = await read_transaction_batch(request)
+    return {"message": "Transactions queued", "count": len(transactions), "job_id": runtime.submit("/receive_transactions", node.receive_transactions, transactions)}
 
 # Prediction routes
 
-@node_router.post("/receive_prediction")
-def receive_prediction(prediction: Prediction):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    node.receive_prediction(prediction.node_id, prediction.prediction)
+@node_router.post("/receive_prediction", status_code=202)
+@profiler.route("/receive_prediction")
+async def receive_prediction(prediction: Prediction):
+    node = runtime.require_node()
+    return {"message": "Prediction queued", "job_id": runtime.submit("/receive_prediction", node.receive_prediction, prediction.node_id, prediction.prediction)}
 
-@node_router.post("/receive_score")
-def receive_score(score: Score):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    node.receive_score(score.node_id, score.score)
+@node_router.post("/receive_score", status_code=202)
+@profiler.route("/receive_score")
+async def receive_score(score: Score):
+    node = runtime.require_node()
+    entry = jsonable_encoder(score) if score.r else None
+    return {"message": "Score queued", "job_id": runtime.submit("/receive_score", node.receive_score, score.node_id, score.score, entry)}
 
 @node_router.get("/predictions")
-def get_predictions():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.consensus_predictions)
+@profiler.route("/predictions")
+async def get_predictions():
+    node = runtime.require_node()
+    return jsonable_encoder(dict(node.consensus_predictions))
 
 @node_router.get("/scores")
-def get_scores():
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.prediction_scores)
+@profiler.route("/scores")
+async def get_scores():
+    node = runtime.require_node()
+    return jsonable_encoder(dict(node.prediction_scores))
 
 # Blocks routes
 
-@node_router.post("/receive_blocks")
-def receive_blocks(blocks: dict):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    node.receive_blocks(blocks.get('block'), blocks.get('coherence_block'), blocks.get('entangled_hash'), blocks.get('node_id'))
+@node_router.post("/receive_blocks", status_code=202)
+@profiler.route("/receive_blocks")
+async def receive_blocks(blocks: dict):
+    node = runtime.require_node()
+    job_id = runtime.submit("/receive_blocks", node.receive_blocks, blocks.get('block'), blocks.get('coherence_block'), blocks.get('entangled_hash'), blocks.get('node_id'), blocks.get('certificate'))
+    return {"message": "Blocks queued", "job_id": job_id}
 
 @node_router.get("/block/{hash}")
-def get_blocks(hash: str):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.get_block(hash))
+@profiler.route("/block/{hash}")
+async def get_blocks(request: Request, hash: str):
+    node = runtime.require_node()
+    return await run_in_threadpool(profiler.wrap(lambda: immutable_response(request, node.get_block_json(hash))))
+
+@node_router.get("/certificate/{hash}")
+@profiler.route("/certificate/{hash}")
+async def get_block_certificate(hash: str):
+    node = runtime.require_node()
+    return node.get_block_certificate(hash)
 
 @node_router.get("/coherence_block/{hash}")
-def get_blocks(hash: str):
-    global node
-    if node is None:
-        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
-    return jsonable_encoder(node.get_coherence_block(hash))
\ No newline at end of file
+@profiler.route("/coherence_block/{hash}")
+async def get_blocks(request: Request, hash: str):
+    node = runtime.require_node()
+    return await run_in_threadpool(profiler.wrap(lambda: immutable_response(request, node.get_coherence_block_json(hash))))
\ No newline at end of file
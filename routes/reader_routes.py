@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from typing import Optional
+
+from classes.node_store import NodeStore
+from utils.http_cache import cached_response, immutable_response, make_etag
+
+reader_router = APIRouter()
+store = NodeStore()
+
+MAX_BLOCK_RANGE = 1024
+
+def snapshot_response(request: Request, name: str) -> Response:
+    version = store.get_snapshot_version(name)
+    if version is None:
+        raise HTTPException(status_code=400, detail="El nodo no está inicializado.")
+    return cached_response(request, make_etag(name, version), lambda: (store.get_snapshot(name) or 'null').encode('utf-8'))
+
+def block_response(request: Request, hash: str, kind: str) -> Response:
+    body = store.get_block(hash, kind)
+    return immutable_response(request, body.encode('utf-8') if body is not None else None)
+
+# Read-only routes served from the node store
+
+@reader_router.get("/node_info")
+def get_node_info(request: Request):
+    return snapshot_response(request, 'node_info')
+
+@reader_router.get("/blockchain")
+def get_blockchain(request: Request):
+    return snapshot_response(request, 'blockchain')
+
+@reader_router.get("/chain_head")
+def get_chain_head(request: Request):
+    return snapshot_response(request, 'chain_head')
+
+@reader_router.get("/blocks")
+def get_block_range(request: Request, start: int = 0, end: Optional[int] = None):
+    end = min(end if end is not None else start + MAX_BLOCK_RANGE, start + MAX_BLOCK_RANGE)
+    return cached_response(request, None, lambda: store.get_block_range(start, end).encode('utf-8'))
+
+@reader_router.get("/transactions")
+def get_transactions(request: Request):
+    return snapshot_response(request, 'transactions')
+
+@reader_router.get("/peers")
+def get_peers(request: Request):
+    return snapshot_response(request, 'peers')
+
+@reader_router.get("/block/{hash}")
+def get_block(request: Request, hash: str):
+    return block_response(request, hash, 'block')
+
+@reader_router.get("/coherence_block/{hash}")
+def get_coherence_block(request: Request, hash: str):
+    return block_response(request, hash, 'coherence_block')
\ No newline at end of file
@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class ProfilerConfig(BaseModel):
+    sample_rate: Optional[float] = None
+    interval: Optional[float] = None
\ No newline at end of file
@@ -1,5 +1,12 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class Score(BaseModel):
     node_id: str
-    score: int
\ No newline at end of file
+    score: int
+    round_id: Optional[str] = None
+    prediction: Optional[int] = None
+    public_key: Optional[str] = None
+    r: Optional[str] = None
+    s: Optional[str] = None
+    v: Optional[int] = None
\ No newline at end of file
@@ -0,0 +1,546 @@
+import ast
+import copy
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import operator as operator_functions
+import signal
+import threading
+import traceback
+from collections import OrderedDict
+from pydantic import BaseModel
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAS_LIMIT = 100000
+COMPILED_CACHE_SIZE = 1024
+MAX_INT_BITS = 65536
+MAX_SEQUENCE_LENGTH = 100000
+# Items of a container, or characters of a string, that one unit of gas pays for
+ITEMS_PER_GAS = 16
+
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.If, ast.For, ast.While, ast.Break,
+    ast.Continue, ast.Pass, ast.Return, ast.Assert, ast.FunctionDef, ast.arguments, ast.arg,
+    ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.keyword,
+    ast.Name, ast.Load, ast.Store, ast.Constant, ast.Subscript, ast.Slice, ast.Attribute,
+    ast.List, ast.Tuple, ast.Dict, ast.ListComp, ast.DictComp, ast.GeneratorExp, ast.comprehension,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.LShift, ast.RShift,
+    ast.BitOr, ast.BitXor, ast.BitAnd, ast.And, ast.Or, ast.Not, ast.USub, ast.UAdd, ast.Invert,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot
+) + ((ast.Index,) if hasattr(ast, 'Index') else ())
+
+SAFE_METHODS = {
+    'get', 'keys', 'values', 'items', 'append', 'pop', 'update', 'setdefault', 'copy', 'count',
+    'index', 'insert', 'remove', 'lower', 'upper', 'strip', 'split', 'join', 'startswith',
+    'endswith', 'replace'
+}
+
+# Methods whose cost grows with the object they are called on
+LINEAR_METHODS = {'count', 'index', 'insert', 'remove', 'copy', 'lower', 'upper', 'strip', 'split', 'replace', 'startswith', 'endswith'}
+# Methods that only store or look up their arguments by reference
+REFERENCE_METHODS = {'append', 'insert', 'setdefault', 'get', 'pop'}
+# Methods returning a new string or container
+BUILDING_METHODS = {'copy', 'lower', 'upper', 'strip', 'split', 'replace', 'join'}
+# Builtins charged for the values they traverse and build
+METERED_BUILTINS = {'dict', 'list', 'tuple', 'str', 'int', 'float', 'sorted', 'sum', 'max', 'min', 'any', 'all'}
+
+OPERATORS = {
+    ast.Add: 'add', ast.Sub: 'sub', ast.Mult: 'mul', ast.Div: 'truediv', ast.FloorDiv: 'floordiv',
+    ast.Mod: 'mod', ast.Pow: 'pow', ast.LShift: 'lshift', ast.RShift: 'rshift', ast.BitOr: 'or_',
+    ast.BitXor: 'xor', ast.BitAnd: 'and_'
+}
+
+COMPARISONS = {
+    'Eq': operator_functions.eq, 'NotEq': operator_functions.ne, 'Lt': operator_functions.lt,
+    'LtE': operator_functions.le, 'Gt': operator_functions.gt, 'GtE': operator_functions.ge,
+    'In': lambda left, right: left in right, 'NotIn': lambda left, right: left not in right,
+    'Is': operator_functions.is_, 'IsNot': operator_functions.is_not
+}
+
+SAFE_BUILTINS = {
+    'abs': abs, 'all': all, 'any': any, 'bool': bool, 'dict': dict, 'enumerate': enumerate,
+    'float': float, 'int': int, 'isinstance': isinstance, 'len': len, 'list': list, 'max': max,
+    'min': min, 'round': round, 'sorted': sorted, 'str': str, 'sum': sum, 'tuple': tuple,
+    'zip': zip, 'True': True, 'False': False, 'None': None
+}
+
+class ContractError(Exception):
+    """
+    Base error of contract validation and execution
+    """
+
+class ContractValidationError(ContractError):
+    """
+    The contract uses syntax outside the allowed subset
+    """
+
+class OutOfGas(ContractError):
+    """
+    The contract used more gas than its limit
+    """
+
+class ContractTimeout(ContractError):
+    """
+    The contract exceeded its CPU or wall time limit
+    """
+
+class ContractResult(BaseModel):
+    code_hash: Optional[str] = None
+    success: bool
+    result: Any = None
+    state: Dict[str, Any] = {}
+    gas_used: int = 0
+    error: Optional[str] = None
+
+# Validation and compilation functions
+
+def validate_contract(tree: ast.AST):
+    """
+    Rejects every node outside the allowed subset
+
+    There is no import, attribute access outside SAFE_METHODS, try, with, class, lambda or
+    global statement, and names starting with an underscore are reserved, so contracts cannot
+    reach dunder attributes nor the gas meter injected by GasMeter. Methods can only be
+    called, so every method call goes through the meter.
+    """
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ContractValidationError(f'{type(node).__name__} is not allowed in contracts')
+        if isinstance(node, ast.Name) and node.id.startswith('_'):
+            raise ContractValidationError(f'Name {node.id} is reserved')
+        if isinstance(node, (ast.FunctionDef, ast.arg)):
+            name = node.name if isinstance(node, ast.FunctionDef) else node.arg
+            if name.startswith('_'):
+                raise ContractValidationError(f'Name {name} is reserved')
+        if isinstance(node, ast.FunctionDef) and (node.decorator_list or node.returns):
+            raise ContractValidationError('Decorators and annotations are not allowed in contracts')
+        if isinstance(node, ast.arguments) and (node.vararg or node.kwarg or node.kw_defaults or node.defaults):
+            raise ContractValidationError('Only positional arguments without defaults are allowed in contracts')
+        if isinstance(node, ast.Attribute) and node.attr not in SAFE_METHODS:
+            raise ContractValidationError(f'Attribute {node.attr} is not allowed in contracts')
+        if isinstance(node, ast.Attribute) and id(node) not in called:
+            raise ContractValidationError(f'Method {node.attr} can only be called')
+
+class GasMeter(ast.NodeTransformer):
+    """
+    Instruments a validated contract
+
+    Charges one gas before every statement and per item of every loop or comprehension, and
+    routes every operator, comparison, slice and method call through the meter, which checks
+    the size of what they build and charges gas in proportion to the values they traverse.
+    """
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        for field in ('body', 'orelse'):
+            statements = getattr(node, field, None)
+            if isinstance(statements, list) and statements and isinstance(statements[0], ast.stmt):
+                setattr(node, field, self.metered(statements))
+        return node
+
+    def metered(self, statements):
+        instrumented = []
+        for statement in statements:
+            instrumented.append(ast.Expr(value=self.call('__gas__')))
+            instrumented.append(statement)
+        return instrumented
+
+    def call(self, name, *args):
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=list(args), keywords=[])
+
+    def visit_For(self, node):
+        node = self.generic_visit(node)
+        node.iter = self.call('__metered__', node.iter)
+        return node
+
+    def visit_comprehension(self, node):
+        node = self.generic_visit(node)
+        node.iter = self.call('__metered__', node.iter)
+        return node
+
+    def visit_BinOp(self, node):
+        node = self.generic_visit(node)
+        return self.call('__op__', ast.Constant(value=OPERATORS[type(node.op)]), node.left, node.right)
+
+    def visit_AugAssign(self, node):
+        node = self.generic_visit(node)
+        target = copy.deepcopy(node.target)
+        for child in ast.walk(target):
+            if hasattr(child, 'ctx'):
+                child.ctx = ast.Load()
+        # In place, so a list extended with += stays the same object for every name bound to it
+        return ast.Assign(targets=[node.target], value=self.call('__op__', ast.Constant(value=OPERATORS[type(node.op)]), target, node.value, ast.Constant(value=True)))
+
+    def visit_Compare(self, node):
+        node = self.generic_visit(node)
+        if len(node.ops) == 1:
+            return self.call('__compare__', ast.Constant(value=type(node.ops[0]).__name__), node.left, node.comparators[0])
+        # Chained comparisons keep their short circuit, every operand is charged
+        node.left = self.call('__sized__', node.left)
+        node.comparators = [self.call('__sized__', comparator) for comparator in node.comparators]
+        return node
+
+    def visit_Subscript(self, node):
+        node = self.generic_visit(node)
+        if not isinstance(node.ctx, ast.Load) or not isinstance(node.slice, ast.Slice):
+            return node
+        bounds = [bound if bound is not None else ast.Constant(value=None) for bound in (node.slice.lower, node.slice.upper, node.slice.step)]
+        return self.call('__slice__', node.value, *bounds)
+
+    def visit_Call(self, node):
+        node = self.generic_visit(node)
+        if not isinstance(node.func, ast.Attribute):
+            return node
+        return ast.Call(func=ast.Name(id='__method__', ctx=ast.Load()), args=[node.func.value, ast.Constant(value=node.func.attr)] + node.args, keywords=node.keywords)
+
+_compiled_contracts: OrderedDict = OrderedDict()
+_compiled_lock = threading.Lock()
+
+def compile_contract(code: str) -> Tuple[str, Any]:
+    """
+    Validates, instruments and compiles a contract, caching the result by code hash
+
+    Args:
+        code (str): Contract source
+
+    Returns:
+        tuple: (code_hash, code object)
+
+    Raises:
+        ContractValidationError: When the code is not valid Python or uses disallowed syntax
+    """
+    code_hash = 'Φx' + hashlib.sha256(code.encode('utf-8')).hexdigest()
+    with _compiled_lock:
+        if code_hash in _compiled_contracts:
+            _compiled_contracts.move_to_end(code_hash)
+            return code_hash, _compiled_contracts[code_hash]
+    try:
+        tree = ast.parse(code, mode='exec')
+    except SyntaxError as e:
+        raise ContractValidationError(f'Invalid contract syntax: {e}')
+    validate_contract(tree)
+    tree = ast.fix_missing_locations(GasMeter().visit(tree))
+    bytecode = compile(tree, f'<contract {code_hash[:14]}>', 'exec')
+    with _compiled_lock:
+        _compiled_contracts[code_hash] = bytecode
+        if len(_compiled_contracts) > COMPILED_CACHE_SIZE:
+            _compiled_contracts.popitem(last=False)
+    return code_hash, bytecode
+
+# Execution functions
+
+def value_weight(value, limit: int, memo: Optional[dict] = None) -> int:
+    """
+    Items and characters reachable from a value, what traversing it costs
+
+    Containers referenced several times are measured once and counted at every reference,
+    so measuring costs no more than the memory the contract allocated.
+
+    Raises:
+        OutOfGas: As soon as the weight exceeds limit
+    """
+    if isinstance(value, str):
+        return len(value) + 1
+    if isinstance(value, int):
+        return 1 + value.bit_length() // 64
+    if not isinstance(value, (list, tuple, dict, set)):
+        return 1
+    memo = {} if memo is None else memo
+    key = id(value)
+    if key in memo:
+        return memo[key]
+    # A container reached again while it is measured, a cycle, counts as one reference
+    memo[key] = 1
+    weight = 1
+    items = [item for pair in value.items() for item in pair] if isinstance(value, dict) else value
+    for item in items:
+        weight += 1 if item is None or type(item) in (int, float, bool) else value_weight(item, limit, memo)
+        if weight > limit:
+            raise OutOfGas('Gas limit exceeded')
+    memo[key] = weight
+    return weight
+
+def check_size(value):
+    if isinstance(value, (str, list, tuple, dict, set)) and len(value) > MAX_SEQUENCE_LENGTH:
+        raise ContractError(f'Values are limited to {MAX_SEQUENCE_LENGTH} items')
+    return value
+
+def sized_op(operator: str, left, right, inplace: bool = False):
+    if operator == 'add' and isinstance(left, (str, list, tuple)) and isinstance(right, (str, list, tuple)) and len(left) + len(right) > MAX_SEQUENCE_LENGTH:
+        raise ContractError(f'Result of + exceeds {MAX_SEQUENCE_LENGTH} items')
+    if operator == 'or_' and isinstance(left, (dict, set)) and isinstance(right, (dict, set)) and len(left) + len(right) > MAX_SEQUENCE_LENGTH:
+        raise ContractError(f'Result of | exceeds {MAX_SEQUENCE_LENGTH} items')
+    if operator == 'mod' and isinstance(left, str):
+        raise ContractError('String formatting with % is not allowed in contracts')
+    if operator not in ('pow', 'lshift', 'mul'):
+        function = getattr(operator_functions, f'i{operator.rstrip("_")}' if inplace else operator)
+        return function(left, right)
+    if operator == 'pow':
+        if isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1 and left.bit_length() * right > MAX_INT_BITS:
+            raise ContractError(f'Result of ** exceeds {MAX_INT_BITS} bits')
+        return left ** right
+    if operator == 'lshift':
+        if isinstance(left, int) and isinstance(right, int) and left.bit_length() + right > MAX_INT_BITS:
+            raise ContractError(f'Result of << exceeds {MAX_INT_BITS} bits')
+        return left << right
+    if isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_INT_BITS:
+            raise ContractError(f'Result of * exceeds {MAX_INT_BITS} bits')
+    elif isinstance(left, (str, list, tuple)) and isinstance(right, int) or isinstance(right, (str, list, tuple)) and isinstance(left, int):
+        sequence, times = (left, right) if isinstance(right, int) else (right, left)
+        if len(sequence) * times > MAX_SEQUENCE_LENGTH:
+            raise ContractError(f'Result of * exceeds {MAX_SEQUENCE_LENGTH} items')
+    return operator_functions.imul(left, right) if inplace else left * right
+
+def run_contract(code: str, state: dict, args: dict, context: dict, gas_limit: int, cpu_limit: float) -> dict:
+    """
+    Executes a contract in the current process, normally a pool worker
+
+    The contract sees state, args and context as globals, mutates state and leaves its
+    return value in result. Both must stay JSON serializable.
+    """
+    meter = {'gas': 0}
+
+    def charge(cost: int = 1):
+        meter['gas'] += cost
+        if meter['gas'] > gas_limit:
+            meter['gas'] = gas_limit
+            raise OutOfGas(f'Gas limit of {gas_limit} exceeded')
+
+    def metered(iterable):
+        for item in iterable:
+            charge()
+            yield item
+
+    def metered_range(*range_args):
+        items = range(*range_args)
+        charge(len(items))
+        return items
+
+    def weigh(values, factor: int = 1):
+        # Gas for traversing values, ITEMS_PER_GAS items per gas
+        limit = (gas_limit - meter['gas'] + 1) * ITEMS_PER_GAS
+        memo = {}
+        try:
+            weight = sum(value_weight(value, limit, memo) for value in values) * factor
+        except OutOfGas:
+            weight = limit
+        charge(weight // ITEMS_PER_GAS)
+
+    def built(value):
+        check_size(value)
+        weigh([value])
+        return value
+
+    def operate(operator: str, left, right, inplace: bool = False):
+        if inplace and operator in ('add', 'or_') and isinstance(left, (list, dict, set)):
+            # Extending in place only copies the right operand
+            weigh([right])
+            return check_size(sized_op(operator, left, right, True))
+        return built(sized_op(operator, left, right, inplace))
+
+    def compare(name: str, left, right):
+        if name in ('In', 'NotIn'):
+            weigh([left if isinstance(right, (dict, set)) else right])
+        elif name not in ('Is', 'IsNot') and all(isinstance(value, (str, list, tuple, dict, set)) for value in (left, right)):
+            weigh([min(left, right, key=len)])
+        return COMPARISONS[name](left, right)
+
+    def sized(value):
+        if isinstance(value, (str, list, tuple, dict, set)):
+            weigh([value])
+        return value
+
+    def get_slice(value, lower, upper, step):
+        return built(value[lower:upper:step])
+
+    def call_method(obj, name, /, *method_args, **method_kwargs):
+        if name == 'join' and method_args:
+            items = list(method_args[0])
+            if sum(len(item) for item in items if isinstance(item, str)) + len(obj) * max(len(items) - 1, 0) > MAX_SEQUENCE_LENGTH:
+                raise ContractError(f'Result of join exceeds {MAX_SEQUENCE_LENGTH} items')
+            method_args = (items,) + method_args[1:]
+        if name == 'replace' and isinstance(obj, str) and len(method_args) >= 2 and isinstance(method_args[0], str) and isinstance(method_args[1], str):
+            old, new = method_args[:2]
+            occurrences = obj.count(old) if old else len(obj) + 1
+            if len(obj) + occurrences * (len(new) - len(old)) > MAX_SEQUENCE_LENGTH:
+                raise ContractError(f'Result of replace exceeds {MAX_SEQUENCE_LENGTH} items')
+        weigh(([] if name in REFERENCE_METHODS else list(method_args)) + list(method_kwargs.values()) + ([obj] if name in LINEAR_METHODS else []))
+        result = getattr(obj, name)(*method_args, **method_kwargs)
+        check_size(obj)
+        return built(result) if name in BUILDING_METHODS else result
+
+    def metered_builtin(name: str, function):
+        def call(*call_args, **call_kwargs):
+            if name == 'sum' and len(call_args) > 1 and not isinstance(call_args[1], (int, float)):
+                raise ContractError('sum only adds numbers in contracts')
+            factor = max(1, len(call_args[0]).bit_length()) if name == 'sorted' and call_args and hasattr(call_args[0], '__len__') else 1
+            weigh(list(call_args) + list(call_kwargs.values()), factor)
+            return built(function(*call_args, **call_kwargs))
+        return call
+
+    code_hash = None
+    try:
+        code_hash, bytecode = compile_contract(code)
+        builtins = dict(SAFE_BUILTINS, range=metered_range)
+        builtins.update({name: metered_builtin(name, SAFE_BUILTINS[name]) for name in METERED_BUILTINS})
+        # The metered types still work as isinstance arguments
+        types = {builtins[name]: SAFE_BUILTINS[name] for name in METERED_BUILTINS}
+
+        def contract_isinstance(value, classinfo):
+            classinfo = tuple(types.get(item, item) for item in classinfo) if isinstance(classinfo, tuple) else types.get(classinfo, classinfo)
+            return isinstance(value, classinfo)
+
+        builtins['isinstance'] = contract_isinstance
+        env = {
+            '__builtins__': builtins, '__gas__': charge, '__metered__': metered, '__op__': operate, '__compare__': compare,
+            '__sized__': sized, '__slice__': get_slice, '__method__': call_method, 'state': state, 'args': args, 'context': context
+        }
+        limit_cpu(cpu_limit)
+        exec(bytecode, env)
+        result = env.get('result')
+        json.dumps([state, result])
+        return {'code_hash': code_hash, 'success': True, 'result': result, 'state': state, 'gas_used': meter['gas']}
+    except ContractError as e:
+        return {'code_hash': code_hash, 'success': False, 'gas_used': meter['gas'], 'error': f'{type(e).__name__}: {e}'}
+    except RecursionError:
+        return {'code_hash': code_hash, 'success': False, 'gas_used': meter['gas'], 'error': 'RecursionError: maximum recursion depth exceeded'}
+    except Exception as e:
+        return {'code_hash': code_hash, 'success': False, 'gas_used': meter['gas'], 'error': f'{type(e).__name__}: {e}'}
+
+def limit_cpu(cpu_limit: float):
+    """
+    Gives the next contract cpu_limit seconds of CPU on top of what the worker already used
+    """
+    if resource is None or not cpu_limit:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_limit)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+def raise_timeout(signum, frame):
+    raise ContractTimeout('CPU time limit exceeded')
+
+def init_worker(memory_limit: Optional[int]):
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, raise_timeout)
+
+class SmartContractVM:
+    """
+    Sandboxed execution of native Python contracts
+
+    Contracts are a validated subset of Python without imports, attribute access (beyond a
+    few container and string methods), exceptions handling or nondeterministic builtins, and
+    are metered with gas so the same code, state and arguments always use the same gas and
+    produce the same result. Operators, comparisons, slices, methods and builtins pay for
+    the items they traverse and build, and no value grows beyond MAX_SEQUENCE_LENGTH items,
+    so gas bounds the CPU and memory of a call. Compiled code is cached by code hash in
+    every process.
+
+    Calls run in a pool of worker processes with a memory limit and a per-call CPU limit;
+    a call exceeding the wall timeout terminates the pool, so a contract can never stall
+    the node or consensus.
+    """
+
+    def __init__(self, processes: int = 2, gas_limit: int = DEFAULT_GAS_LIMIT, timeout: float = 2.0, cpu_limit: float = 1.0, memory_limit: Optional[int] = 512 * 1024 * 1024, max_tasks_per_child: int = 1000):
+        self.processes = processes
+        self.gas_limit = gas_limit
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.max_tasks_per_child = max_tasks_per_child
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context('spawn')
+                self._pool = context.Pool(self.processes, initializer=init_worker, initargs=(self.memory_limit,), maxtasksperchild=self.max_tasks_per_child)
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.terminate()
+
+    def validate(self, code: str) -> str:
+        """
+        Validates and compiles a contract in the current process
+
+        Returns:
+            str: The code hash
+
+        Raises:
+            ContractValidationError: When the contract is not valid
+        """
+        return compile_contract(code)[0]
+
+    def execute(self, code: str, state: Optional[dict] = None, args: Optional[dict] = None, context: Optional[dict] = None, gas_limit: Optional[int] = None) -> ContractResult:
+        """
+        Executes a contract in the worker pool
+
+        Args:
+            code (str): Contract source
+            state (dict): Contract state, only modified in the returned result
+            args (dict): Call arguments
+            context (dict): Call context, e.g. sender, receiver and amount of the transaction
+            gas_limit (int): Gas available for the call, defaults to the VM gas limit
+
+        Returns:
+            ContractResult: Result, new state and gas used; on failure the state is unchanged
+        """
+        state = state or {}
+        try:
+            code_hash = self.validate(code)
+            payload = json.loads(json.dumps([state, args or {}, context or {}]))
+        except ContractValidationError as e:
+            return ContractResult(success=False, state=state, error=f'{type(e).__name__}: {e}')
+        except (TypeError, ValueError) as e:
+            return ContractResult(success=False, state=state, error=f'State, args and context must be JSON serializable: {e}')
+
+        pool = self._get_pool()
+        try:
+            outcome = pool.apply_async(run_contract, (code, *payload, gas_limit or self.gas_limit, self.cpu_limit)).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            logger.warning(f'Contract {code_hash} exceeded {self.timeout} seconds, restarting workers')
+            self._reset_pool(pool)
+            return ContractResult(code_hash=code_hash, success=False, state=state, error=f'ContractTimeout: wall time limit of {self.timeout} seconds exceeded')
+        except Exception as e:
+            logger.error(f'Error executing contract {code_hash}: {e}\n{traceback.format_exc()}')
+            self._reset_pool(pool)
+            return ContractResult(code_hash=code_hash, success=False, state=state, error=f'{type(e).__name__}: {e}')
+        if not outcome['success']:
+            outcome['state'] = state
+        return ContractResult(**outcome)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+
+vm = SmartContractVM()
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import Response
+from typing import Callable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+MIN_COMPRESS_SIZE = 1024
+COMPRESSED_CACHE_SIZE = 32
+
+_compressed: OrderedDict = OrderedDict()
+_compressed_lock = threading.Lock()
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag from the given parts, hashed so block hashes (Φx...) never reach the latin-1 header
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return f'"{digest.hexdigest()[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    """
+    Picks zstd when the client accepts it and zstandard is installed, otherwise gzip
+    """
+    accepted = {}
+    for item in request.headers.get('accept-encoding', '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    if zstandard is not None and accepted.get('zstd', 0) > 0:
+        return 'zstd'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5)
+
+def cached_response(request: Request, etag: Optional[str], build: Callable[[], bytes], cache_control: str = REVALIDATE, media_type: str = 'application/json') -> Response:
+    """
+    Builds a response honoring If-None-Match and Accept-Encoding
+
+    The body is only built when the client copy is stale. Compressed bodies are kept in a
+    small LRU keyed by (etag, encoding), so a popular unchanged /blockchain is compressed once.
+
+    Args:
+        request (Request): The incoming request
+        etag (str): Validator of the current representation, None disables conditional requests
+        build (Callable): Returns the uncompressed body
+        cache_control (str): Cache-Control header, IMMUTABLE for committed blocks
+        media_type (str): Content type of the body
+
+    Returns:
+        Response: 304 without body, or the (possibly compressed) body
+    """
+    headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if etag is not None:
+        headers['ETag'] = etag
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    body = build()
+    encoding = negotiate_encoding(request) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding is not None:
+        key = (etag, encoding)
+        compressed = None
+        if etag is not None:
+            with _compressed_lock:
+                compressed = _compressed.get(key)
+                if compressed is not None:
+                    _compressed.move_to_end(key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if etag is not None:
+                with _compressed_lock:
+                    _compressed[key] = compressed
+                    if len(_compressed) > COMPRESSED_CACHE_SIZE:
+                        _compressed.popitem(last=False)
+        body = compressed
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def immutable_response(request: Request, body: Optional[bytes], media_type: str = 'application/json') -> Response:
+    """
+    Response for a committed block body, 'null' when the block is unknown
+
+    Committed blocks never change once their bytes are cached, so clients and proxies may keep
+    them for a year. The ETag is taken from the bytes, so a corrected block gets a new one.
+    """
+    if body is None or body == b'null':
+        return Response(content=b'null', media_type=media_type, headers={'Cache-Control': REVALIDATE})
+    return cached_response(request, make_etag(body), lambda: body, IMMUTABLE, media_type)
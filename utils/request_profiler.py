@@ -0,0 +1,264 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import logging
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logging.basicConfig(
+    level= logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('node_logs.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+class RequestProfiler:
+    """
+    Opt-in profiler for route handlers
+
+    A configurable fraction of requests is profiled with cProfile, aggregated per route,
+    and sampled by a background thread that folds the handler stack every few milliseconds,
+    so the profile includes the downstream Node methods and the outbound peer calls.
+
+    Async routes are not profiled on the event loop, where cProfile would charge the other
+    coroutines to the route. The sampling decision is kept in a context variable instead,
+    and the work the route hands to the threadpool (wrap) or to the node writer (the runtime
+    calls wrap too) is profiled on the thread that runs it.
+
+    Configuration:
+        NODE_PROFILE_SAMPLE_RATE: Fraction of requests to profile, 0 disables profiling
+        NODE_PROFILE_INTERVAL: Seconds between stack samples
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, interval: Optional[float] = None, max_stacks: int = 5000):
+        self.sample_rate = float(os.environ.get('NODE_PROFILE_SAMPLE_RATE', 0) if sample_rate is None else sample_rate)
+        self.interval = float(os.environ.get('NODE_PROFILE_INTERVAL', 0.005) if interval is None else interval)
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active_threads: Dict[int, str] = {}
+        self._route: contextvars.ContextVar = contextvars.ContextVar('profiled_route', default=None)
+        self._sampler: Optional[threading.Thread] = None
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate: Optional[float] = None, interval: Optional[float] = None):
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if interval is not None:
+            self.interval = max(float(interval), 0.001)
+        logger.info(f'Profiler configured, sample rate: {self.sample_rate}, interval: {self.interval}')
+
+    def reset(self):
+        with self._lock:
+            self._stats: Dict[str, pstats.Stats] = {}
+            self._requests: Counter = Counter()
+            self._wall_time: Counter = Counter()
+            self._stacks: Counter = Counter()
+
+    def should_sample(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    # Profiling
+
+    @contextmanager
+    def profile(self, name: str, force: bool = False):
+        """
+        Profiles the enclosed block when the request is sampled
+
+        Args:
+            name (str): Aggregation key, usually the route path
+            force (bool): Profile regardless of the sample rate
+        """
+        if getattr(self._local, 'active', False) or not (force or self.should_sample()):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        thread_id = threading.get_ident()
+        try:
+            self._local.active = True
+            self._register_thread(thread_id, name)
+            start = time.perf_counter()
+            profiler.enable()
+        except Exception as e:
+            # Another profiler may already be active on this interpreter
+            self._unregister_thread(thread_id)
+            self._local.active = False
+            logger.warning(f'Could not profile {name}: {e}')
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            self._unregister_thread(thread_id)
+            self._local.active = False
+            self._aggregate(name, profiler, elapsed)
+
+    def wrap(self, fn: Callable, suffix: str = '', name: Optional[str] = None) -> Callable:
+        """
+        Binds fn to the sampling decision of the current request, before it leaves the event loop
+
+        Args:
+            fn (Callable): Work to run in the threadpool or on the writer thread
+            suffix (str): Appended to the route name, like ' [writer]'
+            name (str): Aggregation key outside of a route, the name of fn by default
+
+        Returns:
+            Callable: fn profiled under the route when the request is sampled; outside of a
+                route the call is sampled on its own
+        """
+        route = self._route.get()
+        if route == '':
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.profile(f'{route or name or getattr(fn, "__name__", "job")}{suffix}', force=route is not None):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def route(self, name: str) -> Callable:
+        """
+        Decorator profiling a route handler, sync or async
+
+        Args:
+            name (str): Aggregation key, usually the route path
+        """
+        def decorator(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    token = self._route.set(name if self.should_sample() else '')
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        self._route.reset(token)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.profile(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _aggregate(self, name: str, profiler: cProfile.Profile, elapsed: float):
+        try:
+            with self._lock:
+                if name in self._stats:
+                    self._stats[name].add(profiler)
+                else:
+                    self._stats[name] = pstats.Stats(profiler)
+                self._requests[name] += 1
+                self._wall_time[name] += elapsed
+        except Exception as e:
+            logger.error(f'Error aggregating profile for {name}: {e}\n{traceback.format_exc()}')
+
+    # Stack sampling
+
+    def _register_thread(self, thread_id: int, name: str):
+        with self._lock:
+            self._active_threads[thread_id] = name
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_stacks, name='request-profiler', daemon=True)
+                self._sampler.start()
+
+    def _unregister_thread(self, thread_id: int):
+        with self._lock:
+            self._active_threads.pop(thread_id, None)
+
+    def _sample_stacks(self):
+        while True:
+            with self._lock:
+                if not self._active_threads:
+                    self._sampler = None
+                    return
+                active_threads = dict(self._active_threads)
+            frames = sys._current_frames()
+            for thread_id, name in active_threads.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._record_stack(name, frame)
+            del frames
+            time.sleep(self.interval)
+
+    def _record_stack(self, name: str, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        stack.append(name)
+        folded = ';'.join(reversed(stack))
+        with self._lock:
+            if folded in self._stacks or len(self._stacks) < self.max_stacks:
+                self._stacks[folded] += 1
+
+    # Reports
+
+    def folded_stacks(self) -> str:
+        """
+        Returns the sampled stacks in folded format, ready for flamegraph.pl or speedscope
+        """
+        with self._lock:
+            return '\n'.join(f'{stack} {count}' for stack, count in self._stacks.most_common())
+
+    def summary(self, limit: int = 25) -> dict:
+        """
+        Returns the aggregated cProfile data per route
+
+        Args:
+            limit (int): Functions listed per route, sorted by cumulative time
+
+        Returns:
+            dict: Requests profiled, wall time and top functions per route
+        """
+        with self._lock:
+            routes = {}
+            for name, stats in self._stats.items():
+                rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+                routes[name] = {
+                    'requests': self._requests[name],
+                    'total_seconds': self._wall_time[name],
+                    'mean_seconds': self._wall_time[name] / self._requests[name],
+                    'top': [self._format_row(function, row) for function, row in rows]
+                }
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'interval': self.interval,
+                'routes': routes
+            }
+
+    @staticmethod
+    def _format_row(function: tuple, row: tuple) -> dict:
+        filename, line, function_name = function
+        primitive_calls, calls, total_time, cumulative_time, _ = row
+        return {
+            'function': f'{function_name} ({os.path.basename(filename)}:{line})',
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'total_seconds': total_time,
+            'cumulative_seconds': cumulative_time
+        }
+
+profiler = RequestProfiler()